@@ -0,0 +1,150 @@
+"""
+Admission Control
+Token-bucket rate limits for hot routes, and a gate on how many requests on
+the host use the database at once, so a refresh storm is turned away with a
+429 or 503 before it can exhaust the server's connections.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process gate
+    fcntl = None
+
+
+class DatabaseBusy(Exception):
+    """Raised when no database slot frees up within the gate's timeout"""
+
+
+class RateLimiter:
+    """Token buckets per key: ``burst`` requests at once, refilled at ``rate`` per second.
+
+    Buckets live in this process only. The least recently used ones are
+    forgotten beyond ``max_keys``; a forgotten key starts again with a full
+    bucket.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'allowed': 0, 'limited': 0}
+
+    def take(self, key):
+        """Spend a token for ``key``; returns 0 if allowed, else the seconds until a token is due"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+                self._stats['allowed'] += 1
+            else:
+                wait = (1 - tokens) / self.rate
+                self._stats['limited'] += 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({'rate': self.rate, 'burst': self.burst, 'keys': len(self._buckets)})
+        return data
+
+
+class DatabaseGate:
+    """At most ``limit`` requests on the host hold a database connection at once.
+
+    Each holder locks one byte of ``path`` with ``lockf``, so the limit is
+    shared by every worker process, and the kernel frees the slots of a
+    worker that dies. Callers wait up to ``timeout`` seconds for a slot.
+    """
+
+    def __init__(self, path, limit, timeout=0.5):
+        self.path = path
+        self.limit = limit
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._held = set()
+        self._in_use = 0
+        self._fd = None
+        self._semaphore = None
+        self._stats = {'acquired': 0, 'waited': 0, 'shed': 0}
+        if fcntl is not None:
+            try:
+                self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            except OSError as e:
+                print(f"Database gate note: limiting each process separately ({e})")
+        if self._fd is None:
+            self._semaphore = threading.BoundedSemaphore(limit)
+
+    def _try_slot(self):
+        """Claim a free slot or return None; slots held by this process's threads are skipped"""
+        with self._lock:
+            start = random.randrange(self.limit)
+            for i in range(self.limit):
+                slot = (start + i) % self.limit
+                if slot in self._held:
+                    continue
+                try:
+                    fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, slot)
+                except OSError:
+                    continue  # held by another worker
+                self._held.add(slot)
+                return slot
+        return None
+
+    def acquire(self):
+        """Take a slot, waiting up to ``timeout``; returns it, or raises ``DatabaseBusy``"""
+        if self._semaphore is not None:
+            if self._semaphore.acquire(blocking=False):
+                slot = True
+            else:
+                with self._lock:
+                    self._stats['waited'] += 1
+                slot = self._semaphore.acquire(timeout=self.timeout) or None
+        else:
+            slot = self._try_slot()
+            if slot is None:
+                with self._lock:
+                    self._stats['waited'] += 1
+                deadline = time.monotonic() + self.timeout
+                while slot is None and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                    slot = self._try_slot()
+        with self._lock:
+            self._stats['shed' if slot is None else 'acquired'] += 1
+            self._in_use += slot is not None
+        if slot is None:
+            raise DatabaseBusy(f"{self.limit} requests are already using the database")
+        return slot
+
+    def release(self, slot):
+        with self._lock:
+            self._in_use -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+                return
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, slot)
+            self._held.discard(slot)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'limit': self.limit,
+                'timeout': self.timeout,
+                'shared': self._semaphore is None,
+                'in_use': self._in_use,  # this process
+            })
+        return data
@@ -1,13 +1,39 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_mail import Mail, Message
+from flask import (Flask, render_template, stream_template, request, redirect, url_for, flash, 
+                   jsonify, g, session, has_request_context, Response, stream_with_context)
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user, login_url
+from flask_mail import Mail
 from config import Config
+from db_pool import ConnectionPool, RequestConnection, PoolExhausted
+from replicas import ReplicaSet, replica_lag
+from cache import TTLCache
+from shared_cache import SharedCache, private_directory
+from bed_allocator import FreeBedIndex
+from waitlist import Waitlist, waitlist_applications, leave_waitlist
+from outbox import OutboxSender, queue_email, queue_emails
+from pagination import KeysetPage, page_size
+from data_version import DataVersion
+from events import EventBus
+from query_log import QueryStats, InstrumentedCursor, logger as sql_logger
+from migrations import migrate
+from password_hasher import PasswordHasher, HasherBusy
+from admission import RateLimiter, DatabaseGate, DatabaseBusy
+from roster import RosterError, read_roster, remove_taken, insert_accounts, temporary_password, write_report
+import sqlite_backend
 import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from mysql.connector import Error, IntegrityError, errorcode
+from werkzeug.middleware.proxy_fix import ProxyFix
+from datetime import datetime, timedelta
 from functools import wraps
+import click
 import os
+import csv
+import io
+import itertools
+import json
+import logging
+import math
+import queue
+import time
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -19,6 +45,10 @@ app.config['MYSQL_DATABASE'] = os.environ.get('MYSQL_ADDON_DB', app.config.get('
 app.config['MYSQL_PORT'] = int(os.environ.get('MYSQL_ADDON_PORT', app.config.get('MYSQL_PORT', 3306)))
 # ------------------------------------------------------------------------
 
+# Take the client address from X-Forwarded-For set by the platform's load balancer
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+
 
 # Initialize Flask extensions
 login_manager = LoginManager()
@@ -30,20 +60,232 @@ mail = Mail()
 mail.init_app(app)
 
 # Database connection helper
-def get_db_connection():
-    """Create and return MySQL database connection (Render + Clever Cloud compatible)"""
-    try:
-        conn = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST', app.config.get('MYSQL_HOST')),
-            user=os.getenv('MYSQL_USER', app.config.get('MYSQL_USER')),
-            password=os.getenv('MYSQL_PASSWORD', app.config.get('MYSQL_PASSWORD')),
-            database=os.getenv('MYSQL_DATABASE', app.config.get('MYSQL_DATABASE')),
-            port=int(os.getenv('MYSQL_PORT', app.config.get('MYSQL_PORT', 3306)))
-        )
-        return conn
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+def _connect():
+    """Open a new database connection (Render + Clever Cloud compatible)"""
+    if app.config['DB_BACKEND'] == 'sqlite':
+        return sqlite_backend.connect(app.config['SQLITE_PATH'], 
+                                      timeout=app.config['SQLITE_BUSY_TIMEOUT'])
+    return mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST', app.config.get('MYSQL_HOST')),
+        user=os.getenv('MYSQL_USER', app.config.get('MYSQL_USER')),
+        password=os.getenv('MYSQL_PASSWORD', app.config.get('MYSQL_PASSWORD')),
+        database=os.getenv('MYSQL_DATABASE', app.config.get('MYSQL_DATABASE')),
+        port=int(os.getenv('MYSQL_PORT', app.config.get('MYSQL_PORT', 3306)))
+    )
+
+db_pool = ConnectionPool(_connect,
+                         size=app.config['DB_POOL_SIZE'],
+                         timeout=app.config['DB_POOL_TIMEOUT'],
+                         ping_after=app.config['DB_POOL_PING_AFTER'])
+
+def _replica_pools():
+    """A pool per MYSQL_REPLICAS entry ("host[:port]"); same credentials as the primary"""
+    if app.config['DB_BACKEND'] != 'mysql':
+        return {}
+    pools = {}
+    for entry in app.config['MYSQL_REPLICAS'].split(','):
+        if not entry.strip():
+            continue
+        host, _, port = entry.strip().partition(':')
+        connect = lambda host=host, port=int(port or 3306): mysql.connector.connect(
+            host=host, port=port, user=app.config['MYSQL_USER'], 
+            password=app.config['MYSQL_PASSWORD'], database=app.config['MYSQL_DATABASE'])
+        pools[entry.strip()] = ConnectionPool(connect,
+                                              size=app.config['REPLICA_POOL_SIZE'],
+                                              timeout=app.config['DB_POOL_TIMEOUT'],
+                                              ping_after=app.config['DB_POOL_PING_AFTER'])
+    return pools
+
+# Read-only routes read from replicas that are caught up; everything else uses the primary
+replica_set = ReplicaSet(_replica_pools(),
+                         max_lag=app.config['REPLICA_MAX_LAG'],
+                         check_interval=app.config['REPLICA_CHECK_INTERVAL'],
+                         lag_check=lambda conn: replica_lag(
+                             conn, allow_standalone=app.config['REPLICA_ALLOW_STANDALONE']))
+
+def reads_from_replica():
+    """True in a read_only route, unless this user wrote something moments ago"""
+    return (bool(replica_set) and has_request_context() and g.get('read_only', False) 
+            and session.get('primary_until', 0) <= time.time())
+
+def stick_to_primary():
+    """After a write, keep the user's reads on the primary until the replicas have it"""
+    if replica_set and has_request_context():
+        session['primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+
+def get_db_connection(primary=False):
+    """Return this request's pooled database connection, borrowing one on first use.
+
+    In a ``read_only`` route this is a replica connection when one is caught
+    up, unless ``primary`` is set.
+    """
+    if not primary and reads_from_replica():
+        if 'replica_conn' not in g:
+            replica, conn = replica_set.acquire()
+            g.replica = replica
+            g.replica_conn = RequestConnection(conn, wrap_cursor=_instrument_cursor) if conn else None
+        if g.replica_conn is not None:
+            return g.replica_conn
+    if 'db_conn' in g:
+        return g.db_conn
+    # Raises DatabaseBusy (a 503) when too many requests on the host already use the database
+    slot = db_gate.acquire() if db_gate and has_request_context() else None
+    try:
+        conn = RequestConnection(db_pool.acquire(), wrap_cursor=_instrument_cursor, 
+                                 on_commit=stick_to_primary)
+    except Exception as e:
+        if slot is not None:
+            db_gate.release(slot)
+        print(f"Error connecting to database: {e}")
+        if isinstance(e, PoolExhausted) and has_request_context():
+            # Every connection is busy: shed the request like the gate does
+            raise DatabaseBusy(str(e)) from e
         return None
+    g.db_conn = conn
+    g.db_gate_slot = slot
+    return conn
+
+def _instrument_cursor(cursor):
+    """Record the request's statements when SQL instrumentation is on"""
+    if not app.config['SQL_INSTRUMENTATION']:
+        return cursor
+    if 'query_stats' not in g:
+        g.query_stats = QueryStats(slow_ms=app.config['SLOW_QUERY_MS'],
+                                   endpoint=request.endpoint if request else None)
+    return InstrumentedCursor(cursor, g.query_stats)
+
+def _instrument_background_cursor(cursor):
+    """Slow-query logging for statements run outside a request (outbox sender)"""
+    if not app.config['SQL_INSTRUMENTATION']:
+        return cursor
+    return InstrumentedCursor(cursor, QueryStats(slow_ms=app.config['SLOW_QUERY_MS'], 
+                                                 endpoint='outbox-sender'))
+
+if app.config['SLOW_QUERY_LOG']:
+    _slow_log = logging.FileHandler(app.config['SLOW_QUERY_LOG'])
+    _slow_log.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+    sql_logger.addHandler(_slow_log)
+
+@app.after_request
+def add_server_timing(response):
+    """Report the request's database time and warn about repeated statements"""
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    response.headers.add('Server-Timing', stats.server_timing())
+    for shape, count in stats.repeated(app.config['N_PLUS_ONE_THRESHOLD']):
+        sql_logger.warning(json.dumps({
+            'event': 'repeated_query',
+            'endpoint': stats.endpoint,
+            'count': count,
+            'statement': shape,
+        }))
+    return response
+
+outbox_sender = OutboxSender(app, mail, db_pool,
+                             batch_size=app.config['OUTBOX_BATCH_SIZE'],
+                             poll_interval=app.config['OUTBOX_POLL_INTERVAL'],
+                             max_attempts=app.config['OUTBOX_MAX_ATTEMPTS'],
+                             backoff=app.config['OUTBOX_BACKOFF'],
+                             wrap_cursor=_instrument_background_cursor,
+                             claim_lease=app.config['OUTBOX_CLAIM_LEASE'],
+                             smtp_idle=app.config['OUTBOX_SMTP_IDLE'])
+
+@app.before_request
+def start_outbox_sender():
+    """Start this worker's outbox sender on its first request"""
+    # Under asgi.py the event loop drains the outbox instead
+    if app.config['MAIL_ENABLED'] and not app.config.get('OUTBOX_IN_EVENT_LOOP'):
+        outbox_sender.start()
+
+@app.cli.command('drain-outbox')
+def drain_outbox():
+    """Send every due email in the outbox and exit"""
+    total = 0
+    while True:
+        sent = outbox_sender.drain()
+        total += sent
+        if sent < outbox_sender.batch_size:
+            break
+    outbox_sender.close()
+    print(f"Processed {total} queued email(s): {outbox_sender.stats()}")
+
+def run_migrations():
+    """Apply pending schema migrations; a single version check when already current"""
+    conn = db_pool.acquire()
+    try:
+        return migrate(conn, backend=app.config['DB_BACKEND'])
+    finally:
+        db_pool.release(conn)
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations and exit"""
+    applied = run_migrations()
+    print(f"Applied schema version(s) {applied}" if applied else "Schema is up to date")
+
+if app.config['MIGRATE_ON_STARTUP']:
+    try:
+        run_migrations()
+    except Exception as e:
+        print(f"Schema migration error: {e}")
+
+def put_db_connection(broken=False):
+    """Give the request's connections back to their pools, e.g. before slow work that needs no database"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.release(conn._conn, broken=broken)
+    slot = g.pop('db_gate_slot', None)
+    if slot is not None:
+        db_gate.release(slot)
+    replica_conn = g.pop('replica_conn', None)
+    if replica_conn is not None:
+        replica_set.release(g.pop('replica'), replica_conn._conn, broken=broken)
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """Give the request's connection back to the pool"""
+    put_db_connection(broken=isinstance(exc, Error))
+
+# Password hashes run in a bounded per-worker process pool
+password_hasher = PasswordHasher(method=app.config['HASH_METHOD'],
+                                 workers=app.config['HASH_WORKERS'],
+                                 max_pending=app.config['HASH_QUEUE_LIMIT'],
+                                 timeout=app.config['HASH_TIMEOUT'])
+password_hasher.start()
+
+def shed(status, retry_after, message):
+    """Turn a request away before it does any work: 429 (rate limit) or 503 (database busy)"""
+    headers = {'Retry-After': str(max(1, math.ceil(retry_after)))}
+    if request.path.startswith('/api/'):
+        return jsonify({'error': message}), status, headers
+    # Rendered without context processors, as Flask-Login's would load the user from
+    # the database again
+    retry_url = request.full_path if request.method == 'GET' else request.path
+    page = app.jinja_env.get_template('busy.html').render(message=message, retry_url=retry_url)
+    return page, status, headers
+
+@app.errorhandler(DatabaseBusy)
+def database_busy(e):
+    return shed(503, app.config['DB_GATE_RETRY_AFTER'], 
+                'The hostel system is very busy right now. Please try again in a few seconds.')
+
+def rate_limited(f):
+    """Limit how fast one user, and one client address, can call a hot route"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        wait = ip_limiter.take(request.remote_addr) if ip_limiter else 0
+        if user_limiter and current_user.is_authenticated:
+            wait = max(wait, user_limiter.take(current_user.id))
+        if wait:
+            return shed(429, wait, 'You are refreshing too quickly. Please wait a moment and try again.')
+        return f(*args, **kwargs)
+    return decorated_function
+
+def hashing_busy(template):
+    """503 page for when every password hashing slot is taken"""
+    flash('Too many people are signing in right now. Please try again in a few seconds.', 'warning')
+    return render_template(template), 503, {'Retry-After': str(app.config['HASH_RETRY_AFTER'])}
 
 
 # User model (simplified for Flask-Login)
@@ -69,21 +311,74 @@ class User:
     def is_admin(self):
         return self.role == 'admin'
 
+# Names the files this host's workers share for the database
+if app.config['DB_BACKEND'] == 'sqlite':
+    database_name = os.path.splitext(os.path.basename(app.config['SQLITE_PATH']))[0]
+else:
+    database_name = app.config['MYSQL_DATABASE']
+
+def shared_path(name):
+    """Path of a file this host's workers share for the database (caches, counters, locks,
+    the event log). They live in a private directory: in the shared temp directory other
+    users could plant or rewrite them."""
+    directory = app.config['SHARED_CACHE_DIR'] or os.path.join(app.instance_path, 'cache')
+    return os.path.join(private_directory(directory), f"hostel-{name}-{database_name}")
+
+def make_cache(name, maxsize, ttl, entry_size):
+    """A cache shared by this host's workers (or per process with SHARED_CACHE=False)"""
+    if not app.config['SHARED_CACHE']:
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    try:
+        path = shared_path(f"cache-{name}")
+    except OSError as e:
+        print(f"Shared cache note: using a per-process cache for {name} ({e})")
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    return SharedCache(path, maxsize=maxsize, ttl=ttl, entry_size=entry_size)
+
+# Admission control: token buckets for the hot routes (per worker), and a host-wide
+# cap on requests holding a database connection
+user_limiter = (RateLimiter(app.config['RATE_LIMIT_USER_RATE'], app.config['RATE_LIMIT_USER_BURST'])
+                if app.config['RATE_LIMIT_USER_RATE'] > 0 else None)
+ip_limiter = (RateLimiter(app.config['RATE_LIMIT_IP_RATE'], app.config['RATE_LIMIT_IP_BURST'])
+              if app.config['RATE_LIMIT_IP_RATE'] > 0 else None)
+if ip_limiter and not app.config['TRUSTED_PROXIES']:
+    print("Rate limit warning: RATE_LIMIT_IP_RATE is set without TRUSTED_PROXIES; behind a "
+          "load balancer all clients share the balancer's address and one bucket")
+db_gate = (DatabaseGate(shared_path('db-gate'),
+                        limit=app.config['DB_GATE_LIMIT'], timeout=app.config['DB_GATE_TIMEOUT'])
+           if app.config['DB_GATE_LIMIT'] > 0 else None)
+
+# Identity cache so current_user resolves without a users query. The app never changes a
+# user's role or email; changes made directly in the database show after USER_CACHE_TTL.
+user_cache = make_cache('users', maxsize=app.config['USER_CACHE_SIZE'],
+                        ttl=app.config['USER_CACHE_TTL'], entry_size=512)
+
+def cache_user(user_data):
+    """Remember the fields Flask-Login needs for a user row"""
+    user_cache.set(str(user_data['id']), (user_data['id'], user_data['username'],
+                                          user_data['email'], user_data['role']))
+
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user from database"""
-    conn = get_db_connection()
+    """Load user from the identity cache, falling back to the database"""
+    cached = user_cache.get(str(user_id))
+    if cached is not None:
+        return User(*cached)
+    
+    # A just-registered user may not have reached the replicas yet
+    conn = get_db_connection(primary=True)
     if not conn:
         return None
     
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+        cursor.execute("SELECT id, username, email, role FROM users WHERE id = %s", (user_id,))
         user_data = cursor.fetchone()
         cursor.close()
         conn.close()
         
         if user_data:
+            cache_user(user_data)
             return User(user_data['id'], user_data['username'], 
                        user_data['email'], user_data['role'])
     except Error as e:
@@ -91,6 +386,179 @@ def load_user(user_id):
     
     return None
 
+# Free bed numbers per building, kept per worker and updated on allocation and removal
+bed_index = FreeBedIndex(resync_after=app.config['BED_INDEX_RESYNC'])
+
+def claim_beds(conn, bed_nos):
+    """Lock the inventory rows of ``bed_nos``; returns the ones still in service.
+
+    Holding the bed row until commit orders an allocation against a
+    concurrent retirement of the same bed.
+    """
+    cursor = conn.cursor()
+    placeholders = ', '.join(['%s'] * len(bed_nos))
+    cursor.execute(f"""
+        SELECT BedNo FROM beds 
+        WHERE BedNo IN ({placeholders}) AND status = 'Active' 
+        FOR UPDATE
+    """, list(bed_nos))
+    active = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return active
+
+def insert_allotment(conn, cursor, name, student_id, contact, email, user_id=None, building=None):
+    """Allot the lowest free bed (in ``building``, if given); returns the bed number, 
+    or None if all beds are taken"""
+    while True:
+        bed_no = bed_index.acquire(conn, building)
+        if bed_no is None:
+            return None
+        if not claim_beds(conn, [bed_no]):
+            # Retired by another worker since our last resync; try the next one
+            continue
+        try:
+            cursor.execute("""
+                INSERT INTO hostel (BedNo, Name, StudentID, Contact, Email, 
+                                   CheckInDate, PaymentStatus, user_id) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (bed_no, name, student_id, contact, email, 
+                  datetime.now(), 'Pending', user_id))
+            return bed_no
+        except IntegrityError as e:
+            if e.errno != errorcode.ER_DUP_ENTRY:
+                raise
+            # Another worker took this bed since our last resync; try the next one
+
+def allot_to_waitlisted(conn, cursor, bed_no):
+    """Allot ``bed_no``, freed earlier in this transaction, to the next waitlisted application.
+
+    Returns the application, or None when nobody is waiting.
+    """
+    # Applications whose row another transaction holds; put back once a bed is found,
+    # since that transaction may roll back and leave them waiting
+    locked = []
+    try:
+        while True:
+            app_id = waitlist.pop(conn)
+            if app_id is None:
+                return None
+            # Skip it if it was rejected meanwhile, or another worker is allotting it right now
+            cursor.execute("""
+                SELECT a.id, a.user_id, a.student_name, a.student_id, a.contact, a.email
+                FROM waitlist w 
+                JOIN bed_applications a ON a.id = w.application_id 
+                WHERE w.application_id = %s AND a.status = 'Pending' 
+                FOR UPDATE SKIP LOCKED
+            """, (app_id,))
+            application = cursor.fetchone()
+            if application:
+                break
+            # A plain read does not wait for the lock: is it still waiting as far as we know?
+            cursor.execute("""
+                SELECT w.application_id, w.priority, w.applied_date
+                FROM waitlist w 
+                JOIN bed_applications a ON a.id = w.application_id 
+                WHERE w.application_id = %s AND a.status = 'Pending'
+            """, (app_id,))
+            entry = cursor.fetchone()
+            if entry:
+                locked.append((entry['application_id'], entry['priority'], entry['applied_date']))
+    finally:
+        waitlist.restore(locked)
+    cursor.execute("""
+        INSERT INTO hostel (BedNo, Name, StudentID, Contact, Email, 
+                           CheckInDate, PaymentStatus, user_id) 
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (bed_no, application['student_name'], application['student_id'], application['contact'], 
+          application['email'], datetime.now(), 'Pending', application['user_id']))
+    cursor.execute("""
+        UPDATE bed_applications 
+        SET status = 'Approved', reviewed_date = %s, bed_no = %s 
+        WHERE id = %s
+    """, (datetime.now(), bed_no, app_id))
+    leave_waitlist(cursor, [app_id])
+    return application
+
+def offer_beds_to_waitlist(conn, bed_nos=None, building=None):
+    """Allot free beds to waitlisted applications, in waitlist order, in the caller's transaction.
+
+    Offers ``bed_nos`` (beds just added, in order) or else free beds from the
+    index (in ``building``, if given) until nobody is left waiting, and
+    queues the allocation emails. Returns ``(application, bed_no)`` pairs.
+    """
+    cursor = conn.cursor(dictionary=True)
+    offers = iter(bed_nos) if bed_nos is not None else None
+    allotted = []
+    while waitlist.waiting(conn):
+        bed_no = next(offers, None) if offers is not None else bed_index.acquire(conn, building)
+        if bed_no is None:
+            break
+        if not claim_beds(conn, [bed_no]):
+            continue  # retired by another worker since our last resync
+        if offers is None:
+            # The index is a hint: another worker may have allotted the bed meanwhile
+            cursor.execute("SELECT BedNo FROM hostel WHERE BedNo = %s FOR UPDATE", (bed_no,))
+            if cursor.fetchall():
+                continue
+        application = allot_to_waitlisted(conn, cursor, bed_no)
+        if application is None:
+            # The rest are being allotted by other transactions; hand the bed back
+            if offers is None:
+                bed_index.invalidate(building)
+            break
+        if application['email']:
+            queue_notification_email(cursor, application['email'], application['student_name'], 
+                                     bed_no, 'allocation')
+        allotted.append((application, bed_no))
+    cursor.close()
+    return allotted
+
+def bulk_insert_allotments(conn, cursor, applications, now, building=None):
+    """Allot beds to applications in order with one multi-row insert.
+
+    Returns ``(application, bed_no)`` pairs; applications beyond the free
+    capacity are left out.
+    """
+    for attempt in range(3):
+        allocated = []
+        for application in applications:
+            bed_no = bed_index.acquire(conn, building)
+            if bed_no is None:
+                break
+            allocated.append((application, bed_no))
+        if not allocated:
+            return []
+        active = claim_beds(conn, [bed_no for _, bed_no in allocated])
+        if len(active) < len(allocated):
+            if attempt < 2:
+                # Some beds were retired elsewhere; reload the free lists and allocate again
+                bed_index.invalidate(building)
+                continue
+            allocated = list(itertools.takewhile(lambda pair: pair[1] in active, allocated))
+            if not allocated:
+                return []
+        try:
+            cursor.executemany("""
+                INSERT INTO hostel (BedNo, Name, StudentID, Contact, Email, 
+                                   CheckInDate, PaymentStatus, user_id) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(bed_no, a['student_name'], a['student_id'], a['contact'], a['email'], 
+                   now, 'Pending', a['user_id']) for a, bed_no in allocated])
+            return allocated
+        except IntegrityError as e:
+            if e.errno != errorcode.ER_DUP_ENTRY or attempt == 2:
+                raise
+            # Our free list was stale; reload it from the table and try again
+            bed_index.invalidate(building)
+
+def read_only(f):
+    """Mark a route that only reads, so it may be served from a replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated_function
+
 def admin_required(f):
     """Decorator to require admin role"""
     @wraps(f)
@@ -131,8 +599,15 @@ def login():
             user_data = cursor.fetchone()
             cursor.close()
             conn.close()
+            # Nobody else should wait for a connection while we wait for the hash
+            put_db_connection()
             
-            if user_data and check_password_hash(user_data['password'], password):
+            valid, new_hash = password_hasher.verify(user_data['password'], password) if user_data \
+                else (False, None)
+            if valid:
+                if new_hash:
+                    rehash_password(user_data, new_hash)
+                cache_user(user_data)
                 user = User(user_data['id'], user_data['username'], 
                            user_data['email'], user_data['role'])
                 login_user(user)
@@ -141,12 +616,30 @@ def login():
                 return redirect(next_page) if next_page else redirect(url_for('dashboard'))
             else:
                 flash('Invalid username or password.', 'danger')
+        except HasherBusy as e:
+            print(f"Login rejected: {e}")
+            return hashing_busy('login.html')
         except Error as e:
             flash('Error during login. Please try again.', 'danger')
             print(f"Login error: {e}")
     
     return render_template('login.html')
 
+def rehash_password(user_data, new_hash):
+    """Store a password hash made with the current HASH_METHOD; failures only delay the upgrade"""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        # Unless the password was changed meanwhile
+        cursor.execute("UPDATE users SET password = %s WHERE id = %s AND password = %s", 
+                       (new_hash, user_data['id'], user_data['password']))
+        conn.commit()
+        cursor.close()
+    except Error as e:
+        print(f"Password rehash error: {e}")
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     """User registration"""
@@ -192,8 +685,15 @@ def register():
             cursor.execute("SELECT COUNT(*) as count FROM users")
             count = cursor.fetchone()[0]
             role = 'admin' if count == 0 else 'user'
+            cursor.close()
+            put_db_connection()
             
-            hashed_password = generate_password_hash(password)
+            hashed_password = password_hasher.hash(password)
+            conn = get_db_connection()
+            if not conn:
+                flash('Database connection error.', 'danger')
+                return render_template('register.html')
+            cursor = conn.cursor()
             cursor.execute(
                 "INSERT INTO users (username, email, password, role, created_at) VALUES (%s, %s, %s, %s, %s)",
                 (username, email, hashed_password, role, datetime.now())
@@ -204,6 +704,9 @@ def register():
             
             flash('Registration successful! Please log in.', 'success')
             return redirect(url_for('login'))
+        except HasherBusy as e:
+            print(f"Registration rejected: {e}")
+            return hashing_busy('register.html')
         except Error as e:
             flash('Registration failed. Please try again.', 'danger')
             print(f"Registration error: {e}")
@@ -220,6 +723,8 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@rate_limited
+@read_only
 def dashboard():
     """Main dashboard - different views for admin and students"""
     if current_user.is_admin():
@@ -227,64 +732,132 @@ def dashboard():
     else:
         return student_dashboard()
 
-def admin_dashboard():
-    """Admin dashboard with statistics"""
-    conn = get_db_connection()
+# Dashboard statistics and the building inventory, shared by every page view
+# until a write invalidates them
+dashboard_cache = make_cache('dashboard', maxsize=4, ttl=app.config['DASHBOARD_CACHE_TTL'],
+                             entry_size=app.config['SHARED_CACHE_ENTRY_SIZE'])
+
+# Bumped on every write; API ETags are derived from it
+data_version = DataVersion(app.config['DATA_VERSION_FILE'] or shared_path('data-version'))
+
+# Applications waiting for a freed bed; additions are announced to the other workers
+# through their own version counter
+waitlist = Waitlist(DataVersion(shared_path('waitlist-version')),
+                    resync_after=app.config['WAITLIST_RESYNC'])
+
+# Live updates for open dashboards (Server-Sent Events)
+event_bus = EventBus(app.config['EVENT_LOG_FILE'] or shared_path('events') + '.log')
+
+def data_changed(kind, user_ids=()):
+    """Call after committing a write to hostel or bed_applications.
+
+    ``kind`` is 'occupancy' or 'application'; ``user_ids`` are the students
+    whose own bed or applications changed.
+    """
+    dashboard_cache.clear()
+    data_version.bump()
+    event_bus.publish(kind, user_ids)
+
+# Dashboard counters in one aggregate query, and the latest allotments
+DASHBOARD_COUNTS_SQL = """
+    SELECT COUNT(*) AS reserved_beds,
+           COALESCE(SUM(PaymentStatus = 'Paid'), 0) AS paid_count,
+           COALESCE(SUM(PaymentStatus = 'Pending'), 0) AS pending_count,
+           (SELECT COUNT(*) FROM bed_applications WHERE status = 'Pending') AS pending_applications,
+           (SELECT COUNT(*) FROM beds WHERE status = 'Active') AS total_beds
+    FROM hostel
+"""
+RECENT_ALLOTMENTS_SQL = """
+    SELECT BedNo, Name, StudentID, Contact, Email, 
+           CheckInDate, PaymentStatus 
+    FROM hostel 
+    ORDER BY CheckInDate DESC 
+    LIMIT 10
+"""
+
+def load_dashboard_stats():
+    """Compute dashboard counters in one aggregate query plus the recent allotments"""
+    # Cached for every reader, so never from a lagging replica
+    conn = get_db_connection(primary=True)
     if not conn:
-        flash('Database connection error.', 'danger')
-        return render_template('dashboard.html', stats={}, is_admin=True)
+        raise Error('Database connection error')
+    
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(DASHBOARD_COUNTS_SQL)
+    counts = cursor.fetchone()
+    cursor.execute(RECENT_ALLOTMENTS_SQL)
+    recent_allotments = cursor.fetchall()
+    cursor.close()
+    return dashboard_stats(counts, recent_allotments)
+
+def dashboard_stats(counts, recent_allotments):
+    """Dashboard statistics from the counts row and recent allotments"""
+    return {
+        'total_beds': int(counts['total_beds']),
+        'reserved_beds': int(counts['reserved_beds']),
+        'paid_count': int(counts['paid_count']),
+        'pending_count': int(counts['pending_count']),
+        'pending_applications': int(counts['pending_applications']),
+        'recent_allotments': recent_allotments,
+    }
+
+def load_inventory():
+    """Capacity and occupancy of every building"""
+    conn = get_db_connection(primary=True)
+    if not conn:
+        raise Error('Database connection error')
     
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT b.building, 
+               COALESCE(SUM(b.status = 'Active'), 0) AS capacity, 
+               COUNT(h.BedNo) AS occupied, 
+               COALESCE(SUM(b.status = 'Retired'), 0) AS retired
+        FROM beds b 
+        LEFT JOIN hostel h ON h.BedNo = b.BedNo 
+        GROUP BY b.building 
+        ORDER BY b.building
+    """)
+    buildings = cursor.fetchall()
+    cursor.close()
+    for row in buildings:
+        row['capacity'] = int(row['capacity'])
+        row['retired'] = int(row['retired'])
+        row['available'] = row['capacity'] - row['occupied']
+    return buildings
+
+def building_choices():
+    """Buildings to offer when an admin picks where to allot, or [] if unavailable"""
     try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get total beds
-        total_beds = app.config['TOTAL_BEDS']
-        
-        # Get reserved beds count
-        cursor.execute("SELECT COUNT(*) as count FROM hostel")
-        reserved_beds = cursor.fetchone()['count']
-        available_beds = total_beds - reserved_beds
-        
-        # Get recent allotments
-        cursor.execute("""
-            SELECT BedNo, Name, StudentID, Contact, Email, 
-                   CheckInDate, PaymentStatus 
-            FROM hostel 
-            ORDER BY CheckInDate DESC 
-            LIMIT 10
-        """)
-        recent_allotments = cursor.fetchall()
-        
-        # Get pending applications count
-        cursor.execute("SELECT COUNT(*) as count FROM bed_applications WHERE status = 'Pending'")
-        pending_applications = cursor.fetchone()['count']
-        
-        # Get statistics
-        cursor.execute("SELECT COUNT(*) as count FROM hostel WHERE PaymentStatus = 'Paid'")
-        paid_count = cursor.fetchone()['count']
-        
-        cursor.execute("SELECT COUNT(*) as count FROM hostel WHERE PaymentStatus = 'Pending'")
-        pending_count = cursor.fetchone()['count']
-        
-        cursor.close()
-        conn.close()
-        
-        stats = {
-            'total_beds': total_beds,
-            'reserved_beds': reserved_beds,
-            'available_beds': available_beds,
-            'occupancy_rate': round((reserved_beds / total_beds * 100) if total_beds > 0 else 0, 1),
-            'paid_count': paid_count,
-            'pending_count': pending_count,
-            'pending_applications': pending_applications
-        }
-        
-        return render_template('dashboard.html', stats=stats, 
-                             recent_allotments=recent_allotments, is_admin=True)
+        return [row for row in dashboard_cache.get_or_compute('inventory', load_inventory) 
+                if row['capacity']]
+    except Error as e:
+        print(f"Inventory error: {e}")
+        return []
+
+def admin_dashboard():
+    """Admin dashboard with statistics"""
+    try:
+        data = dashboard_cache.get_or_compute('stats', load_dashboard_stats)
     except Error as e:
         flash('Error loading dashboard data.', 'danger')
         print(f"Dashboard error: {e}")
         return render_template('dashboard.html', stats={}, recent_allotments=[], is_admin=True)
+    
+    total_beds = data['total_beds']
+    reserved_beds = data['reserved_beds']
+    stats = {
+        'total_beds': total_beds,
+        'reserved_beds': reserved_beds,
+        'available_beds': total_beds - reserved_beds,
+        'occupancy_rate': round((reserved_beds / total_beds * 100) if total_beds > 0 else 0, 1),
+        'paid_count': data['paid_count'],
+        'pending_count': data['pending_count'],
+        'pending_applications': data['pending_applications']
+    }
+    
+    return render_template('dashboard.html', stats=stats, 
+                         recent_allotments=data['recent_allotments'], is_admin=True)
 
 def student_dashboard():
     """Student dashboard showing their bed status and applications"""
@@ -307,10 +880,12 @@ def student_dashboard():
         
         # Get student's applications
         cursor.execute("""
-            SELECT id, student_name, student_id, status, applied_date, reviewed_date, bed_no, notes
-            FROM bed_applications 
-            WHERE user_id = %s 
-            ORDER BY applied_date DESC
+            SELECT a.id, a.student_name, a.student_id, a.status, a.applied_date, a.reviewed_date, 
+                   a.bed_no, a.notes, w.application_id IS NOT NULL AS waitlisted
+            FROM bed_applications a
+            LEFT JOIN waitlist w ON w.application_id = a.id
+            WHERE a.user_id = %s 
+            ORDER BY a.applied_date DESC
         """, (current_user.id,))
         applications = cursor.fetchall()
         
@@ -330,29 +905,46 @@ def student_dashboard():
         print(f"Dashboard error: {e}")
         return render_template('student_dashboard.html', bed_info=None, applications=[])
 
+def render_page(template, **context):
+    """Render a listing page, streaming it when the page is large"""
+    if context['page'].per_page > app.config['STREAM_PAGE_SIZE']:
+        return app.response_class(stream_template(template, **context))
+    return render_template(template, **context)
+
+def requested_page_size():
+    return page_size(request.args.get('per_page'), app.config['PAGE_SIZE'], 
+                     app.config['MAX_PAGE_SIZE'])
+
 @app.route('/beds')
 @login_required
+@read_only
 def beds():
-    """View all bed allotments"""
+    """View bed allotments, one page at a time ordered by bed number"""
+    per_page = requested_page_size()
+    after = request.args.get('after', 0, type=int)
+    
     conn = get_db_connection()
     if not conn:
         flash('Database connection error.', 'danger')
         return render_template('beds.html', allotments=[])
     
     try:
+        stats = dashboard_cache.get_or_compute('stats', load_dashboard_stats)
+        
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT BedNo, Name, StudentID, Contact, Email, 
                    CheckInDate, PaymentStatus 
             FROM hostel 
-            ORDER BY BedNo ASC
-        """)
-        allotments = cursor.fetchall()
-        cursor.close()
-        conn.close()
+            WHERE BedNo > %s 
+            ORDER BY BedNo ASC 
+            LIMIT %s
+        """, (after, per_page + 1))
+        page = KeysetPage(cursor, per_page, key=lambda row: row['BedNo'])
         
-        return render_template('beds.html', allotments=allotments, 
-                             total_beds=app.config['TOTAL_BEDS'])
+        return render_page('beds.html', allotments=page, page=page, 
+                           occupied=stats['reserved_beds'], per_page=per_page, after=after, 
+                           total_beds=stats['total_beds'])
     except Error as e:
         flash('Error loading bed data.', 'danger')
         print(f"Beds error: {e}")
@@ -368,10 +960,11 @@ def add_bed():
         student_id = request.form.get('student_id')
         contact = request.form.get('contact')
         email = request.form.get('email')
+        building = request.form.get('building') or None
         
         if not name:
             flash('Student name is required.', 'danger')
-            return render_template('add_bed.html')
+            return render_template('add_bed.html', buildings=building_choices())
         
         conn = get_db_connection()
         if not conn:
@@ -381,51 +974,40 @@ def add_bed():
         try:
             cursor = conn.cursor()
             
-            # Check if all beds are occupied
-            cursor.execute("SELECT COUNT(*) as count FROM hostel")
-            reserved = cursor.fetchone()[0]
-            
-            if reserved >= app.config['TOTAL_BEDS']:
-                cursor.close()
-                conn.close()
-                flash('Sorry! No beds available.', 'warning')
-                return render_template('add_bed.html')
-            
-            # Find next available bed
-            cursor.execute("SELECT BedNo FROM hostel ORDER BY BedNo")
-            occupied = [row[0] for row in cursor.fetchall()]
-            bed_no = None
-            for i in range(1, app.config['TOTAL_BEDS'] + 1):
-                if i not in occupied:
-                    bed_no = i
-                    break
+            # Waitlisted applications were approved earlier, so free beds go to them before a walk-in
+            successors = offer_beds_to_waitlist(conn, building=building)
+            bed_no = insert_allotment(conn, cursor, name, student_id or None, 
+                                      contact or None, email or None, building=building)
             
-            # Insert new allotment
-            cursor.execute("""
-                INSERT INTO hostel (BedNo, Name, StudentID, Contact, Email, 
-                                   CheckInDate, PaymentStatus) 
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """, (bed_no, name, student_id or None, contact or None, 
-                  email or None, datetime.now(), 'Pending'))
+            # Queue email notification if configured
+            if bed_no is not None and email:
+                queue_notification_email(cursor, email, name, bed_no, 'allocation')
             
             conn.commit()
+            if successors:
+                data_changed('application', user_ids=[a['user_id'] for a, _ in successors])
+            elif bed_no is not None:
+                data_changed('occupancy')
+            outbox_sender.wake()
             cursor.close()
             conn.close()
             
-            # Send email notification if configured
-            if email and app.config['MAIL_USERNAME']:
-                try:
-                    send_notification_email(email, name, bed_no, 'allocation')
-                except Exception as e:
-                    print(f"Email error: {e}")
+            if successors:
+                flash(f'{len(successors)} free bed(s) went to waitlisted applications first.', 'info')
+            if bed_no is None:
+                flash(f'Sorry! No beds available in {building}.' if building else 
+                      'Sorry! No beds available.', 'warning')
+                return render_template('add_bed.html', buildings=building_choices())
             
             flash(f'Bed {bed_no} allocated to {name} successfully!', 'success')
             return redirect(url_for('beds'))
         except Error as e:
+            bed_index.invalidate()
+            waitlist.invalidate()
             flash('Error adding bed allotment.', 'danger')
             print(f"Add bed error: {e}")
     
-    return render_template('add_bed.html')
+    return render_template('add_bed.html', buildings=building_choices())
 
 @app.route('/beds/remove/<int:bed_no>', methods=['POST'])
 @login_required
@@ -440,40 +1022,388 @@ def remove_bed(bed_no):
     try:
         cursor = conn.cursor(dictionary=True)
         # Get student info before deletion for email
-        cursor.execute("SELECT Name, Email FROM hostel WHERE BedNo = %s", (bed_no,))
+        cursor.execute("""
+            SELECT h.Name, h.Email, h.user_id, b.building 
+            FROM hostel h 
+            LEFT JOIN beds b ON b.BedNo = h.BedNo 
+            WHERE h.BedNo = %s
+        """, (bed_no,))
         student = cursor.fetchone()
         
         cursor.execute("DELETE FROM hostel WHERE BedNo = %s", (bed_no,))
         
         if cursor.rowcount > 0:
-            conn.commit()
+            # Queue email notification if configured
+            if student and student['Email']:
+                queue_notification_email(cursor, student['Email'], student['Name'], 
+                                         bed_no, 'removal')
             
-            # Send email notification if configured
-            if student and student['Email'] and app.config['MAIL_USERNAME']:
-                try:
-                    send_notification_email(student['Email'], student['Name'], 
-                                          bed_no, 'removal')
-                except Exception as e:
-                    print(f"Email error: {e}")
+            # The freed bed goes straight to the next waitlisted student, if it is still in service
+            successor = allot_to_waitlisted(conn, cursor, bed_no) if claim_beds(conn, [bed_no]) else None
+            if successor and successor['email']:
+                queue_notification_email(cursor, successor['email'], successor['student_name'], 
+                                         bed_no, 'allocation')
+            
+            conn.commit()
+            user_ids = [student['user_id']] if student else []
+            if successor:
+                user_ids.append(successor['user_id'])
+                data_changed('application', user_ids=user_ids)
+            else:
+                data_changed('occupancy', user_ids=user_ids)
+                if student and student['building'] is not None:
+                    bed_index.release(bed_no, student['building'])
+            outbox_sender.wake()
             
-            flash(f'Bed {bed_no} allotment removed successfully!', 'success')
+            if successor:
+                flash(f"Bed {bed_no} allotment removed and the bed allotted to "
+                      f"{successor['student_name']} from the waitlist.", 'success')
+            else:
+                flash(f'Bed {bed_no} allotment removed successfully!', 'success')
         else:
             flash('No allotment found for this bed.', 'warning')
         
         cursor.close()
         conn.close()
     except Error as e:
+        waitlist.invalidate()
         flash('Error removing bed allotment.', 'danger')
         print(f"Remove bed error: {e}")
     
     return redirect(url_for('beds'))
 
+@app.route('/admin/inventory')
+@login_required
+@admin_required
+@read_only
+def inventory():
+    """Bed inventory: capacity per building, and per room for one building"""
+    building = request.args.get('building')
+    try:
+        buildings = dashboard_cache.get_or_compute('inventory', load_inventory)
+    except Error as e:
+        flash('Error loading bed inventory.', 'danger')
+        print(f"Inventory error: {e}")
+        return render_template('inventory.html', buildings=[], building=None, rooms=[])
+    
+    rooms = []
+    if building:
+        conn = get_db_connection()
+        if not conn:
+            flash('Database connection error.', 'danger')
+            return render_template('inventory.html', buildings=buildings, building=None, rooms=[])
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT b.floor, b.room, MIN(b.BedNo) AS first_bed, MAX(b.BedNo) AS last_bed, 
+                       COALESCE(SUM(b.status = 'Active'), 0) AS capacity, 
+                       COUNT(h.BedNo) AS occupied, 
+                       COALESCE(SUM(b.status = 'Retired'), 0) AS retired
+                FROM beds b 
+                LEFT JOIN hostel h ON h.BedNo = b.BedNo 
+                WHERE b.building = %s 
+                GROUP BY b.floor, b.room 
+                ORDER BY b.floor, b.room
+            """, (building,))
+            rooms = cursor.fetchall()
+            cursor.close()
+        except Error as e:
+            flash('Error loading rooms.', 'danger')
+            print(f"Inventory error: {e}")
+    
+    return render_template('inventory.html', buildings=buildings, building=building, rooms=rooms,
+                           max_change=app.config['INVENTORY_MAX_CHANGE'])
+
+@app.route('/admin/inventory/add', methods=['POST'])
+@login_required
+@admin_required
+def add_inventory():
+    """Add beds to a building, optionally as a run of numbered rooms"""
+    building = (request.form.get('building') or '').strip()
+    floor = request.form.get('floor', type=int)
+    first_room = request.form.get('first_room', type=int)
+    rooms = request.form.get('rooms', 1, type=int) or 1
+    beds_per_room = request.form.get('beds_per_room', 1, type=int) or 1
+    count = rooms * beds_per_room
+    
+    if not building or len(building) > 50:
+        flash('Enter a building name of at most 50 characters.', 'danger')
+        return redirect(url_for('inventory'))
+    if rooms < 1 or beds_per_room < 1 or count > app.config['INVENTORY_MAX_CHANGE']:
+        flash(f"Add between 1 and {app.config['INVENTORY_MAX_CHANGE']} beds at a time.", 'warning')
+        return redirect(url_for('inventory', building=building))
+    if rooms > 1 and first_room is None:
+        flash('Enter the first room number to add several rooms.', 'warning')
+        return redirect(url_for('inventory', building=building))
+    
+    conn = get_db_connection()
+    if not conn:
+        flash('Database connection error.', 'danger')
+        return redirect(url_for('inventory'))
+    
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(BedNo), 0) FROM beds")
+        next_bed = cursor.fetchone()[0] + 1
+        bed_nos = list(range(next_bed, next_bed + count))
+        cursor.executemany("""
+            INSERT INTO beds (BedNo, building, floor, room, status) 
+            VALUES (%s, %s, %s, %s, 'Active')
+        """, [(bed_no, building, floor, 
+               str(first_room + i // beds_per_room) if first_room is not None else None) 
+              for i, bed_no in enumerate(bed_nos)])
+        # Applications waiting for a bed get the new ones first
+        successors = offer_beds_to_waitlist(conn, bed_nos=bed_nos)
+        conn.commit()
+        cursor.close()
+        conn.close()
+    except Error as e:
+        waitlist.invalidate()
+        if e.errno == errorcode.ER_DUP_ENTRY:
+            flash('Another admin added beds at the same time; please try again.', 'warning')
+        else:
+            flash('Error adding beds.', 'danger')
+            print(f"Add inventory error: {e}")
+        return redirect(url_for('inventory', building=building))
+    
+    allotted = {bed_no for _, bed_no in successors}
+    bed_index.add([bed_no for bed_no in bed_nos if bed_no not in allotted], building)
+    if successors:
+        data_changed('application', user_ids=[a['user_id'] for a, _ in successors])
+        outbox_sender.wake()
+    else:
+        data_changed('occupancy')
+    flash(f'Added beds {bed_nos[0]}-{bed_nos[-1]} to {building}.' if count > 1 else 
+          f'Added bed {bed_nos[0]} to {building}.', 'success')
+    if successors:
+        flash(f'{len(successors)} of them went to waitlisted applications.', 'info')
+    return redirect(url_for('inventory', building=building))
+
+@app.route('/admin/inventory/retire', methods=['POST'])
+@login_required
+@admin_required
+def retire_inventory():
+    """Take a range of free beds out of service; occupied beds are skipped"""
+    first = request.form.get('first_bed', type=int)
+    last = request.form.get('last_bed', type=int) or first
+    building = request.form.get('building') or None
+    
+    if not first or last < first or last - first >= app.config['INVENTORY_MAX_CHANGE']:
+        flash(f"Enter a range of at most {app.config['INVENTORY_MAX_CHANGE']} bed numbers.", 'warning')
+        return redirect(url_for('inventory', building=building))
+    
+    conn = get_db_connection()
+    if not conn:
+        flash('Database connection error.', 'danger')
+        return redirect(url_for('inventory', building=building))
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        # Lock the beds first, as allocation does, so neither can miss the other
+        cursor.execute("""
+            SELECT b.BedNo, b.building, h.BedNo AS occupied 
+            FROM beds b 
+            LEFT JOIN hostel h ON h.BedNo = b.BedNo 
+            WHERE b.BedNo BETWEEN %s AND %s AND b.status = 'Active' 
+            FOR UPDATE
+        """, (first, last))
+        beds_in_range = cursor.fetchall()
+        cursor.execute("""
+            UPDATE beds SET status = 'Retired' 
+            WHERE BedNo BETWEEN %s AND %s AND status = 'Active' 
+              AND NOT EXISTS (SELECT 1 FROM hostel h WHERE h.BedNo = beds.BedNo)
+        """, (first, last))
+        conn.commit()
+        cursor.close()
+        conn.close()
+    except Error as e:
+        flash('Error retiring beds.', 'danger')
+        print(f"Retire inventory error: {e}")
+        return redirect(url_for('inventory', building=building))
+    
+    retired = {}
+    occupied = []
+    for bed in beds_in_range:
+        if bed['occupied'] is None:
+            retired.setdefault(bed['building'], []).append(bed['BedNo'])
+        else:
+            occupied.append(bed['BedNo'])
+    for name, bed_nos in retired.items():
+        bed_index.retire(bed_nos, name)
+    if retired:
+        data_changed('occupancy')
+    
+    count = sum(len(bed_nos) for bed_nos in retired.values())
+    if occupied:
+        shown = ', '.join(str(b) for b in occupied[:10]) + (' ...' if len(occupied) > 10 else '')
+        flash(f'Retired {count} bed(s); {len(occupied)} occupied bed(s) were kept: {shown}', 'warning')
+    else:
+        flash(f'Retired {count} bed(s).', 'success' if count else 'info')
+    return redirect(url_for('inventory', building=building))
+
+def provision_accounts(lines, max_rows):
+    """Create student accounts from a CSV roster; returns the (created, skipped) accounts"""
+    accounts, skipped = read_roster(lines, max_rows)
+    batch_size = app.config['PROVISION_BATCH_SIZE']
+    
+    conn = get_db_connection()
+    if not conn:
+        raise Error('Database connection error')
+    cursor = conn.cursor()
+    accounts, taken = remove_taken(cursor, accounts, batch_size)
+    cursor.close()
+    skipped += taken
+    # Nobody should wait for this connection while the passwords hash
+    put_db_connection()
+    
+    for account in accounts:
+        if account['password'] is None:
+            account['password'] = temporary_password()
+            account['generated'] = True
+    # Generated passwords are random, so the cheaper PROVISION_HASH_METHOD is enough;
+    # the first login upgrades them to HASH_METHOD
+    hashes = [None] * len(accounts)
+    for generated, method in ((True, app.config['PROVISION_HASH_METHOD']), (False, app.config['HASH_METHOD'])):
+        positions = [i for i, account in enumerate(accounts) if account.get('generated', False) == generated]
+        passwords = [accounts[i]['password'] for i in positions]
+        for i, hashed in zip(positions, password_hasher.hash_many(passwords, method, 
+                                                                  app.config['PROVISION_HASH_WORKERS'])):
+            hashes[i] = hashed
+    
+    conn = get_db_connection()
+    if not conn:
+        raise Error('Database connection error')
+    created, conflicts = insert_accounts(conn, accounts, hashes, batch_size, datetime.now())
+    return created, skipped + conflicts
+
+@app.route('/admin/students/provision', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def provision_students():
+    """Create student accounts in bulk from an uploaded roster; responds with a CSV report"""
+    if request.method == 'GET':
+        return render_template('provision_students.html', max_rows=app.config['PROVISION_WEB_MAX_ROWS'])
+    
+    roster = request.files.get('roster')
+    if not roster or not roster.filename:
+        flash('Choose a roster file to upload.', 'warning')
+        return redirect(url_for('provision_students'))
+    
+    try:
+        # The passwords hash while the request waits, so uploads are kept small;
+        # larger rosters go through the provision-students command
+        created, skipped = provision_accounts(io.TextIOWrapper(roster.stream, encoding='utf-8-sig', newline=''),
+                                              app.config['PROVISION_WEB_MAX_ROWS'])
+    except RosterError as e:
+        flash(f'Roster not accepted: {e}', 'danger')
+        return redirect(url_for('provision_students'))
+    except UnicodeDecodeError:
+        flash('The roster must be a UTF-8 CSV file.', 'danger')
+        return redirect(url_for('provision_students'))
+    except Error as e:
+        flash('Error creating accounts. Uploading the roster again skips accounts already created.', 'danger')
+        print(f"Provisioning error: {e}")
+        return redirect(url_for('provision_students'))
+    
+    out = io.StringIO()
+    write_report(out, created, skipped)
+    flash(f'Created {len(created)} account(s); {len(skipped)} roster row(s) skipped. '
+          'The downloaded report lists generated passwords and skipped rows.', 
+          'success' if created else 'warning')
+    filename = f"provisioned-{datetime.now().strftime('%Y%m%d-%H%M%S')}.csv"
+    return Response(out.getvalue(), mimetype='text/csv', 
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.cli.command('provision-students')
+@click.argument('roster', type=click.Path(exists=True, dir_okay=False))
+@click.option('--report', default='provisioning-report.csv', show_default=True, 
+              help='CSV file for generated passwords and skipped rows')
+def provision_students_command(roster, report):
+    """Create student accounts from a CSV roster (username, email[, password])"""
+    started = time.perf_counter()
+    try:
+        with open(roster, newline='', encoding='utf-8-sig') as lines:
+            created, skipped = provision_accounts(lines, app.config['PROVISION_MAX_ROWS'])
+    except (RosterError, Error) as e:
+        raise click.ClickException(str(e))
+    with open(report, 'w', newline='', encoding='utf-8') as out:
+        write_report(out, created, skipped)
+    print(f"Created {len(created)} account(s), skipped {len(skipped)} row(s) in "
+          f"{time.perf_counter() - started:.1f}s; report written to {report}")
+
+HOSTEL_COLUMNS = "BedNo, Name, StudentID, Contact, Email, CheckInDate, PaymentStatus"
+
+# Cleared if the FULLTEXT indexes are missing, e.g. before setup_database.py has run;
+# the SQLite backend has none and always uses LIKE scans
+_fulltext_search = app.config['DB_BACKEND'] == 'mysql'
+
+def search_hostel(cursor, query, search_type, limit):
+    """Ranked search over hostel rows using the ngram FULLTEXT indexes.
+
+    Terms shorter than one ngram fall back to a prefix match, which can
+    still use the ordinary Name/StudentID indexes.
+    """
+    global _fulltext_search
+    term = query.replace('"', ' ').strip()
+    use_fulltext = _fulltext_search and len(term) >= app.config['SEARCH_NGRAM_SIZE']
+    
+    def text_branch(column):
+        if use_fulltext:
+            return (f"SELECT {HOSTEL_COLUMNS}, MATCH({column}) AGAINST (%s IN BOOLEAN MODE) AS score "
+                    f"FROM hostel WHERE MATCH({column}) AGAINST (%s IN BOOLEAN MODE)",
+                    [f'"{term}"', f'"{term}"'])
+        if _fulltext_search:
+            return (f"SELECT {HOSTEL_COLUMNS}, 1 AS score FROM hostel WHERE {column} LIKE %s",
+                    [f'{term}%'])
+        return (f"SELECT {HOSTEL_COLUMNS}, 1 AS score FROM hostel WHERE {column} LIKE %s",
+                [f'%{term}%'])
+    
+    bed_branch = (f"SELECT {HOSTEL_COLUMNS}, 100 AS score FROM hostel WHERE BedNo = %s", [query])
+    
+    if search_type == 'bed':
+        branches = [bed_branch]
+    elif search_type == 'student_id':
+        branches = [text_branch('StudentID')]
+    elif search_type == 'name':
+        branches = [text_branch('Name')]
+    else:
+        branches = [text_branch('Name'), text_branch('StudentID')]
+        if query.isdigit():
+            branches.append(bed_branch)
+    
+    sql = " UNION ALL ".join(f"SELECT * FROM ({branch} ORDER BY score DESC LIMIT %s) AS branch{i}" 
+                             for i, (branch, _) in enumerate(branches))
+    params = []
+    for _, branch_params in branches:
+        params.extend(branch_params + [limit])
+    
+    try:
+        cursor.execute(f"SELECT * FROM ({sql}) AS matches ORDER BY score DESC, Name", params)
+    except Error as e:
+        if e.errno != errorcode.ER_FT_MATCHING_KEY_NOT_FOUND or not _fulltext_search:
+            raise
+        print("Search note: FULLTEXT indexes missing, using LIKE scans until setup_database.py runs")
+        _fulltext_search = False
+        return search_hostel(cursor, query, search_type, limit)
+    
+    # A row can match on both name and student ID; keep its best-scoring hit
+    results = []
+    seen = set()
+    for row in cursor.fetchall():
+        if row['BedNo'] not in seen:
+            seen.add(row['BedNo'])
+            results.append(row)
+    return results[:limit]
+
 @app.route('/search')
 @login_required
+@rate_limited
+@read_only
 def search():
     """Search for students"""
-    query = request.args.get('q', '')
+    query = request.args.get('q', '').strip()
     search_type = request.args.get('type', 'name')
+    limit = app.config['SEARCH_MAX_RESULTS']
     
     if not query:
         return render_template('search.html', results=[], query='', search_type=search_type)
@@ -485,44 +1415,12 @@ def search():
     
     try:
         cursor = conn.cursor(dictionary=True)
-        
-        if search_type == 'name':
-            cursor.execute("""
-                SELECT BedNo, Name, StudentID, Contact, Email, 
-                       CheckInDate, PaymentStatus 
-                FROM hostel 
-                WHERE Name LIKE %s 
-                ORDER BY Name
-            """, (f'%{query}%',))
-        elif search_type == 'bed':
-            cursor.execute("""
-                SELECT BedNo, Name, StudentID, Contact, Email, 
-                       CheckInDate, PaymentStatus 
-                FROM hostel 
-                WHERE BedNo = %s
-            """, (query,))
-        elif search_type == 'student_id':
-            cursor.execute("""
-                SELECT BedNo, Name, StudentID, Contact, Email, 
-                       CheckInDate, PaymentStatus 
-                FROM hostel 
-                WHERE StudentID LIKE %s 
-                ORDER BY Name
-            """, (f'%{query}%',))
-        else:
-            cursor.execute("""
-                SELECT BedNo, Name, StudentID, Contact, Email, 
-                       CheckInDate, PaymentStatus 
-                FROM hostel 
-                WHERE Name LIKE %s OR StudentID LIKE %s OR BedNo = %s
-                ORDER BY BedNo
-            """, (f'%{query}%', f'%{query}%', query))
-        
-        results = cursor.fetchall()
+        results = search_hostel(cursor, query, search_type, limit)
         cursor.close()
         conn.close()
         
-        return render_template('search.html', results=results, query=query, search_type=search_type)
+        return render_template('search.html', results=results, query=query, 
+                             search_type=search_type, limit=limit)
     except Error as e:
         flash('Error performing search.', 'danger')
         print(f"Search error: {e}")
@@ -549,6 +1447,7 @@ def update_payment(bed_no):
         cursor.execute("UPDATE hostel SET PaymentStatus = %s WHERE BedNo = %s", 
                       (status, bed_no))
         conn.commit()
+        data_changed('occupancy')
         cursor.close()
         conn.close()
         
@@ -562,6 +1461,7 @@ def update_payment(bed_no):
 # Student Routes
 @app.route('/apply', methods=['GET', 'POST'])
 @login_required
+@rate_limited
 def apply_for_bed():
     """Students can apply for a bed"""
     if request.method == 'POST':
@@ -609,6 +1509,7 @@ def apply_for_bed():
                   contact or None, email or current_user.email))
             
             conn.commit()
+            data_changed('application', user_ids=[current_user.id])
             cursor.close()
             conn.close()
             
@@ -622,6 +1523,7 @@ def apply_for_bed():
 
 @app.route('/my-applications')
 @login_required
+@read_only
 def my_applications():
     """View student's own applications"""
     conn = get_db_connection()
@@ -632,10 +1534,12 @@ def my_applications():
     try:
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
-            SELECT id, student_name, student_id, status, applied_date, reviewed_date, bed_no, notes
-            FROM bed_applications 
-            WHERE user_id = %s 
-            ORDER BY applied_date DESC
+            SELECT a.id, a.student_name, a.student_id, a.status, a.applied_date, a.reviewed_date, 
+                   a.bed_no, a.notes, w.application_id IS NOT NULL AS waitlisted
+            FROM bed_applications a
+            LEFT JOIN waitlist w ON w.application_id = a.id
+            WHERE a.user_id = %s 
+            ORDER BY a.applied_date DESC
         """, (current_user.id,))
         applications = cursor.fetchall()
         cursor.close()
@@ -649,6 +1553,7 @@ def my_applications():
 
 @app.route('/my-profile')
 @login_required
+@read_only
 def my_profile():
     """View and edit student profile"""
     conn = get_db_connection()
@@ -685,32 +1590,53 @@ def my_profile():
 @app.route('/admin/applications')
 @login_required
 @admin_required
-def view_applications():
-    """Admin view all bed applications"""
+@read_only
+def view_applications(bulk_results=None):
+    """Admin view bed applications, newest first, one page at a time"""
+    per_page = requested_page_size()
+    before = None
+    if request.method == 'GET' and request.args.get('before'):
+        try:
+            before_date, before_id = request.args['before'].rsplit('_', 1)
+            before = (datetime.fromisoformat(before_date), int(before_id))
+        except ValueError:
+            flash('Invalid page cursor.', 'warning')
+    
     conn = get_db_connection()
     if not conn:
         flash('Database connection error.', 'danger')
-        return render_template('admin_applications.html', applications=[])
+        return render_template('admin_applications.html', applications=[], 
+                             bulk_results=bulk_results)
     
     try:
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+        keyset = ""
+        params = []
+        if before:
+            keyset = "WHERE ba.applied_date < %s OR (ba.applied_date = %s AND ba.id < %s)"
+            params = [before[0], before[0], before[1]]
+        cursor.execute(f"""
             SELECT ba.id, ba.user_id, u.username, u.email, ba.student_name, ba.student_id, 
                    ba.contact, ba.email as app_email, ba.status, ba.applied_date, 
-                   ba.reviewed_date, ba.bed_no, ba.notes
+                   ba.reviewed_date, ba.bed_no, ba.notes, w.priority AS waitlist_priority
             FROM bed_applications ba
             JOIN users u ON ba.user_id = u.id
-            ORDER BY ba.applied_date DESC
-        """)
-        applications = cursor.fetchall()
-        cursor.close()
-        conn.close()
+            LEFT JOIN waitlist w ON w.application_id = ba.id
+            {keyset}
+            ORDER BY ba.applied_date DESC, ba.id DESC
+            LIMIT %s
+        """, params + [per_page + 1])
+        page = KeysetPage(cursor, per_page, 
+                          key=lambda row: f"{row['applied_date'].isoformat()}_{row['id']}")
         
-        return render_template('admin_applications.html', applications=applications)
+        return render_page('admin_applications.html', applications=page, page=page, 
+                           per_page=per_page, paged=bool(before), bulk_results=bulk_results,
+                           buildings=building_choices())
     except Error as e:
         flash('Error loading applications.', 'danger')
         print(f"Applications error: {e}")
-        return render_template('admin_applications.html', applications=[])
+        return render_template('admin_applications.html', applications=[], 
+                             bulk_results=bulk_results)
 
 @app.route('/admin/applications/<int:app_id>/approve', methods=['POST'])
 @login_required
@@ -737,56 +1663,48 @@ def approve_application(app_id):
             flash('Application already processed.', 'warning')
             return redirect(url_for('view_applications'))
         
-        # Check if all beds are occupied
-        cursor.execute("SELECT COUNT(*) as count FROM hostel")
-        reserved = cursor.fetchone()['count']
-        
-        if reserved >= app.config['TOTAL_BEDS']:
+        # Create bed allotment on the lowest free bed
+        bed_no = insert_allotment(conn, cursor, application['student_name'], 
+                                  application['student_id'], application['contact'], 
+                                  application['email'], application['user_id'])
+        if bed_no is None:
+            # Full: the application waits for the next freed bed
+            added = waitlist_applications(cursor, [application])
+            conn.commit()
+            waitlist.add(added)
+            data_changed('application', user_ids=[application['user_id']])
             cursor.close()
             conn.close()
-            flash('Sorry! No beds available.', 'warning')
+            flash('No beds available. The application is on the waitlist and will get the next '
+                  'freed bed.' if added else 'No beds available. The application is already on the '
+                  'waitlist.', 'warning')
             return redirect(url_for('view_applications'))
         
-        # Find next available bed
-        cursor.execute("SELECT BedNo FROM hostel ORDER BY BedNo")
-        occupied = [row['BedNo'] for row in cursor.fetchall()]
-        bed_no = None
-        for i in range(1, app.config['TOTAL_BEDS'] + 1):
-            if i not in occupied:
-                bed_no = i
-                break
-        
-        # Create bed allotment
-        cursor.execute("""
-            INSERT INTO hostel (BedNo, Name, StudentID, Contact, Email, 
-                               CheckInDate, PaymentStatus, user_id) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (bed_no, application['student_name'], application['student_id'], 
-              application['contact'], application['email'], datetime.now(), 
-              'Pending', application['user_id']))
-        
         # Update application status
         cursor.execute("""
             UPDATE bed_applications 
             SET status = 'Approved', reviewed_date = %s, bed_no = %s 
             WHERE id = %s
         """, (datetime.now(), bed_no, app_id))
+        leave_waitlist(cursor, [app_id])
+        
+        # Queue email notification
+        email = application['email'] or application.get('user_email')
+        if email:
+            queue_notification_email(cursor, email, application['student_name'], 
+                                     bed_no, 'allocation')
         
         conn.commit()
+        waitlist.discard([app_id])
+        data_changed('application', user_ids=[application['user_id']])
+        outbox_sender.wake()
         cursor.close()
         conn.close()
         
-        # Send email notification
-        email = application['email'] or application.get('user_email')
-        if email and app.config['MAIL_USERNAME']:
-            try:
-                send_notification_email(email, application['student_name'], bed_no, 'allocation')
-            except Exception as e:
-                print(f"Email error: {e}")
-        
         flash(f'Application approved! Bed {bed_no} allocated.', 'success')
         return redirect(url_for('view_applications'))
     except Error as e:
+        bed_index.invalidate()
         flash('Error approving application.', 'danger')
         print(f"Approve error: {e}")
         return redirect(url_for('view_applications'))
@@ -820,8 +1738,11 @@ def reject_application(app_id):
             SET status = 'Rejected', reviewed_date = %s, notes = %s 
             WHERE id = %s
         """, (datetime.now(), notes, app_id))
+        leave_waitlist(cursor, [app_id])
         
         conn.commit()
+        waitlist.discard([app_id])
+        data_changed('application', user_ids=[application['user_id']])
         cursor.close()
         conn.close()
         
@@ -832,15 +1753,542 @@ def reject_application(app_id):
         print(f"Reject error: {e}")
         return redirect(url_for('view_applications'))
 
-def send_notification_email(email, name, bed_no, action):
-    """Send email notification"""
-    if not app.config['MAIL_USERNAME']:
-        return
+@app.route('/admin/applications/<int:app_id>/priority', methods=['POST'])
+@login_required
+@admin_required
+def waitlist_priority(app_id):
+    """Admin change a waitlisted application's priority (higher gets the next freed bed first)"""
+    priority = request.form.get('priority', type=int)
+    if priority is None:
+        flash('Priority must be a whole number.', 'warning')
+        return redirect(url_for('view_applications'))
+    
+    conn = get_db_connection()
+    if not conn:
+        flash('Database connection error.', 'danger')
+        return redirect(url_for('view_applications'))
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT applied_date FROM waitlist WHERE application_id = %s FOR UPDATE", (app_id,))
+        entry = cursor.fetchone()
+        if not entry:
+            cursor.close()
+            conn.close()
+            flash('Application is not on the waitlist.', 'warning')
+            return redirect(url_for('view_applications'))
+        
+        cursor.execute("UPDATE waitlist SET priority = %s WHERE application_id = %s", (priority, app_id))
+        conn.commit()
+        waitlist.add([(app_id, priority, entry['applied_date'])])
+        cursor.close()
+        conn.close()
+        
+        flash(f'Waitlist priority of application #{app_id} set to {priority}.', 'success')
+    except Error as e:
+        flash('Error updating waitlist priority.', 'danger')
+        print(f"Waitlist priority error: {e}")
+    return redirect(url_for('view_applications'))
+
+@app.route('/admin/applications/bulk', methods=['POST'])
+@login_required
+@admin_required
+def bulk_applications():
+    """Admin approve or reject many pending applications in one transaction"""
+    action = request.form.get('action')
+    notes = request.form.get('notes', '')
+    building = request.form.get('building') or None
+    limit = app.config['BULK_MAX_APPLICATIONS']
+    
+    if action not in ('approve', 'reject'):
+        flash('Invalid bulk action.', 'danger')
+        return redirect(url_for('view_applications'))
+    
+    if request.form.get('selection') == 'oldest':
+        app_ids = None
+        oldest = request.form.get('oldest', type=int) or 0
+        if oldest < 1:
+            flash('Enter how many of the oldest pending applications to process.', 'warning')
+            return redirect(url_for('view_applications'))
+        oldest = min(oldest, limit)
+    else:
+        app_ids = sorted({int(i) for i in request.form.getlist('app_ids') if i.isdigit()})
+        if not app_ids:
+            flash('No applications selected.', 'warning')
+            return redirect(url_for('view_applications'))
+        if len(app_ids) > limit:
+            flash(f'At most {limit} applications can be processed at once.', 'warning')
+            return redirect(url_for('view_applications'))
+    
+    conn = get_db_connection()
+    if not conn:
+        flash('Database connection error.', 'danger')
+        return redirect(url_for('view_applications'))
+    
+    results = []
+    allocated = []
+    added = []
+    try:
+        cursor = conn.cursor(dictionary=True)
+        
+        # Lock the applications we are about to change
+        if app_ids is None and action == 'approve':
+            # Waitlisted applications were approved before and are still owed a bed: they come
+            # first, in waitlist order, then the oldest of the rest. Only pending applications
+            # are waitlisted, so the waitlist index gives the order without a sort.
+            cursor.execute("""
+                SELECT a.id, a.user_id, a.student_name, a.student_id, a.contact, a.email, 
+                       a.status, a.applied_date
+                FROM waitlist w 
+                JOIN bed_applications a ON a.id = w.application_id 
+                ORDER BY w.priority DESC, w.applied_date, w.application_id 
+                LIMIT %s 
+                FOR UPDATE
+            """, (oldest,))
+            rows = cursor.fetchall()
+            if len(rows) < oldest:
+                cursor.execute("""
+                    SELECT id, user_id, student_name, student_id, contact, email, status, applied_date
+                    FROM bed_applications a 
+                    WHERE status = 'Pending' 
+                      AND NOT EXISTS (SELECT 1 FROM waitlist w WHERE w.application_id = a.id) 
+                    ORDER BY applied_date, id 
+                    LIMIT %s 
+                    FOR UPDATE
+                """, (oldest - len(rows),))
+                rows += cursor.fetchall()
+        elif app_ids is None:
+            cursor.execute("""
+                SELECT id, user_id, student_name, student_id, contact, email, status, applied_date
+                FROM bed_applications 
+                WHERE status = 'Pending' 
+                ORDER BY applied_date, id 
+                LIMIT %s 
+                FOR UPDATE
+            """, (oldest,))
+            rows = cursor.fetchall()
+        else:
+            placeholders = ', '.join(['%s'] * len(app_ids))
+            cursor.execute(f"""
+                SELECT id, user_id, student_name, student_id, contact, email, status, applied_date
+                FROM bed_applications 
+                WHERE id IN ({placeholders}) 
+                ORDER BY applied_date, id 
+                FOR UPDATE
+            """, app_ids)
+            rows = cursor.fetchall()
+        
+        found = {row['id'] for row in rows}
+        for app_id in app_ids or []:
+            if app_id not in found:
+                results.append({'id': app_id, 'name': '-', 'outcome': 'Not found', 'bed_no': None})
+        pending = []
+        for row in rows:
+            if row['status'] == 'Pending':
+                pending.append(row)
+            else:
+                results.append({'id': row['id'], 'name': row['student_name'], 
+                                'outcome': 'Already processed', 'bed_no': None})
+        
+        now = datetime.now()
+        if action == 'approve':
+            allocated = bulk_insert_allotments(conn, cursor, pending, now, building)
+            added = waitlist_applications(cursor, pending[len(allocated):])
+            for row in pending[len(allocated):]:
+                results.append({'id': row['id'], 'name': row['student_name'], 
+                                'outcome': 'Waitlisted', 'bed_no': None})
+            if allocated:
+                cases = ' '.join(['WHEN %s THEN %s'] * len(allocated))
+                placeholders = ', '.join(['%s'] * len(allocated))
+                params = [now]
+                for row, bed_no in allocated:
+                    params.extend([row['id'], bed_no])
+                params.extend(row['id'] for row, bed_no in allocated)
+                cursor.execute(f"""
+                    UPDATE bed_applications 
+                    SET status = 'Approved', reviewed_date = %s, 
+                        bed_no = CASE id {cases} END 
+                    WHERE id IN ({placeholders})
+                """, params)
+                leave_waitlist(cursor, [row['id'] for row, bed_no in allocated])
+            for row, bed_no in allocated:
+                results.append({'id': row['id'], 'name': row['student_name'], 
+                                'outcome': 'Approved', 'bed_no': bed_no})
+        elif pending:
+            placeholders = ', '.join(['%s'] * len(pending))
+            cursor.execute(f"""
+                UPDATE bed_applications 
+                SET status = 'Rejected', reviewed_date = %s, notes = %s 
+                WHERE id IN ({placeholders})
+            """, [now, notes] + [row['id'] for row in pending])
+            leave_waitlist(cursor, [row['id'] for row in pending])
+            for row in pending:
+                results.append({'id': row['id'], 'name': row['student_name'], 
+                                'outcome': 'Rejected', 'bed_no': None})
+        
+        if app.config['MAIL_ENABLED']:
+            queue_emails(cursor, [(row['email'],) + notification_email(row['student_name'], bed_no, 'allocation')
+                                  for row, bed_no in allocated if row['email']])
+        
+        conn.commit()
+        # Waitlisted applications that found no bed this time keep their place
+        waitlist.discard([r['id'] for r in results if r['outcome'] in ('Approved', 'Rejected')])
+        waitlist.add(added)
+        data_changed('application', user_ids=[row['user_id'] for row in pending])
+        outbox_sender.wake()
+        cursor.close()
+        conn.close()
+    except Error as e:
+        bed_index.invalidate()
+        flash('Error processing applications. No changes were made.', 'danger')
+        print(f"Bulk applications error: {e}")
+        return redirect(url_for('view_applications'))
+    
+    done = sum(1 for r in results if r['outcome'] in ('Approved', 'Rejected'))
+    waiting = sum(1 for r in results if r['outcome'] == 'Waitlisted')
+    flash(f'{done} of {len(results)} application(s) {action}d' + 
+          (f', {waiting} waitlisted for the next freed beds.' if waiting else '.'), 
+          'success' if done == len(results) else 'warning')
+    results.sort(key=lambda r: r['id'])
+    return view_applications(bulk_results=results)
+
+# Read-only JSON API
+def api_etag(full_path, user_key):
+    """ETag of an API response: the data version, the URL, the caller and the time window"""
+    window = int(time.time() // app.config['API_ETAG_TTL'])
+    return data_version.etag(full_path, user_key, window).strip('"')
+
+def conditional_get(f):
+    """Answer If-None-Match from the data version without running the view"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        user_key = current_user.get_id() if current_user.is_authenticated else '-'
+        etag = api_etag(request.full_path, user_key)
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    return decorated_function
+
+def api_rows(rows):
+    """Make rows JSON-friendly (ISO 8601 dates)"""
+    return [{k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()} 
+            for row in rows]
+
+def api_error(message, status):
+    return jsonify({'error': message}), status
+
+@login_manager.unauthorized_handler
+def unauthorized():
+    """JSON 401 for API clients, redirect to the login page for browsers"""
+    if request.path.startswith('/api/'):
+        return api_error('Authentication required', 401)
+    flash(login_manager.login_message, login_manager.login_message_category)
+    return redirect(login_url(login_manager.login_view, next_url=request.url))
+
+@app.route('/api/v1/stats')
+@conditional_get
+@read_only
+def api_stats():
+    """Occupancy statistics (public, for notice-board displays)"""
+    try:
+        data = dashboard_cache.get_or_compute('stats', load_dashboard_stats)
+    except Error as e:
+        print(f"API stats error: {e}")
+        return api_error('Database error', 503)
+    
+    return jsonify(stats_payload(data))
+
+def stats_payload(data):
+    total_beds = data['total_beds']
+    reserved_beds = data['reserved_beds']
+    return {
+        'total_beds': total_beds,
+        'reserved_beds': reserved_beds,
+        'available_beds': total_beds - reserved_beds,
+        'occupancy_rate': round((reserved_beds / total_beds * 100) if total_beds > 0 else 0, 1),
+        'paid_count': data['paid_count'],
+        'pending_count': data['pending_count'],
+        'pending_applications': data['pending_applications'],
+    }
+
+@app.route('/api/v1/beds')
+@login_required
+@conditional_get
+@read_only
+def api_beds():
+    """Bed roster ordered by bed number, keyset-paginated with ?after="""
+    per_page = requested_page_size()
+    sql, params = beds_page_query(request.args, per_page)
+    
+    conn = get_db_connection()
+    if not conn:
+        return api_error('Database connection error', 503)
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    except Error as e:
+        print(f"API beds error: {e}")
+        return api_error('Database error', 503)
+    
+    return jsonify(beds_payload(rows, per_page))
+
+def beds_page_query(args, per_page):
+    """SQL and parameters for one page of /api/v1/beds (one extra row tells if there is more)"""
+    after = args.get('after', 0, type=int)
+    return f"""
+        SELECT {HOSTEL_COLUMNS} 
+        FROM hostel 
+        WHERE BedNo > %s 
+        ORDER BY BedNo ASC 
+        LIMIT %s
+    """, (after, per_page + 1)
+
+def beds_payload(rows, per_page):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return {
+        'beds': api_rows(rows),
+        'next_after': rows[-1]['BedNo'] if has_more else None,
+    }
+
+@app.route('/api/v1/applications')
+@login_required
+@conditional_get
+@read_only
+def api_applications():
+    """Application status: all applications for admins, your own for students"""
+    per_page = requested_page_size()
+    try:
+        sql, params = applications_page_query(request.args, per_page, current_user)
+    except ValueError:
+        return api_error('Invalid page cursor', 400)
+    
+    conn = get_db_connection()
+    if not conn:
+        return api_error('Database connection error', 503)
+    
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    except Error as e:
+        print(f"API applications error: {e}")
+        return api_error('Database error', 503)
+    
+    return jsonify(applications_payload(rows, per_page))
+
+def applications_page_query(args, per_page, user):
+    """SQL and parameters for one page of /api/v1/applications; ValueError on a bad cursor"""
+    conditions = []
+    params = []
+    if not user.is_admin():
+        conditions.append("user_id = %s")
+        params.append(user.id)
+    if args.get('before'):
+        before_date, before_id = args['before'].rsplit('_', 1)
+        before = (datetime.fromisoformat(before_date), int(before_id))
+        conditions.append("(applied_date < %s OR (applied_date = %s AND id < %s))")
+        params.extend([before[0], before[0], before[1]])
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return f"""
+        SELECT id, user_id, student_name, student_id, status, applied_date, 
+               reviewed_date, bed_no
+        FROM bed_applications 
+        {where}
+        ORDER BY applied_date DESC, id DESC 
+        LIMIT %s
+    """, params + [per_page + 1]
+
+def applications_payload(rows, per_page):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    return {
+        'applications': api_rows(rows),
+        'next_before': f"{rows[-1]['applied_date'].isoformat()}_{rows[-1]['id']}" if has_more else None,
+    }
+
+@app.template_global()
+def live_feed():
+    """Whether pages open the /events stream.
+
+    Under the async entry point a stream costs no thread. On threaded
+    workers each open stream holds a thread for up to SSE_MAX_DURATION, so
+    only admins get one there, and only with SSE_THREADED; otherwise admin
+    pages poll /api/v1/stats and student pages /api/v1/applications.
+    """
+    if app.config.get('SSE_IN_EVENT_LOOP'):
+        return True
+    return (app.config['SSE_THREADED'] and current_user.is_authenticated
+            and current_user.is_admin())
+
+@app.route('/events')
+@login_required
+def events():
+    """Server-Sent Events feed of occupancy and application changes"""
+    if not live_feed():
+        # 204 tells EventSource not to reconnect
+        return '', 204
+    sub = event_bus.subscribe(current_user.is_admin(), int(current_user.id))
+    heartbeat = app.config['SSE_HEARTBEAT']
+    deadline = time.monotonic() + app.config['SSE_MAX_DURATION']
+    # The stream needs no database; hand the connection back before it starts
+    release_db_connection(None)
+    
+    def generate():
+        try:
+            yield f"retry: {app.config['SSE_RETRY_MS']}\n\n"
+            while time.monotonic() < deadline:
+                try:
+                    event = sub.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield SSE_KEEP_ALIVE
+                    continue
+                yield sse_message(event)
+        finally:
+            event_bus.unsubscribe(sub)
+    
+    # Browsers reconnect on their own once the stream reaches SSE_MAX_DURATION
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+SSE_KEEP_ALIVE = ": keep-alive\n\n"
+
+def sse_message(event):
+    return f"event: {event['kind']}\ndata: {json.dumps(event['data'])}\n\n"
+
+# Admin data exports: dataset -> (table, date column, exportable columns, key column)
+EXPORTS = {
+    'allotments': ('hostel', 'CheckInDate', 
+                   ['BedNo', 'Name', 'StudentID', 'Contact', 'Email', 
+                    'CheckInDate', 'PaymentStatus', 'user_id'], 'BedNo'),
+    'applications': ('bed_applications', 'applied_date', 
+                     ['id', 'user_id', 'student_name', 'student_id', 'contact', 'email', 
+                      'status', 'applied_date', 'reviewed_date', 'bed_no', 'notes'], 'id'),
+}
+
+@app.route('/admin/export/<dataset>.<fmt>')
+@login_required
+@admin_required
+@read_only
+def export_data(dataset, fmt):
+    """Stream a table as CSV or NDJSON without loading it into memory"""
+    if dataset not in EXPORTS or fmt not in ('csv', 'ndjson'):
+        flash('Unknown export.', 'danger')
+        return redirect(url_for('beds'))
+    table, date_column, allowed, key = EXPORTS[dataset]
+    
+    columns = allowed
+    if request.args.get('columns'):
+        columns = [c.strip() for c in request.args['columns'].split(',') if c.strip()]
+        unknown = [c for c in columns if c not in allowed]
+        if unknown or not columns:
+            flash(f"Unknown export column(s): {', '.join(unknown) or '-'}", 'danger')
+            return redirect(url_for('beds'))
     
+    conditions = []
+    params = []
     try:
-        if action == 'allocation':
-            subject = f'Hostel Bed Allocated - Bed {bed_no}'
-            body = f'''
+        if request.args.get('from'):
+            conditions.append(f"{date_column} >= %s")
+            params.append(datetime.fromisoformat(request.args['from']))
+        if request.args.get('to'):
+            # A bare date includes the whole day
+            to = datetime.fromisoformat(request.args['to'])
+            if len(request.args['to']) == 10:
+                conditions.append(f"{date_column} < %s")
+                params.append(to + timedelta(days=1))
+            else:
+                conditions.append(f"{date_column} <= %s")
+                params.append(to)
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format.', 'danger')
+        return redirect(url_for('beds'))
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT {', '.join(columns)} FROM {table} {where} ORDER BY {key}"
+    
+    conn = get_db_connection()
+    if not conn:
+        flash('Database connection error.', 'danger')
+        return redirect(url_for('beds'))
+    
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    
+    def generate():
+        # Unbuffered cursor: rows are read from the server one chunk at a time
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(sql, params)
+            out = io.StringIO()
+            writer = csv.writer(out)
+            if fmt == 'csv':
+                writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if fmt == 'csv':
+                    writer.writerows(rows)
+                else:
+                    for row in rows:
+                        out.write(json.dumps(dict(zip(columns, row)), default=str))
+                        out.write('\n')
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+            if fmt == 'csv' and out.tell():
+                yield out.getvalue()
+        except Error as e:
+            print(f"Export error: {e}")
+            # The headers (200) are already sent: abort the response so the client sees a
+            # broken transfer (no final chunk) rather than a file that merely looks short
+            raise
+        finally:
+            cursor.close()
+    
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(generate()), mimetype=mimetype, 
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/admin/metrics')
+@login_required
+@admin_required
+def metrics():
+    """Live runtime statistics for operators"""
+    return jsonify({
+        'db_pool': db_pool.stats(),
+        'replicas': replica_set.stats(),
+        'user_cache': user_cache.stats(),
+        'dashboard_cache': dashboard_cache.stats(),
+        'bed_index': bed_index.stats(),
+        'waitlist': waitlist.stats(),
+        'password_hasher': password_hasher.stats(),
+        'admission': {
+            'user_limit': user_limiter.stats() if user_limiter else None,
+            'ip_limit': ip_limiter.stats() if ip_limiter else None,
+            'db_gate': db_gate.stats() if db_gate else None,
+        },
+        'outbox': outbox_sender.stats(),
+        'data_version': data_version.current()[1],
+        'events': event_bus.stats(),
+    })
+
+def notification_email(name, bed_no, action):
+    """Build the subject and body of a notification email"""
+    if action == 'allocation':
+        subject = f'Hostel Bed Allocated - Bed {bed_no}'
+        body = f'''
 Hello {name},
 
 Your hostel bed has been successfully allocated!
@@ -854,9 +2302,9 @@ Please complete the payment of {app.config['HOSTEL_FEE']} Rupees to confirm your
 Thank you,
 Hostel Management System
             '''
-        else:  # removal
-            subject = f'Hostel Bed Allotment Removed - Bed {bed_no}'
-            body = f'''
+    else:  # removal
+        subject = f'Hostel Bed Allotment Removed - Bed {bed_no}'
+        body = f'''
 Hello {name},
 
 Your hostel bed allotment (Bed {bed_no}) has been removed from the system.
@@ -866,11 +2314,14 @@ If you have any questions, please contact the hostel administration.
 Thank you,
 Hostel Management System
             '''
-        
-        msg = Message(subject, recipients=[email], body=body)
-        mail.send(msg)
-    except Exception as e:
-        print(f"Email sending failed: {e}")
+    return subject, body
+
+def queue_notification_email(cursor, email, name, bed_no, action):
+    """Queue a notification email in the caller's transaction"""
+    if not app.config['MAIL_ENABLED']:
+        return
+    subject, body = notification_email(name, bed_no, action)
+    queue_email(cursor, email, subject, body)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
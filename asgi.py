@@ -0,0 +1,474 @@
+"""
+ASGI Entry Point
+Async deployment mode. The JSON API, the live event stream and the email
+outbox run on the event loop with an async MySQL driver (aiomysql) and SMTP
+client (aiosmtplib), so one worker keeps hundreds of requests in flight
+while they wait on the database or a slow client. Every other route is the
+unchanged Flask app and its templates, run on a thread pool.
+
+    pip install -r requirements-async.txt
+    uvicorn asgi:application --workers 2
+
+With DB_BACKEND=sqlite every route goes to the Flask app.
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.message import EmailMessage
+from http.cookies import CookieError, SimpleCookie
+from urllib.parse import parse_qsl
+
+import aiomysql
+from itsdangerous import BadSignature
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+try:
+    import aiosmtplib
+except ImportError:  # emails go out through the outbox thread instead
+    aiosmtplib = None
+
+from app import (app, User, user_cache, cache_user, dashboard_cache, dashboard_stats,
+                 event_bus, outbox_sender, api_etag, stats_payload, beds_page_query, beds_payload,
+                 applications_page_query, applications_payload, DASHBOARD_COUNTS_SQL,
+                 RECENT_ALLOTMENTS_SQL, SSE_HEADERS, SSE_KEEP_ALIVE, sse_message)
+from outbox import CLAIM_SQL, claim_sql
+from pagination import page_size
+
+
+class Request:
+    """The parts of an ASGI HTTP scope the async routes need"""
+
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.path = scope['path']
+        query = scope['query_string'].decode('latin-1')
+        # Same as Flask's request.full_path, so both modes hand out the same ETags
+        self.full_path = f"{self.path}?{query}"
+        self.args = MultiDict(parse_qsl(query, keep_blank_values=True))
+        self.headers = {}
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').lower()
+            value = value.decode('latin-1')
+            self.headers[name] = f"{self.headers[name]}, {value}" if name in self.headers else value
+        try:
+            self.cookies = SimpleCookie(self.headers.get('cookie', ''))
+        except CookieError:
+            self.cookies = SimpleCookie()
+
+
+def _wsgi_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope (PEP 3333)"""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('127.0.0.1', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        # The whole body is buffered, so chunked uploads can be read without a Content-Length
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class HostelASGI:
+    """ASGI application: async routes on the event loop, the rest through the Flask app.
+
+    The Flask side runs on its own pool of ``ASGI_THREADS`` threads (asgiref's
+    WsgiToAsgi would run every request on one shared thread). An async route
+    returns False to hand a request it cannot answer to Flask, e.g. a session
+    that only Flask-Login's remember-me cookie can restore.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.db = None
+        self.outbox_task = None
+        self.smtp = None
+        self.smtp_used = None
+        self.threads = ThreadPoolExecutor(max_workers=self.config['ASGI_THREADS'],
+                                          thread_name_prefix='flask')
+        self.sessions = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.routes = {
+            '/api/v1/stats': self.api_stats,
+            '/api/v1/beds': self.api_beds,
+            '/api/v1/applications': self.api_applications,
+            '/events': self.events,
+        }
+        self._stats_lock = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        route = self.routes.get(scope['path'])
+        if route and self.db is not None and scope['method'] == 'GET':
+            if await route(Request(scope, receive), send) is not False:
+                return
+        await self.run_flask(scope, receive, send)
+
+    # -- lifespan --------------------------------------------------------
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        self._stats_lock = asyncio.Lock()
+        if self.config['DB_BACKEND'] != 'mysql':
+            return
+        self.db = await aiomysql.create_pool(
+            host=self.config['MYSQL_HOST'], port=self.config['MYSQL_PORT'],
+            user=self.config['MYSQL_USER'], password=self.config['MYSQL_PASSWORD'],
+            db=self.config['MYSQL_DATABASE'], minsize=1, maxsize=self.config['ASYNC_DB_POOL_SIZE'],
+            autocommit=True)
+        # /events is now answered on the event loop, so pages may open it
+        self.config['SSE_IN_EVENT_LOOP'] = True
+        if self.config['MAIL_ENABLED'] and aiosmtplib is not None:
+            self.config['OUTBOX_IN_EVENT_LOOP'] = True
+            self.outbox_task = asyncio.ensure_future(self.run_outbox())
+
+    async def shutdown(self):
+        if self.outbox_task:
+            self.outbox_task.cancel()
+            await self.close_smtp()
+        if self.db is not None:
+            self.db.close()
+            await self.db.wait_closed()
+        self.threads.shutdown(wait=False)
+
+    # -- Flask routes ----------------------------------------------------
+
+    async def run_flask(self, scope, receive, send):
+        """Run the Flask app for one request on the thread pool, streaming its response"""
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        loop = asyncio.get_running_loop()
+        environ = _wsgi_environ(scope, bytes(body))
+        await loop.run_in_executor(self.threads, self._wsgi_call, environ, loop, send)
+
+    def _wsgi_call(self, environ, loop, send):
+        """Runs on a pool thread; each chunk is handed to the event loop to send"""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+            }
+
+        def push(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def start():
+            if not response.get('started'):
+                response['started'] = True
+                push(response['start'])
+
+        chunks = self.flask_app(environ, start_response)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    start()
+                    push({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            start()
+            push({'type': 'http.response.body', 'body': b''})
+        finally:
+            # Closing runs the generator's cleanup, e.g. an SSE unsubscribe
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    # -- async routes ----------------------------------------------------
+
+    async def fetch(self, sql, params=(), one=False):
+        async with self.db.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(sql, params)
+                return await (cursor.fetchone() if one else cursor.fetchall())
+
+    def session_user_id(self, request):
+        morsel = request.cookies.get(self.config['SESSION_COOKIE_NAME'])
+        if morsel is None:
+            return None
+        try:
+            session = self.sessions.loads(
+                morsel.value, max_age=int(self.flask_app.permanent_session_lifetime.total_seconds()))
+        except BadSignature:
+            return None
+        return session.get('_user_id')
+
+    async def current_user(self, request):
+        """The logged-in User, None when logged out, False when Flask has to decide"""
+        user_id = self.session_user_id(request)
+        if user_id is None:
+            return False if 'remember_token' in request.cookies else None
+        cached = user_cache.get(str(user_id))
+        if cached is not None:
+            return User(*cached)
+        user_data = await self.fetch("SELECT id, username, email, role FROM users WHERE id = %s",
+                                     (user_id,), one=True)
+        if not user_data:
+            return None
+        cache_user(user_data)
+        return User(user_data['id'], user_data['username'], user_data['email'], user_data['role'])
+
+    async def respond(self, send, status, body=b'', headers=(), content_type='application/json'):
+        headers = [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())] \
+            + [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def json_response(self, send, status, payload, headers=()):
+        # Compact, like jsonify outside debug mode
+        body = self.flask_app.json.dumps(payload, separators=(',', ':')) + '\n'
+        await self.respond(send, status, body.encode(), headers)
+
+    async def api(self, request, send, compute, login=True):
+        """Shared handling of the JSON API: login, conditional GET, database errors"""
+        user = await self.current_user(request)
+        if user is False:
+            return False
+        if login and user is None:
+            await self.json_response(send, 401, {'error': 'Authentication required'})
+            return True
+        etag = api_etag(request.full_path, user.get_id() if user else '-')
+        cache_headers = [('etag', f'"{etag}"'), ('cache-control', 'no-cache')]
+        if parse_etags(request.headers.get('if-none-match')).contains(etag):
+            await self.respond(send, 304, headers=cache_headers)
+            return True
+        try:
+            status, payload = await compute(user)
+        except (aiomysql.Error, OSError) as e:
+            print(f"API error: {e}")
+            status, payload = 503, {'error': 'Database error'}
+        await self.json_response(send, status, payload, cache_headers if status == 200 else ())
+        return True
+
+    def per_page(self, request):
+        return page_size(request.args.get('per_page'), self.config['PAGE_SIZE'], self.config['MAX_PAGE_SIZE'])
+
+    async def load_stats(self):
+        """Dashboard statistics from the shared cache, computed once per miss"""
+        data = dashboard_cache.get('stats')
+        if data is not None:
+            return data
+        async with self._stats_lock:
+            data = dashboard_cache.get('stats')
+            if data is None:
+                generation = dashboard_cache.generation
+                data = dashboard_stats(await self.fetch(DASHBOARD_COUNTS_SQL, one=True),
+                                       await self.fetch(RECENT_ALLOTMENTS_SQL))
+                dashboard_cache.set('stats', data, generation=generation)
+        return data
+
+    async def api_stats(self, request, send):
+        async def compute(user):
+            return 200, stats_payload(await self.load_stats())
+        return await self.api(request, send, compute, login=False)
+
+    async def api_beds(self, request, send):
+        async def compute(user):
+            per_page = self.per_page(request)
+            rows = await self.fetch(*beds_page_query(request.args, per_page))
+            return 200, beds_payload(rows, per_page)
+        return await self.api(request, send, compute)
+
+    async def api_applications(self, request, send):
+        async def compute(user):
+            per_page = self.per_page(request)
+            try:
+                sql, params = applications_page_query(request.args, per_page, user)
+            except ValueError:
+                return 400, {'error': 'Invalid page cursor'}
+            return 200, applications_payload(await self.fetch(sql, params), per_page)
+        return await self.api(request, send, compute)
+
+    async def disconnect(self, request):
+        """Return once the client has gone away"""
+        while (await request.receive())['type'] != 'http.disconnect':
+            pass
+
+    async def events(self, request, send):
+        """Server-Sent Events feed; an idle stream costs no thread"""
+        user = await self.current_user(request)
+        if not user:
+            return False  # Flask redirects browsers to the login page
+        loop = asyncio.get_running_loop()
+        sub = event_bus.subscribe(user.is_admin(), int(user.id), loop=loop)
+        deadline = loop.time() + self.config['SSE_MAX_DURATION']
+        disconnected = asyncio.ensure_future(self.disconnect(request))
+        try:
+            headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+            headers += [(k.lower().encode(), v.encode()) for k, v in SSE_HEADERS.items()]
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await send({'type': 'http.response.body', 'more_body': True,
+                        'body': f"retry: {self.config['SSE_RETRY_MS']}\n\n".encode()})
+            while loop.time() < deadline:
+                event = asyncio.ensure_future(sub.queue.get())
+                done, _ = await asyncio.wait({event, disconnected}, timeout=self.config['SSE_HEARTBEAT'],
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    event.cancel()
+                    return True
+                if event in done:
+                    chunk = sse_message(event.result())
+                else:
+                    event.cancel()
+                    chunk = SSE_KEEP_ALIVE
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+            return True
+        finally:
+            disconnected.cancel()
+            event_bus.unsubscribe(sub)
+
+    # -- email outbox ----------------------------------------------------
+
+    async def run_outbox(self):
+        """Drain the outbox on the event loop, sleeping until woken or the next poll"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                while await self.drain_outbox() == outbox_sender.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                outbox_sender.record(error=True)
+                print(f"Outbox error: {e}")
+            if self.smtp is not None and loop.time() - self.smtp_used >= outbox_sender.smtp_idle:
+                await self.close_smtp()
+            await loop.run_in_executor(None, outbox_sender.wait)
+
+    async def drain_outbox(self):
+        """Send one batch of due emails; returns how many were attempted"""
+        # Claim and commit first, so no row lock is held while the emails go out
+        async with self.db.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(CLAIM_SQL, (datetime.now(), outbox_sender.batch_size))
+                    batch = await cursor.fetchall()
+                    if batch:
+                        await cursor.execute(*claim_sql(batch, outbox_sender.claim_lease))
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+        if not batch:
+            return 0
+        updates, counts = outbox_sender.outcomes(batch, await self.send_emails(batch))
+        async with self.db.acquire() as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor() as cursor:
+                    for sql, params in updates:
+                        await cursor.execute(sql, params)
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+        outbox_sender.record(counts)
+        return len(batch)
+
+    async def send_emails(self, batch):
+        """Send a batch over the SMTP session, kept open between batches; returns an error (or None) per email"""
+        config = self.config
+        results = []
+        for email in batch:
+            message = EmailMessage()
+            message['From'] = config['MAIL_DEFAULT_SENDER']
+            message['To'] = email['recipient']
+            message['Subject'] = email['subject']
+            message.set_content(email['body'])
+            try:
+                await self.deliver(message)
+                results.append(None)
+            except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPConnectError, OSError) as e:
+                # Could not connect (or the connection dropped); retry the rest later
+                await self.close_smtp()
+                results.extend([e] * (len(batch) - len(results)))
+                break
+            except aiosmtplib.SMTPException as e:
+                results.append(e)
+        return results
+
+    async def deliver(self, message):
+        # A session the server closed while idle gets one reconnect
+        fresh = self.smtp is None
+        if fresh:
+            await self.connect_smtp()
+        try:
+            await self.smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            if fresh:
+                raise
+            await self.close_smtp()
+            await self.connect_smtp()
+            await self.smtp.send_message(message)
+        self.smtp_used = asyncio.get_running_loop().time()
+
+    async def connect_smtp(self):
+        config = self.config
+        smtp = aiosmtplib.SMTP(hostname=config['MAIL_SERVER'], port=config['MAIL_PORT'],
+                               use_tls=config.get('MAIL_USE_SSL', False),
+                               start_tls=config['MAIL_USE_TLS'],
+                               username=config['MAIL_USERNAME'] or None,
+                               password=config['MAIL_PASSWORD'] or None)
+        await smtp.connect()
+        self.smtp = smtp
+        self.smtp_used = asyncio.get_running_loop().time()
+
+    async def close_smtp(self):
+        smtp, self.smtp = self.smtp, None
+        if smtp is not None:
+            try:
+                await smtp.quit()
+            except (aiosmtplib.SMTPException, OSError):
+                smtp.close()
+
+
+application = HostelASGI(app)
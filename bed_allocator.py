@@ -0,0 +1,163 @@
+"""
+Free Bed Index
+Min-heaps of free bed numbers, one per building, so allocation does not
+rescan the hostel table and only reads the building it allocates in.
+"""
+
+import heapq
+import threading
+import time
+
+
+class _Partition:
+    """Free beds of one building"""
+
+    def __init__(self):
+        self.heap = []
+        self.free = set()
+        self.built_at = None
+        self.lock = threading.Lock()
+
+
+class FreeBedIndex:
+    """Lowest-free-bed lookup in O(log n), partitioned by building.
+
+    The index is a per-process hint: the unique BedNo key in the hostel table
+    is still what prevents double allocation, and callers lock the bed's
+    inventory row to check it has not been retired. Beds taken or retired by
+    another worker surface at that point and the caller simply acquires
+    again; beds freed or added by another worker are picked up on the next
+    periodic resync of their building.
+    """
+
+    def __init__(self, resync_after=60):
+        self.resync_after = resync_after
+        self._partitions = {}
+        self._buildings = []
+        self._buildings_at = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def _stale(self, built_at, min_age=0):
+        if built_at is None:
+            return True
+        age = time.monotonic() - built_at
+        return age >= self.resync_after or (min_age and age >= min_age)
+
+    def buildings(self, conn, min_age=0):
+        """Names of buildings with beds in service, in allocation order"""
+        with self._lock:
+            if self._stale(self._buildings_at, min_age):
+                cursor = conn.cursor()
+                cursor.execute("SELECT DISTINCT building FROM beds WHERE status = 'Active' ORDER BY building")
+                self._buildings = [row[0] for row in cursor.fetchall()]
+                cursor.close()
+                self._buildings_at = time.monotonic()
+            return list(self._buildings)
+
+    def _partition(self, building):
+        with self._lock:
+            return self._partitions.setdefault(building, _Partition())
+
+    def _build(self, conn, building, partition):
+        """Load one building's free beds and heapify them"""
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT b.BedNo FROM beds b
+            LEFT JOIN hostel h ON h.BedNo = b.BedNo
+            WHERE b.building = %s AND b.status = 'Active' AND h.BedNo IS NULL
+            ORDER BY b.BedNo
+        """, (building,))
+        # Rows arrive sorted, so the list is a valid heap
+        partition.heap = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        partition.free = set(partition.heap)
+        partition.built_at = time.monotonic()
+        with self._lock:
+            self.rebuilds += 1
+
+    def acquire(self, conn, building=None):
+        """Take the lowest free bed in ``building`` (the first building with
+        one when None), or None if there is no free bed"""
+        if building is not None:
+            return self._acquire_in(conn, building)
+        tried = set()
+        for min_age in (0, 1):
+            # A building another worker just added shows up on the second pass
+            for name in self.buildings(conn, min_age):
+                if name not in tried:
+                    tried.add(name)
+                    bed_no = self._acquire_in(conn, name)
+                    if bed_no is not None:
+                        return bed_no
+        return None
+
+    def _acquire_in(self, conn, building):
+        partition = self._partition(building)
+        with partition.lock:
+            if self._stale(partition.built_at):
+                self._build(conn, building, partition)
+            bed_no = self._pop(partition)
+            if bed_no is None and self._stale(partition.built_at, min_age=1):
+                # Another worker may have freed a bed since we last looked
+                self._build(conn, building, partition)
+                bed_no = self._pop(partition)
+            return bed_no
+
+    def _pop(self, partition):
+        while partition.heap:
+            bed_no = heapq.heappop(partition.heap)
+            if bed_no in partition.free:
+                partition.free.discard(bed_no)
+                return bed_no
+        return None
+
+    def release(self, bed_no, building):
+        """Mark a bed as free again after its allotment is removed"""
+        self.add([bed_no], building)
+
+    def add(self, bed_nos, building):
+        """Make new (or newly freed) beds of ``building`` available"""
+        partition = self._partition(building)
+        with partition.lock:
+            if partition.built_at is not None:
+                for bed_no in bed_nos:
+                    if bed_no not in partition.free:
+                        partition.free.add(bed_no)
+                        heapq.heappush(partition.heap, bed_no)
+        with self._lock:
+            if building not in self._buildings:
+                self._buildings_at = None
+
+    def retire(self, bed_nos, building):
+        """Stop offering beds that were taken out of service"""
+        partition = self._partition(building)
+        with partition.lock:
+            # Heap entries without a free-set entry are skipped when popped
+            partition.free.difference_update(bed_nos)
+        with self._lock:
+            self._buildings_at = None
+
+    def invalidate(self, building=None):
+        """Force a rebuild of one building (every building when None) on its next allocation"""
+        with self._lock:
+            if building is None:
+                partitions = list(self._partitions.values())
+                self._buildings_at = None
+            else:
+                partitions = [self._partitions[building]] if building in self._partitions else []
+        for partition in partitions:
+            with partition.lock:
+                partition.built_at = None
+
+    def stats(self):
+        with self._lock:
+            partitions = dict(self._partitions)
+            rebuilds = self.rebuilds
+        free = {name: len(p.free) for name, p in sorted(partitions.items()) if p.built_at is not None}
+        return {
+            'buildings': len(partitions),
+            'free': sum(free.values()),
+            'free_by_building': free,
+            'rebuilds': rebuilds,
+        }
@@ -0,0 +1,476 @@
+"""
+Route Benchmark
+Seeds a scratch database and drives every route with concurrent simulated
+admins and students, then reports throughput, latency percentiles and
+queries per request (from the app's Server-Timing header). Results are
+saved as JSON so runs can be compared.
+
+Examples:
+    MYSQL_DATABASE=hostel_bench python benchmark.py --seed --beds 500 --users 2000 --applications 3000
+    MYSQL_DATABASE=hostel_bench python benchmark.py --duration 30 --admins 2 --students 20 --output bench_results/base.json
+    MYSQL_DATABASE=hostel_bench python benchmark.py --compare bench_results/base.json
+    DB_BACKEND=sqlite SQLITE_PATH=hostel_bench.db python benchmark.py --seed --duration 30
+    python benchmark.py --base-url http://localhost:8000 --duration 30
+    MYSQL_DATABASE=hostel_bench python benchmark.py --serve sync --pollers 200 --output bench_results/sync.json
+    MYSQL_DATABASE=hostel_bench python benchmark.py --serve async --pollers 200 --compare bench_results/sync.json
+"""
+
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+BENCH_PASSWORD = 'benchpass'
+_SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+# ---------------------------------------------------------------------------
+# Seeding
+# ---------------------------------------------------------------------------
+
+def seed_database(beds, users, applications, force=False, capacity=None):
+    """Fill a scratch database with benchmark users, allotments and applications"""
+    from config import Config
+    from setup_database import setup_database, populate
+
+    database = Config.SQLITE_PATH if Config.DB_BACKEND == 'sqlite' else Config.MYSQL_DATABASE
+    if 'bench' not in database and not force:
+        sys.exit(f"Refusing to wipe '{database}'; use a *bench* database or --force")
+    if not setup_database():
+        sys.exit("Schema setup failed")
+    # Plenty of pending applications so the admins always have something to approve
+    if not populate(beds, users, applications, BENCH_PASSWORD, admin_username='bench_admin',
+                    username_prefix='bench_student_', pending_ratio=0.5, wipe=True, capacity=capacity):
+        sys.exit("Seeding failed")
+
+
+def search_term():
+    """A surname drawn like the generated ones, so searches find realistic match counts"""
+    from setup_database import LAST_NAMES
+    return urllib.parse.quote_plus(random.choice(LAST_NAMES))
+
+
+# ---------------------------------------------------------------------------
+# Clients
+# ---------------------------------------------------------------------------
+
+class InProcessClient:
+    """Drives the Flask app directly through its test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        body = response.get_data()
+        return response.status_code, body, response.headers
+
+
+class HttpClient:
+    """Drives a running server (gunicorn, uvicorn, ...) over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar),
+                                                  _NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data or {}, doseq=True).encode() if method == 'POST' else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as response:
+                return response.status, response.read(), response.headers
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), e.headers
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Simulated users
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    """Collects per-route latencies from all simulated users"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, route, seconds, ok, queries=None):
+        with self.lock:
+            entry = self.samples.setdefault(route, {'latencies': [], 'errors': 0, 'queries': []})
+            entry['latencies'].append(seconds)
+            if not ok:
+                entry['errors'] += 1
+            if queries is not None:
+                entry['queries'].append(queries)
+
+
+def timed(client, recorder, route, method, path, data=None, login_ok=False):
+    """Time one request; errors and unexpected redirects to /login count as failures"""
+    start = time.perf_counter()
+    try:
+        status, body, headers = client.request(method, path, data)
+    except Exception as e:
+        recorder.record(route, time.perf_counter() - start, False)
+        print(f"{route}: {e}")
+        return None, b''
+    ok = status < 400 and (login_ok or not redirects_to_login(status, headers))
+    recorder.record(route, time.perf_counter() - start, ok, queries_from(headers))
+    return status, body
+
+
+def redirects_to_login(status, headers):
+    """A lost session shows up as a redirect to the login page, not as an error status"""
+    location = headers.get('Location', '') or ''
+    return status in (301, 302, 303, 307) and urllib.parse.urlsplit(location).path == '/login'
+
+
+def queries_from(headers):
+    """Statement count reported in the app's Server-Timing header"""
+    match = _SERVER_TIMING_QUERIES.search(headers.get('Server-Timing', '') or '')
+    return int(match.group(1)) if match else 0
+
+
+def run_admin(client, recorder, stop):
+    timed(client, recorder, 'POST /login', 'POST', '/login',
+          {'username': 'bench_admin', 'password': BENCH_PASSWORD})
+    actions = [
+        (5, lambda: timed(client, recorder, 'GET /dashboard', 'GET', '/dashboard')),
+        (3, lambda: timed(client, recorder, 'GET /beds', 'GET', '/beds')),
+        (3, lambda: timed(client, recorder, 'GET /admin/applications', 'GET', '/admin/applications')),
+        (3, lambda: timed(client, recorder, 'GET /search', 'GET',
+                          f'/search?type=all&q={search_term()}')),
+        (1, lambda: timed(client, recorder, 'GET /api/v1/stats', 'GET', '/api/v1/stats')),
+        (2, lambda: approve_one(client, recorder)),
+        (1, lambda: reject_one(client, recorder)),
+        (1, lambda: timed(client, recorder, 'POST /admin/applications/bulk', 'POST',
+                          '/admin/applications/bulk',
+                          {'action': 'approve', 'selection': 'oldest', 'oldest': 5})),
+        (1, lambda: timed(client, recorder, 'POST /beds/add', 'POST', '/beds/add',
+                          {'name': 'Bench Walk-in', 'email': ''})),
+        (1, lambda: remove_one(client, recorder)),
+        (1, lambda: update_payment_one(client, recorder)),
+        (1, lambda: timed(client, recorder, 'GET /admin/inventory', 'GET', '/admin/inventory')),
+        (0.2, lambda: timed(client, recorder, 'POST /admin/inventory/add', 'POST', '/admin/inventory/add',
+                            {'building': 'Bench Annex', 'rooms': 1, 'beds_per_room': 1})),
+        (0.2, lambda: timed(client, recorder, 'GET /admin/export/<dataset>.<fmt>', 'GET',
+                            f"/admin/export/{random.choice(['allotments', 'applications'])}.csv")),
+    ]
+    _loop(actions, stop)
+
+
+def pending_applications(client, recorder):
+    status, body = timed(client, recorder, 'GET /api/v1/applications', 'GET',
+                         '/api/v1/applications?per_page=50')
+    if status != 200:
+        return []
+    return [a['id'] for a in json.loads(body)['applications'] if a['status'] == 'Pending']
+
+
+def allotted_beds(client, recorder):
+    after = random.randint(0, 400)
+    status, body = timed(client, recorder, 'GET /api/v1/beds', 'GET',
+                         f'/api/v1/beds?per_page=20&after={after}')
+    if status != 200:
+        return []
+    return [b['BedNo'] for b in json.loads(body)['beds']]
+
+
+def approve_one(client, recorder):
+    pending = pending_applications(client, recorder)
+    if pending:
+        timed(client, recorder, 'POST /admin/applications/<id>/approve', 'POST',
+              f'/admin/applications/{random.choice(pending)}/approve')
+
+
+def reject_one(client, recorder):
+    pending = pending_applications(client, recorder)
+    if pending:
+        timed(client, recorder, 'POST /admin/applications/<id>/reject', 'POST',
+              f'/admin/applications/{random.choice(pending)}/reject', {'notes': 'Benchmark'})
+
+
+def remove_one(client, recorder):
+    beds = allotted_beds(client, recorder)
+    if beds:
+        timed(client, recorder, 'POST /beds/remove/<bed_no>', 'POST', f'/beds/remove/{random.choice(beds)}')
+
+
+def update_payment_one(client, recorder):
+    beds = allotted_beds(client, recorder)
+    if beds:
+        timed(client, recorder, 'POST /beds/update_payment/<bed_no>', 'POST',
+              f'/beds/update_payment/{random.choice(beds)}', {'status': random.choice(['Paid', 'Pending'])})
+
+
+def run_student(client, recorder, stop, number):
+    timed(client, recorder, 'POST /login', 'POST', '/login',
+          {'username': f'bench_student_{number}', 'password': BENCH_PASSWORD})
+    actions = [
+        (5, lambda: timed(client, recorder, 'GET /dashboard', 'GET', '/dashboard')),
+        (2, lambda: timed(client, recorder, 'GET /my-applications', 'GET', '/my-applications')),
+        (2, lambda: timed(client, recorder, 'GET /my-profile', 'GET', '/my-profile')),
+        (1, lambda: timed(client, recorder, 'GET /beds', 'GET', '/beds')),
+        (1, lambda: timed(client, recorder, 'GET /search', 'GET',
+                          f'/search?type=name&q={search_term()}')),
+        (1, lambda: timed(client, recorder, 'POST /apply', 'POST', '/apply',
+                          {'student_name': f'Bench Student {number}', 'student_id': f'BS{number:06d}'})),
+        (0.2, lambda: register_one(client, recorder, number)),
+    ]
+    _loop(actions, stop)
+
+
+def register_one(client, recorder, number):
+    """Sign out, register a fresh account, and sign back in as the same bench student"""
+    timed(client, recorder, 'GET /logout', 'GET', '/logout', login_ok=True)
+    suffix = f'{number}_{time.monotonic_ns()}_{random.randrange(1 << 20)}'
+    timed(client, recorder, 'POST /register', 'POST', '/register',
+          {'username': f'bench_new_{suffix}', 'email': f'bench_new_{suffix}@example.com',
+           'password': BENCH_PASSWORD, 'confirm_password': BENCH_PASSWORD}, login_ok=True)
+    timed(client, recorder, 'POST /login', 'POST', '/login',
+          {'username': f'bench_student_{number}', 'password': BENCH_PASSWORD})
+
+
+def run_poller(client, recorder, stop, number):
+    """A dashboard tab or notice board polling the JSON API (mostly waiting on I/O)"""
+    timed(client, recorder, 'POST /login', 'POST', '/login',
+          {'username': f'bench_student_{number}', 'password': BENCH_PASSWORD})
+    actions = [
+        (2, lambda: timed(client, recorder, 'GET /api/v1/stats', 'GET', '/api/v1/stats')),
+        (1, lambda: timed(client, recorder, 'GET /api/v1/applications', 'GET', '/api/v1/applications')),
+        (1, lambda: timed(client, recorder, 'GET /api/v1/beds', 'GET', '/api/v1/beds?per_page=20')),
+    ]
+    _loop(actions, stop)
+
+
+def _loop(actions, stop):
+    weights = [w for w, _ in actions]
+    calls = [c for _, c in actions]
+    while not stop.is_set():
+        random.choices(calls, weights)[0]()
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(recorder, elapsed):
+    routes = {}
+    total = 0
+    for route, entry in sorted(recorder.samples.items()):
+        latencies = entry['latencies']
+        total += len(latencies)
+        routes[route] = {
+            'requests': len(latencies),
+            'errors': entry['errors'],
+            'throughput_rps': round(len(latencies) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        }
+        if entry['queries']:
+            routes[route]['queries_per_request'] = round(sum(entry['queries']) / len(entry['queries']), 2)
+    return {'requests': total, 'throughput_rps': round(total / elapsed, 2), 'routes': routes}
+
+
+def server_questions():
+    """Server-side statement counter, used for queries per request"""
+    try:
+        import mysql.connector
+        from config import Config
+        if Config.DB_BACKEND != 'mysql':
+            return None
+        conn = mysql.connector.connect(host=Config.MYSQL_HOST, user=Config.MYSQL_USER,
+                                       password=Config.MYSQL_PASSWORD, port=Config.MYSQL_PORT)
+        cursor = conn.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        value = int(cursor.fetchone()[1])
+        conn.close()
+        return value
+    except Exception:
+        return None
+
+
+def print_report(results):
+    print(f"\n{'Route':45} {'req':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6}")
+    for route, stats in results['routes'].items():
+        print(f"{route:45} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8} "
+              f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8} "
+              f"{stats.get('queries_per_request', '-'):>6}")
+    print(f"\nTotal: {results['requests']} requests, {results['throughput_rps']} req/s"
+          + (f", {results['queries_per_request']} queries/request" if results.get('queries_per_request') else ''))
+
+
+def compare(results, baseline_path, threshold):
+    """Print differences against a saved baseline; returns False on a regression"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\nCompared with {baseline_path} ({baseline.get('label')}, {baseline.get('timestamp')}):")
+    for route, stats in results['routes'].items():
+        old = baseline['routes'].get(route)
+        if not old or not old['p95_ms']:
+            continue
+        change = (stats['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100
+        flag = ''
+        if change > threshold:
+            flag = '  <-- regression'
+            ok = False
+        print(f"  {route:45} p95 {old['p95_ms']:>8} -> {stats['p95_ms']:>8} ms ({change:+.1f}%){flag}")
+    if baseline.get('throughput_rps'):
+        change = (results['throughput_rps'] - baseline['throughput_rps']) / baseline['throughput_rps'] * 100
+        print(f"  {'throughput':45} {baseline['throughput_rps']:>8} -> {results['throughput_rps']:>8} req/s ({change:+.1f}%)")
+    return ok
+
+
+SERVERS = {
+    # The Procfile's deployment, and the ASGI mode (asgi.py)
+    'sync': lambda port, workers: [sys.executable, '-m', 'gunicorn', 'app:app', '--worker-class', 'gthread',
+                                   '--threads', os.getenv('GUNICORN_THREADS', '8'),
+                                   '--workers', str(workers), '--bind', f'127.0.0.1:{port}'],
+    'async': lambda port, workers: [sys.executable, '-m', 'uvicorn', 'asgi:application', '--no-access-log',
+                                    '--workers', str(workers), '--port', str(port)],
+}
+
+
+def start_server(mode, port, workers):
+    """Start the app under gunicorn (sync) or uvicorn (async) and wait until it answers"""
+    process = subprocess.Popen(SERVERS[mode](port, workers))
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"The {mode} server exited with status {process.returncode}")
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=2).close()
+            return process, base_url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"The {mode} server did not start within 30s")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', action='store_true', help='wipe and seed the configured database first')
+    parser.add_argument('--force', action='store_true', help='allow seeding a database without "bench" in its name')
+    parser.add_argument('--beds', type=int, default=500)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--applications', type=int, default=3000)
+    parser.add_argument('--admins', type=int, default=2)
+    parser.add_argument('--students', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run the load')
+    parser.add_argument('--pollers', type=int, default=0, help='simulated students polling the JSON API')
+    parser.add_argument('--base-url', help='benchmark a running server instead of the app in-process')
+    parser.add_argument('--serve', choices=sorted(SERVERS),
+                        help='start the app locally under gunicorn (sync) or uvicorn (async) and benchmark it')
+    parser.add_argument('--port', type=int, default=8765, help='port for --serve')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes for --serve')
+    parser.add_argument('--label', default=None, help='name stored with the results')
+    parser.add_argument('--output', help='write results as JSON to this path')
+    parser.add_argument('--compare', help='baseline JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=20, help='allowed p95 regression in percent')
+    args = parser.parse_args()
+    # Every simulated user comes from this host with no think time: measure the routes,
+    # not the per-user rate limits (applies to --serve and the in-process client)
+    os.environ.setdefault('RATE_LIMIT_USER_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_IP_RATE', '0')
+
+    if args.seed:
+        # Enough spare beds that approvals keep finding free ones during the run
+        seed_database(args.beds, args.users, args.applications, force=args.force,
+                      capacity=max(args.beds * 2, args.beds + 1000))
+        if not args.duration:
+            return
+
+    server = None
+    if args.serve:
+        server, args.base_url = start_server(args.serve, args.port, args.workers)
+    if args.base_url:
+        make_client = lambda: HttpClient(args.base_url)
+    else:
+        from app import app
+        make_client = lambda: InProcessClient(app)
+
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=run_admin, args=(make_client(), recorder, stop))
+               for _ in range(args.admins)]
+    threads += [threading.Thread(target=run_student,
+                                 args=(make_client(), recorder, stop, random.randint(1, args.users)))
+                for _ in range(args.students)]
+    threads += [threading.Thread(target=run_poller,
+                                 args=(make_client(), recorder, stop, random.randint(1, args.users)))
+                for _ in range(args.pollers)]
+
+    questions_before = server_questions()
+    start = time.perf_counter()
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    elapsed = time.perf_counter() - start
+    questions_after = server_questions()
+
+    results = summarize(recorder, elapsed)
+    if questions_before is not None and questions_after is not None and results['requests']:
+        results['queries_per_request'] = round((questions_after - questions_before) / results['requests'], 2)
+    results.update({
+        'label': args.label or args.serve or ('http' if args.base_url else 'in-process'),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'config': {k: getattr(args, k) for k in ('admins', 'students', 'pollers', 'duration', 'base_url',
+                                                 'serve', 'workers')},
+        'elapsed_s': round(elapsed, 2),
+    })
+
+    print_report(results)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n[OK] Results saved to {args.output}")
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+In-process Caches
+Small thread-safe caches used to keep hot lookups off the database.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries expire after ``ttl`` seconds"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.computes = 0
+
+    def get(self, key, default=None):
+        """Return a cached value, or ``default`` if missing or expired"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    @property
+    def generation(self):
+        """Changes whenever entries are invalidated"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation=None):
+        """Store a value, evicting the least recently used entry when full.
+
+        With ``generation`` (read before computing the value) nothing is
+        stored if the cache was invalidated in the meantime.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value, computing it at most once on a miss.
+
+        Concurrent misses for the same key wait for the first caller instead
+        of all hitting the database. A value computed while the cache was
+        invalidated is returned but not stored.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            with self._lock:
+                generation = self._generation
+                self.computes += 1
+            value = compute()
+            with self._lock:
+                if generation == self._generation:
+                    self._data[key] = (value, time.monotonic() + self.ttl)
+                    self._data.move_to_end(key)
+                    while len(self._data) > self.maxsize:
+                        self._data.popitem(last=False)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self):
+        """Hit/miss counters for the metrics endpoint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'computes': self.computes,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,218 @@
+"""
+Query Plan Check
+Drives every route against a seeded database, captures each distinct
+statement the app runs and EXPLAINs it. Exits non-zero when a statement
+reads a whole table or sorts rows the index order should have provided
+(MySQL type=ALL / "Using filesort", SQLite SCAN / "USE TEMP B-TREE").
+
+Examples:
+    MYSQL_DATABASE=hostel_bench python check_query_plans.py --seed
+    DB_BACKEND=sqlite SQLITE_PATH=hostel_bench.db python check_query_plans.py --seed
+"""
+
+import argparse
+import io
+import re
+import sys
+
+# Statements allowed to scan or sort, with the reason and the backend it applies to (None for any)
+ALLOWED = [
+    (re.compile(r'^SELECT \* FROM \(SELECT \* FROM \(SELECT BedNo'),
+     'search ranks matches by relevance; substring LIKE (no FULLTEXT) has to scan', 'sqlite'),
+    (re.compile(r'^SELECT [\w, ]+ FROM (hostel|bed_applications)( WHERE .*)? ORDER BY (BedNo|id)$'),
+     'exports stream the whole table', None),
+    (re.compile(r'WHERE id IN \(\.\.\.\) ORDER BY applied_date, id FOR UPDATE'),
+     'sorts only the selected applications (at most BULK_MAX_APPLICATIONS)', None),
+]
+
+TABLES = {'users', 'beds', 'hostel', 'bed_applications', 'email_outbox', 'waitlist', 'schema_version'}
+
+
+def retire_free_beds(bed_nos=None):
+    """Retire every free bed, so approvals find the hostel full, and return them;
+    with ``bed_nos``, put those back in service. Runs outside the statement capture."""
+    from app import bed_index
+    from setup_database import get_connection
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    status = 'Retired' if bed_nos is None else 'Active'
+    if bed_nos is None:
+        cursor.execute("SELECT b.BedNo FROM beds b LEFT JOIN hostel h ON h.BedNo = b.BedNo "
+                       "WHERE b.status = 'Active' AND h.BedNo IS NULL")
+        bed_nos = [row[0] for row in cursor.fetchall()]
+    if bed_nos:
+        cursor.execute(f"UPDATE beds SET status = %s WHERE BedNo IN ({', '.join(['%s'] * len(bed_nos))})",
+                       [status] + bed_nos)
+    conn.commit()
+    conn.close()
+    bed_index.invalidate()
+    return bed_nos
+
+
+def tour(app):
+    """Visit every route as an admin and as a student"""
+    from benchmark import BENCH_PASSWORD
+
+    admin = app.test_client()
+    admin.post('/login', data={'username': 'bench_admin', 'password': BENCH_PASSWORD})
+    for path in ('/dashboard', '/beds', '/beds?after=10', '/admin/applications',
+                 '/search?type=all&q=Sharma', '/search?type=name&q=Patel', '/search?type=student_id&q=CS00',
+                 '/search?type=bed&q=5', '/api/v1/stats', '/api/v1/beds', '/admin/metrics'):
+        admin.get(path)
+    page = admin.get('/api/v1/applications?per_page=50').get_json()
+    if page['next_before']:
+        admin.get(f"/admin/applications?before={page['next_before']}")
+        admin.get(f"/api/v1/applications?before={page['next_before']}")
+    for dataset in ('allotments', 'applications'):
+        admin.get(f'/admin/export/{dataset}.csv?from=2020-01-01&to=2030-12-31').get_data()
+        admin.get(f'/admin/export/{dataset}.ndjson').get_data()
+    pending = [a['id'] for a in page['applications'] if a['status'] == 'Pending']
+    if len(pending) >= 4:
+        admin.post(f'/admin/applications/{pending[0]}/approve')
+        admin.post(f'/admin/applications/{pending[1]}/reject', data={'notes': 'plan check'})
+        admin.post('/admin/applications/bulk', data={'action': 'approve', 'app_ids': pending[2:4],
+                                                     'building': 'Hall 1'})
+    admin.post('/admin/applications/bulk', data={'action': 'reject', 'selection': 'oldest', 'oldest': 2})
+    admin.post('/beds/add', data={'name': 'Plan Check', 'email': 'plan.check@example.com'})
+    admin.post('/beds/add', data={'name': 'Plan Check', 'building': 'Hall 1'})
+    admin.get('/admin/inventory?building=Hall 1')
+    admin.post('/admin/inventory/add', data={'building': 'Plan Check Hall', 'floor': 0, 'first_room': 1,
+                                             'rooms': 2, 'beds_per_room': 2})
+    admin.post('/admin/inventory/retire', data={'first_bed': 1, 'last_bed': 20})
+    roster = b'username,email\nplan_check_cohort,plan_check_cohort@example.com\nbench_student_1,x@example.com\n'
+    admin.post('/admin/students/provision', data={'roster': (io.BytesIO(roster), 'roster.csv')})
+    admin.post('/beds/update_payment/1', data={'status': 'Paid'})
+    # Waitlist: a bulk approval beyond a building's free beds, an approval while the hostel
+    # is full, a priority change, waitlisted applications first in an oldest-first approval,
+    # and freed or new beds going to the first waitlisted applications
+    if len(pending) >= 11:
+        admin.post('/admin/applications/bulk', data={'action': 'approve', 'app_ids': pending[4:10],
+                                                     'building': 'Plan Check Hall'})
+        retired = retire_free_beds()
+        admin.post(f'/admin/applications/{pending[10]}/approve')
+        admin.post(f'/admin/applications/{pending[10]}/priority', data={'priority': 5})
+        admin.post('/admin/applications/bulk', data={'action': 'approve', 'selection': 'oldest', 'oldest': 100})
+        admin.get('/admin/applications')
+        # New beds, and free beds ahead of a walk-in, go to the waitlist first
+        admin.post('/admin/inventory/add', data={'building': 'Plan Check Hall', 'rooms': 1, 'beds_per_room': 2})
+        retire_free_beds(retired[:2])
+        admin.post('/beds/add', data={'name': 'Plan Check Walk-in'})
+    admin.post('/beds/remove/2')
+    if len(pending) >= 11:
+        retire_free_beds(retired[2:])
+
+    student = app.test_client()
+    student.post('/login', data={'username': 'bench_student_1', 'password': BENCH_PASSWORD})
+    for path in ('/dashboard', '/my-applications', '/my-profile', '/api/v1/applications'):
+        student.get(path)
+    student.post('/apply', data={'student_name': 'Plan Check'})
+
+    newcomer = app.test_client()
+    newcomer.post('/register', data={'username': 'plan_check', 'email': 'plan_check@example.com',
+                                     'password': 'plancheck', 'confirm_password': 'plancheck'})
+
+    # Outbox queries, without talking to an SMTP server
+    from app import outbox_sender
+    app.extensions['mail'].suppress = True
+    outbox_sender.drain()
+
+
+def explain(cursor, sqlite, sql, params):
+    """Return (plan lines, problems) for one statement"""
+    if sqlite:
+        cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+        details = [row[-1] for row in cursor.fetchall()]
+        derived = {m.group(1) for d in details for m in [re.match(r'(?:CO-ROUTINE|MATERIALIZE) (\S+)', d)] if m}
+        problems = []
+        for detail in details:
+            scan = re.match(r'SCAN (\S+)(.*)', detail)
+            if scan and scan.group(1) not in derived and 'INDEX' not in scan.group(2) \
+                    and 'PRIMARY KEY' not in scan.group(2):
+                problems.append(f"full scan of {scan.group(1)}")
+            if 'USE TEMP B-TREE FOR' in detail and 'ORDER BY' in detail:
+                problems.append('sort')
+        return details, problems
+
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [c[0] for c in cursor.description]
+    plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    problems = []
+    for row in plan:
+        table = str(row.get('table') or '')
+        extra = str(row.get('Extra') or '')
+        if table.startswith('<'):
+            continue  # derived table or union result
+        if row.get('type') == 'ALL':
+            problems.append(f"full scan of {table}")
+        if 'Using filesort' in extra:
+            problems.append(f"filesort on {table}")
+    lines = [f"{row.get('table')}: type={row.get('type')} key={row.get('key')} "
+             f"rows={row.get('rows')} {row.get('Extra') or ''}".rstrip() for row in plan]
+    return lines, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', action='store_true', help='wipe and seed the configured database first')
+    parser.add_argument('--force', action='store_true', help='allow seeding a database without "bench" in its name')
+    parser.add_argument('--beds', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=8000)
+    parser.add_argument('--applications', type=int, default=20000)
+    parser.add_argument('--verbose', action='store_true', help='print every plan, not just failures')
+    args = parser.parse_args()
+
+    from benchmark import seed_database
+    if args.seed:
+        seed_database(args.beds, args.users, args.applications, force=args.force, capacity=args.beds + 1000)
+
+    from app import app
+    from config import Config
+    from query_log import capture_statements, statement_shape
+    from setup_database import get_connection
+
+    with capture_statements() as captured:
+        tour(app)
+
+    statements = {}
+    for sql, params in captured:
+        statements.setdefault(statement_shape(sql), (sql, params))
+
+    sqlite = Config.DB_BACKEND == 'sqlite'
+    conn = get_connection()
+    cursor = conn.cursor()
+    # Fresh statistics, so the optimizer sees the seeded table sizes
+    if sqlite:
+        cursor.execute("ANALYZE")
+    else:
+        for table in sorted(TABLES):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+
+    failures = 0
+    for shape, (sql, params) in sorted(statements.items()):
+        if not shape.startswith(('SELECT', 'UPDATE', 'DELETE')):
+            continue
+        lines, problems = explain(cursor, sqlite, sql, params)
+        reason = next((why for pattern, why, backend in ALLOWED
+                       if backend in (None, Config.DB_BACKEND) and pattern.search(shape)), None)
+        if problems and not reason:
+            failures += 1
+            status = 'FAIL'
+        else:
+            status = 'ok' if not problems else 'allowed'
+        if status == 'FAIL' or args.verbose:
+            print(f"[{status}] {shape}")
+            for line in lines:
+                print(f"        {line}")
+            if problems:
+                print(f"        -> {', '.join(problems)}" + (f" ({reason})" if reason else ''))
+    conn.rollback()
+    conn.close()
+
+    print(f"\n{len(statements)} distinct statements checked, {failures} plan regression(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,15 @@ load_dotenv()
 class Config:
     """Configuration class for Flask application"""
     
+    # Storage backend: 'mysql', or 'sqlite' for an embedded single-node database
+    DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
+    SQLITE_PATH = os.getenv('SQLITE_PATH', 'hostel.db')
+    # Seconds a writer waits for SQLite's single write lock
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', 10))
+    
+    # Apply pending schema migrations when a worker starts (see migrations.py)
+    MIGRATE_ON_STARTUP = os.getenv('MIGRATE_ON_STARTUP', 'False').lower() == 'true'
+    
     # Database Configuration
     MYSQL_HOST = os.getenv('MYSQL_HOST', 'localhost')
     MYSQL_USER = os.getenv('MYSQL_USER', 'root')
@@ -13,9 +22,98 @@ class Config:
     MYSQL_DATABASE = os.getenv('MYSQL_DATABASE', 'mydb')
     MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
     
+    # Connection pool (one pool per gunicorn worker process).
+    # DB_MAX_CONNECTIONS is the server-side budget shared by all workers.
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 1))
+    DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 5))
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', max(1, DB_MAX_CONNECTIONS // WEB_CONCURRENCY)))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+    DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', 30))
+    
+    # Read replicas for read-only pages: comma-separated host[:port], same user and database
+    MYSQL_REPLICAS = os.getenv('MYSQL_REPLICAS', '')
+    REPLICA_POOL_SIZE = int(os.getenv('REPLICA_POOL_SIZE', DB_POOL_SIZE))
+    # Seconds of replication lag after which a replica is skipped, and how often lag is read
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+    REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+    # Treat a server with no replication configured as caught up (a local stand-in for a replica);
+    # otherwise it is skipped like a broken replica
+    REPLICA_ALLOW_STANDALONE = os.getenv('REPLICA_ALLOW_STANDALONE', 'False').lower() == 'true'
+    # Reads stay on the primary this long after the user's own write (keep above REPLICA_MAX_LAG)
+    REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 10))
+    
+    # ASGI mode (asgi.py): async connections per worker for the API, live feed and outbox
+    ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', DB_POOL_SIZE))
+    # Threads per worker running the Flask pages, like gunicorn's --threads
+    ASGI_THREADS = int(os.getenv('ASGI_THREADS', os.getenv('GUNICORN_THREADS', 8)))
+    
     # Flask Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this-in-production')
     
+    # Password hashing: a Werkzeug method such as 'scrypt', 'scrypt:65536:8:1' or
+    # 'pbkdf2:sha256:600000'. Hashes made with other parameters are replaced at the next login.
+    HASH_METHOD = os.getenv('HASH_METHOD', 'scrypt')
+    # Hashing processes per web worker (0 hashes on the request thread)
+    HASH_WORKERS = int(os.getenv('HASH_WORKERS', max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)))
+    # Logins and registrations that may wait for a hashing process; more get a 503
+    HASH_QUEUE_LIMIT = int(os.getenv('HASH_QUEUE_LIMIT', 16))
+    HASH_TIMEOUT = float(os.getenv('HASH_TIMEOUT', 10))
+    # Seconds a turned-away client is asked to wait (Retry-After)
+    HASH_RETRY_AFTER = int(os.getenv('HASH_RETRY_AFTER', 2))
+    
+    # Bulk account provisioning from a roster file (/admin/students/provision)
+    PROVISION_MAX_ROWS = int(os.getenv('PROVISION_MAX_ROWS', 20000))
+    # Uploads are hashed inside the request, so the page takes smaller rosters than
+    # the provision-students command
+    PROVISION_WEB_MAX_ROWS = int(os.getenv('PROVISION_WEB_MAX_ROWS', 500))
+    PROVISION_BATCH_SIZE = int(os.getenv('PROVISION_BATCH_SIZE', 5000))
+    # Processes hashing a roster's passwords (default: one per CPU)
+    PROVISION_HASH_WORKERS = int(os.getenv('PROVISION_HASH_WORKERS', os.cpu_count() or 1))
+    # Method for generated temporary passwords; they are random, so a cheaper cost than
+    # HASH_METHOD suffices, and they are upgraded to HASH_METHOD at the first login
+    PROVISION_HASH_METHOD = os.getenv('PROVISION_HASH_METHOD', 'scrypt:4096:8:1')
+    
+    # Per-request SQL instrumentation (Server-Timing header, slow-query log)
+    SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'True').lower() == 'true'
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG', '')
+    # Warn when one request runs the same statement shape this many times
+    N_PLUS_ONE_THRESHOLD = int(os.getenv('N_PLUS_ONE_THRESHOLD', 5))
+    
+    # Admission control for /apply, /search and /dashboard: token buckets per signed-in user
+    # and per client address, in each worker (requests per second refilled, and the burst
+    # allowed at once; a rate of 0 turns the limit off)
+    RATE_LIMIT_USER_RATE = float(os.getenv('RATE_LIMIT_USER_RATE', 1))
+    RATE_LIMIT_USER_BURST = int(os.getenv('RATE_LIMIT_USER_BURST', 10))
+    # Proxies in front of the app that append to X-Forwarded-For (1 behind a platform load balancer)
+    TRUSTED_PROXIES = int(os.getenv('TRUSTED_PROXIES', 0))
+    # Per client address. Off by default without TRUSTED_PROXIES: behind a load balancer every
+    # request would come from its address and all users would share one bucket
+    RATE_LIMIT_IP_RATE = float(os.getenv('RATE_LIMIT_IP_RATE', 10 if TRUSTED_PROXIES else 0))
+    RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', 50))
+    # Requests on this host holding a database connection at once (0 for no limit); a request
+    # waits DB_GATE_TIMEOUT seconds for a turn, then gets a 503 with Retry-After. Defaults to
+    # the connection budget, so requests are turned away before they queue on the pools
+    DB_GATE_LIMIT = int(os.getenv('DB_GATE_LIMIT', DB_MAX_CONNECTIONS))
+    DB_GATE_TIMEOUT = float(os.getenv('DB_GATE_TIMEOUT', 0.5))
+    DB_GATE_RETRY_AFTER = int(os.getenv('DB_GATE_RETRY_AFTER', 2))
+    
+    # Flask-Login identity cache (a role or email changed in the database applies after the TTL)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 2048))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 300))
+    
+    # Admin dashboard statistics cache
+    DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', 30))
+    
+    # Keep the caches above in memory-mapped files shared by all workers on the host
+    # (in SHARED_CACHE_DIR, default instance/cache; it must be private to the app's user, and
+    # also holds the data version, waitlist version, event log and database gate files);
+    # False gives each process its own cache
+    SHARED_CACHE = os.getenv('SHARED_CACHE', 'True').lower() == 'true'
+    SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', '')
+    # Largest dashboard or inventory entry, in bytes as JSON; bigger ones are not cached
+    SHARED_CACHE_ENTRY_SIZE = int(os.getenv('SHARED_CACHE_ENTRY_SIZE', 262144))
+    
     # Email Configuration (for notifications)
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -23,9 +121,63 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@hostel.com')
+    # Set MAIL_ENABLED=True to send through an unauthenticated local SMTP server
+    MAIL_ENABLED = os.getenv('MAIL_ENABLED', str(bool(MAIL_USERNAME))).lower() == 'true'
+    
+    # Outbox sender (emails are queued in the email_outbox table)
+    OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+    OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+    OUTBOX_BACKOFF = float(os.getenv('OUTBOX_BACKOFF', 30))
+    # Seconds before emails claimed by a worker that stopped mid-batch are sent again
+    OUTBOX_CLAIM_LEASE = float(os.getenv('OUTBOX_CLAIM_LEASE', 300))
+    # Idle seconds after which the SMTP session is closed (servers drop idle ones anyway)
+    OUTBOX_SMTP_IDLE = float(os.getenv('OUTBOX_SMTP_IDLE', 60))
     
     # Hostel Configuration
+    # Beds put in the inventory when it is first created; afterwards beds are
+    # added and retired at /admin/inventory
     TOTAL_BEDS = int(os.getenv('TOTAL_BEDS', 20))
+    # Seconds before a worker re-reads a building's free beds to pick up other workers' changes
+    BED_INDEX_RESYNC = float(os.getenv('BED_INDEX_RESYNC', 60))
+    # Seconds before a worker reloads the waitlist to pick up changes from other hosts
+    WAITLIST_RESYNC = float(os.getenv('WAITLIST_RESYNC', 60))
+    # Most beds one inventory form submission may add or retire
+    INVENTORY_MAX_CHANGE = int(os.getenv('INVENTORY_MAX_CHANGE', 5000))
+    
+    # Listing pages (/beds, /admin/applications)
+    PAGE_SIZE = int(os.getenv('PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 2000))
+    # Pages larger than this are streamed to the client as they render
+    STREAM_PAGE_SIZE = int(os.getenv('STREAM_PAGE_SIZE', 200))
+    
+    # JSON API: file holding the cross-worker data version used for ETags
+    # (defaults to a per-database file in SHARED_CACHE_DIR)
+    DATA_VERSION_FILE = os.getenv('DATA_VERSION_FILE', '')
+    # Seconds after which an ETag changes anyway, to pick up writes made on other hosts
+    API_ETAG_TTL = int(os.getenv('API_ETAG_TTL', 60))
+    
+    # Server-Sent Events live feed
+    EVENT_LOG_FILE = os.getenv('EVENT_LOG_FILE', '')
+    SSE_HEARTBEAT = float(os.getenv('SSE_HEARTBEAT', 15))
+    SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', 300))
+    SSE_RETRY_MS = int(os.getenv('SSE_RETRY_MS', 3000))
+    # The async entry point (asgi.py) always serves the feed. On gunicorn's threaded
+    # workers each open stream holds a thread, so it is off unless this is set, and even
+    # then only admins get it; pages poll /api/v1/stats (students: their own applications)
+    # every STATS_POLL_INTERVAL seconds
+    SSE_THREADED = os.getenv('SSE_THREADED', 'False').lower() == 'true'
+    STATS_POLL_INTERVAL = float(os.getenv('STATS_POLL_INTERVAL', 30))
+    
+    # Rows fetched from the server per chunk when streaming exports
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 1000))
+    
+    # Search (FULLTEXT ngram index; SEARCH_NGRAM_SIZE must match the server's ngram_token_size)
+    SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 100))
+    SEARCH_NGRAM_SIZE = int(os.getenv('SEARCH_NGRAM_SIZE', 2))
+    
+    # Most applications a single bulk approve/reject may touch
+    BULK_MAX_APPLICATIONS = int(os.getenv('BULK_MAX_APPLICATIONS', 500))
     
     # Hostel Fee
     HOSTEL_FEE = int(os.getenv('HOSTEL_FEE', 5000))
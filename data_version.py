@@ -0,0 +1,84 @@
+"""
+Data Version Counter
+A counter bumped after every committed write, shared by all worker processes
+on the host through a small memory-mapped file. Readers never touch the
+database, which makes it a cheap source of ETags.
+"""
+
+import mmap
+import os
+import random
+import struct
+import tempfile
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process counter
+    fcntl = None
+
+_LAYOUT = struct.Struct('<QQ')  # epoch, counter
+
+
+class DataVersion:
+    """Monotonic data version shared through ``path``"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'hostel-data-version')
+        self._lock = threading.Lock()
+        self._map = None
+        self._local = (random.getrandbits(48), 0)
+        if fcntl is not None:
+            try:
+                self._open()
+            except OSError as e:
+                print(f"Data version note: using a per-process counter ({e})")
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < _LAYOUT.size:
+                # New file: a random epoch keeps old ETags from matching after a reboot
+                os.ftruncate(fd, _LAYOUT.size)
+                os.pwrite(fd, _LAYOUT.pack(random.getrandbits(48), 0), 0)
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, _LAYOUT.size)
+            self._fd = fd
+        except OSError:
+            os.close(fd)
+            raise
+
+    def current(self):
+        """Return ``(epoch, counter)``"""
+        if self._map is None:
+            return self._local
+        return _LAYOUT.unpack_from(self._map, 0)
+
+    def bump(self):
+        """Record that data changed; returns the new counter"""
+        if self._map is None:
+            with self._lock:
+                epoch, counter = self._local
+                self._local = (epoch, counter + 1)
+                return counter + 1
+        # lockf, not flock: workers forked after import (gunicorn --preload) share this
+        # fd, and flock locks belong to the shared open file, so they would not exclude
+        # each other; lockf locks belong to the process
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                epoch, counter = _LAYOUT.unpack_from(self._map, 0)
+                _LAYOUT.pack_into(self._map, 0, epoch, counter + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return counter + 1
+
+    def etag(self, *parts):
+        """Strong ETag for the current version plus request-specific ``parts``"""
+        epoch, counter = self.current()
+        if not parts:
+            return f'"{epoch:x}-{counter}"'
+        digest = zlib.crc32('|'.join(str(p) for p in parts).encode())
+        return f'"{epoch:x}-{counter}-{digest:08x}"'
@@ -0,0 +1,189 @@
+"""
+Database Connection Pool
+Keeps a small set of open MySQL connections per worker process so requests
+do not pay a TCP + auth handshake on every query.
+"""
+
+import os
+import queue
+import threading
+import time
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of database connections for a single process"""
+
+    def __init__(self, connect, size=5, timeout=5, ping_after=30):
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._created = 0
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'health_checks': 0,
+            'health_check_failures': 0,
+            'discarded': 0,
+        }
+
+    def _reset_after_fork(self):
+        """Drop connections inherited from a parent process (gunicorn preload)"""
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._in_use = 0
+        self._pid = os.getpid()
+
+    def acquire(self):
+        """Borrow a connection, opening a new one if the pool is not full"""
+        if os.getpid() != self._pid:
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reset_after_fork()
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._created < self.size:
+                    self._created += 1
+                    self._in_use += 1
+                    create = True
+                else:
+                    create = False
+            else:
+                self._in_use += 1
+                create = False
+
+        if conn is None and create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                    self._in_use -= 1
+                raise
+
+        if conn is None:
+            # Pool is full, wait for another request to give one back
+            with self._lock:
+                self._stats['waits'] += 1
+            try:
+                conn, last_used = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                with self._lock:
+                    self._stats['timeouts'] += 1
+                raise PoolExhausted(f"No database connection free after {self.timeout}s")
+            with self._lock:
+                self._in_use += 1
+
+        return self._check_health(conn, last_used)
+
+    def _check_health(self, conn, last_used):
+        """Ping connections that sat idle long enough for the server to drop them"""
+        if time.monotonic() - last_used < self.ping_after:
+            return conn
+
+        with self._lock:
+            self._stats['health_checks'] += 1
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+            return conn
+        except Exception:
+            with self._lock:
+                self._stats['health_check_failures'] += 1
+            self._discard(conn)
+            # Replace the dead connection with a fresh one
+            with self._lock:
+                self._created += 1
+                self._in_use += 1
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                    self._in_use -= 1
+                raise
+
+    def release(self, conn, broken=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if conn is None:
+            return
+        if not broken:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Exception:
+                broken = True
+
+        if broken:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put((conn, time.monotonic()))
+
+    def _discard(self, conn):
+        """Close a connection and free its slot"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._in_use -= 1
+            self._stats['discarded'] += 1
+
+    def stats(self):
+        """Snapshot of pool usage for the metrics endpoint"""
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'pid': self._pid,
+                'size': self.size,
+                'open': self._created,
+                'in_use': self._in_use,
+                'idle': self._idle.qsize(),
+            })
+        return data
+
+
+class RequestConnection:
+    """Request-scoped handle on a pooled connection.
+
+    Routes keep calling ``conn.close()`` as before; the real connection goes
+    back to the pool in the app teardown hook instead. ``on_commit`` is
+    called after each successful commit.
+    """
+
+    def __init__(self, conn, wrap_cursor=None, on_commit=None):
+        self._conn = conn
+        self._wrap_cursor = wrap_cursor
+        self._on_commit = on_commit
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        return self._wrap_cursor(cursor) if self._wrap_cursor else cursor
+
+    def commit(self):
+        self._conn.commit()
+        if self._on_commit:
+            self._on_commit()
+
+    def close(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
@@ -0,0 +1,170 @@
+"""
+Live Event Bus
+Publish/subscribe for the Server-Sent Events feed. Events are appended to a
+small log file that every worker process tails, so a write handled by one
+gunicorn worker reaches browsers connected to any worker on the host.
+"""
+
+import asyncio
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: deliver events within this process only
+    fcntl = None
+
+
+class Subscription:
+    """Queue of events for one connected browser"""
+
+    def __init__(self, is_admin, user_id, maxsize=100):
+        self.is_admin = is_admin
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def wants(self, event):
+        # Admins see everything; students only hear about their own records
+        return self.is_admin or self.user_id in event.get('user_ids', ())
+
+    def offer(self, event):
+        """Queue an event without blocking; False when the queue is full"""
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except queue.Full:
+            return False
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read with ``await sub.queue.get()`` on an asyncio event loop"""
+
+    def __init__(self, is_admin, user_id, loop, maxsize=100):
+        super().__init__(is_admin, user_id, maxsize)
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, event):
+        # Called from the tailer thread; the queue belongs to the loop
+        if self.queue.full():
+            return False
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # loop closed: the browser is gone
+            return False
+        return True
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+
+class EventBus:
+    """In-process pub/sub bridged across workers through an append-only log"""
+
+    def __init__(self, path=None, poll_interval=0.5, max_log_size=1 << 20):
+        self.path = path or os.path.join(tempfile.gettempdir(), 'hostel-events.log')
+        self.poll_interval = poll_interval
+        self.max_log_size = max_log_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._tailer_pid = None
+        self._stats = {'published': 0, 'delivered': 0, 'dropped': 0}
+
+    def subscribe(self, is_admin, user_id, loop=None):
+        """Register a browser; pass the event ``loop`` to await events there"""
+        sub = AsyncSubscription(is_admin, user_id, loop) if loop else Subscription(is_admin, user_id)
+        with self._lock:
+            self._subscribers.add(sub)
+        self._start_tailer()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, kind, user_ids=(), **data):
+        """Announce a change; ``user_ids`` are the students it concerns"""
+        event = {'kind': kind, 'user_ids': [int(u) for u in user_ids if u is not None],
+                 'data': data, 'ts': time.time()}
+        with self._lock:
+            self._stats['published'] += 1
+        if fcntl is None:
+            self._dispatch(event)
+            return
+        try:
+            self._append(json.dumps(event))
+        except OSError as e:
+            print(f"Event bus note: {e}")
+            self._dispatch(event)
+
+    def _append(self, line):
+        with open(self.path, 'a+', encoding='utf-8') as log:
+            fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                log.seek(0, os.SEEK_END)
+                if log.tell() > self.max_log_size:
+                    # Tailers notice the file shrank and start again from the top
+                    log.truncate(0)
+                log.write(line + '\n')
+            finally:
+                fcntl.flock(log, fcntl.LOCK_UN)
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscribers = [sub for sub in self._subscribers if sub.wants(event)]
+        for sub in subscribers:
+            # A stalled browser should not hold up everyone else
+            delivered = 'delivered' if sub.offer(event) else 'dropped'
+            with self._lock:
+                self._stats[delivered] += 1
+
+    def _start_tailer(self):
+        if fcntl is None:
+            return
+        with self._lock:
+            if self._tailer_pid == os.getpid():
+                return
+            self._tailer_pid = os.getpid()
+        threading.Thread(target=self._tail, name='event-tailer', daemon=True).start()
+
+    def _tail(self):
+        """Follow the event log and hand new events to local subscribers"""
+        try:
+            offset = os.path.getsize(self.path)
+        except OSError:
+            offset = 0
+        partial = b''
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                continue
+            if size < offset:
+                offset, partial = 0, b''
+            if size == offset:
+                continue
+            with open(self.path, 'rb') as log:
+                log.seek(offset)
+                chunk = log.read()
+                offset = log.tell()
+            lines = (partial + chunk).split(b'\n')
+            partial = lines.pop()
+            for line in lines:
+                try:
+                    self._dispatch(json.loads(line))
+                except ValueError:
+                    continue
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data['subscribers'] = len(self._subscribers)
+        return data
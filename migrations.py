@@ -0,0 +1,427 @@
+"""
+Schema Migrations
+Numbered schema changes recorded in a schema_version table. Pending changes
+are checked against the live schema with one information_schema query and
+folded into a single ALTER TABLE per table, so a deploy rebuilds each table
+at most once and does nothing when the schema is already current.
+"""
+
+from datetime import datetime
+
+from mysql.connector import Error, errorcode
+
+from config import Config
+
+# Each migration is (version, description, changes). A change is one of
+#   ('table', name, create_statement)
+#   ('column', table, column, definition)
+#   ('index', table, index_name, definition)
+#   ('foreign_key', table, constraint_name, definition)
+#   ('drop_index', table, index_name, None)
+#   ('rows', table, description, function(cursor))
+# and is skipped when the object already exists (or, for drops, is gone). Tables are created in their
+# current shape; later migrations bring tables created by older releases (or
+# by the database_setup.sql script they shipped) up to the same schema. Row changes run once, after
+# the schema changes, when their migration is applied.
+
+# Building given to beds that predate the inventory
+DEFAULT_BUILDING = 'Main'
+
+
+def _seed_beds(cursor):
+    """Beds 1..TOTAL_BEDS plus any bed already allotted, so existing capacity carries over"""
+    cursor.execute("SELECT BedNo FROM beds")
+    existing = {row[0] for row in cursor.fetchall()}
+    cursor.execute("SELECT BedNo FROM hostel")
+    wanted = set(range(1, Config.TOTAL_BEDS + 1)) | {row[0] for row in cursor.fetchall()}
+    missing = sorted(wanted - existing)
+    if missing:
+        cursor.executemany("INSERT INTO beds (BedNo, building, status) VALUES (%s, %s, 'Active')",
+                           [(bed_no, DEFAULT_BUILDING) for bed_no in missing])
+        print(f"[OK] Added {len(missing)} bed(s) to the inventory")
+
+
+MIGRATIONS = [
+    (1, 'Core tables', [
+        ('table', 'schema_version', """
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                description VARCHAR(255) NOT NULL,
+                applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        """),
+        ('table', 'users', """
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                email VARCHAR(100) UNIQUE NOT NULL,
+                password VARCHAR(255) NOT NULL,
+                role ENUM('admin', 'user') DEFAULT 'user',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_username (username),
+                INDEX idx_email (email)
+            )
+        """),
+        ('table', 'hostel', """
+            CREATE TABLE IF NOT EXISTS hostel (
+                BedNo INT PRIMARY KEY,
+                Name VARCHAR(100) NOT NULL,
+                StudentID VARCHAR(50),
+                Contact VARCHAR(20),
+                Email VARCHAR(100),
+                CheckInDate DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PaymentStatus ENUM('Paid', 'Pending') DEFAULT 'Pending',
+                user_id INT NULL,
+                INDEX idx_name (Name),
+                INDEX idx_student_id (StudentID),
+                INDEX idx_payment (PaymentStatus),
+                INDEX idx_checkin (CheckInDate),
+                INDEX idx_hostel_user (user_id),
+                FULLTEXT INDEX ft_name (Name) WITH PARSER ngram,
+                FULLTEXT INDEX ft_student_id (StudentID) WITH PARSER ngram,
+                CONSTRAINT fk_hostel_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+            )
+        """),
+        ('table', 'bed_applications', """
+            CREATE TABLE IF NOT EXISTS bed_applications (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user_id INT NOT NULL,
+                student_name VARCHAR(100) NOT NULL,
+                student_id VARCHAR(50),
+                contact VARCHAR(20),
+                email VARCHAR(100),
+                status ENUM('Pending', 'Approved', 'Rejected') DEFAULT 'Pending',
+                applied_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                reviewed_date DATETIME NULL,
+                bed_no INT NULL,
+                notes TEXT,
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                INDEX idx_user_status (user_id, status),
+                INDEX idx_user_applied (user_id, applied_date),
+                INDEX idx_status_applied (status, applied_date),
+                INDEX idx_applied_date (applied_date)
+            )
+        """),
+    ]),
+    (2, 'Columns missing from hostel tables created by early releases', [
+        ('column', 'hostel', 'StudentID', "VARCHAR(50) AFTER Name"),
+        ('column', 'hostel', 'Contact', "VARCHAR(20) AFTER StudentID"),
+        ('column', 'hostel', 'Email', "VARCHAR(100) AFTER Contact"),
+        ('column', 'hostel', 'CheckInDate', "DATETIME DEFAULT CURRENT_TIMESTAMP AFTER Email"),
+        ('column', 'hostel', 'PaymentStatus', "ENUM('Paid', 'Pending') DEFAULT 'Pending' AFTER CheckInDate"),
+        ('column', 'hostel', 'user_id', "INT NULL AFTER PaymentStatus"),
+        ('foreign_key', 'hostel', 'fk_hostel_user',
+         "FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL"),
+    ]),
+    (3, 'Email outbox', [
+        ('table', 'email_outbox', """
+            CREATE TABLE IF NOT EXISTS email_outbox (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                recipient VARCHAR(100) NOT NULL,
+                subject VARCHAR(255) NOT NULL,
+                body TEXT NOT NULL,
+                status ENUM('Pending', 'Sent', 'Failed') DEFAULT 'Pending',
+                attempts INT DEFAULT 0,
+                next_attempt_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                sent_at DATETIME NULL,
+                INDEX idx_outbox_due (status, next_attempt_at)
+            )
+        """),
+    ]),
+    (4, 'ngram FULLTEXT indexes for /search', [
+        ('index', 'hostel', 'ft_name', "FULLTEXT INDEX ft_name (Name) WITH PARSER ngram"),
+        ('index', 'hostel', 'ft_student_id', "FULLTEXT INDEX ft_student_id (StudentID) WITH PARSER ngram"),
+    ]),
+    (5, 'Composite indexes for per-student and per-status lookups', [
+        # Student dashboard, /apply and /my-applications
+        ('index', 'bed_applications', 'idx_user_status', "INDEX idx_user_status (user_id, status)"),
+        ('index', 'bed_applications', 'idx_user_applied', "INDEX idx_user_applied (user_id, applied_date)"),
+        # Pending counts and oldest-first bulk selection
+        ('index', 'bed_applications', 'idx_status_applied', "INDEX idx_status_applied (status, applied_date)"),
+        # Prefixes of the composites above
+        ('drop_index', 'bed_applications', 'idx_user_id', None),
+        ('drop_index', 'bed_applications', 'idx_status', None),
+        ('index', 'hostel', 'idx_hostel_user', "INDEX idx_hostel_user (user_id)"),
+    ]),
+    (6, 'Bed inventory by building, floor and room', [
+        ('table', 'beds', """
+            CREATE TABLE IF NOT EXISTS beds (
+                BedNo INT PRIMARY KEY,
+                building VARCHAR(50) NOT NULL DEFAULT 'Main',
+                floor INT NULL,
+                room VARCHAR(20) NULL,
+                status ENUM('Active', 'Retired') NOT NULL DEFAULT 'Active',
+                INDEX idx_bed_partition (building, status),
+                INDEX idx_bed_room (building, floor, room, status)
+            )
+        """),
+        # The beds table in old dumps holds bed numbers only
+        ('column', 'beds', 'building', "VARCHAR(50) NOT NULL DEFAULT 'Main' AFTER BedNo"),
+        ('column', 'beds', 'floor', "INT NULL AFTER building"),
+        ('column', 'beds', 'room', "VARCHAR(20) NULL AFTER floor"),
+        ('column', 'beds', 'status', "ENUM('Active', 'Retired') NOT NULL DEFAULT 'Active' AFTER room"),
+        # Free-bed lookups per building (InnoDB appends BedNo, so they come out in bed order)
+        ('index', 'beds', 'idx_bed_partition', "INDEX idx_bed_partition (building, status)"),
+        ('index', 'beds', 'idx_bed_room', "INDEX idx_bed_room (building, floor, room, status)"),
+        ('rows', 'beds', 'Initial inventory', _seed_beds),
+    ]),
+    (7, 'Bed waitlist', [
+        # Applications approved while every bed was taken; the next freed bed goes to the
+        # highest priority, then the earliest application
+        ('table', 'waitlist', """
+            CREATE TABLE IF NOT EXISTS waitlist (
+                application_id INT PRIMARY KEY,
+                priority INT NOT NULL DEFAULT 0,
+                applied_date DATETIME NOT NULL,
+                added_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (application_id) REFERENCES bed_applications(id) ON DELETE CASCADE,
+                INDEX idx_waitlist_order (priority DESC, applied_date, application_id)
+            )
+        """),
+    ]),
+    (8, 'Outbox claims', [
+        # Set when a sender claims an email, which is committed before it is sent
+        ('column', 'email_outbox', 'claimed_at', "DATETIME NULL AFTER next_attempt_at"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# SQLite databases are described by one idempotent script of the current
+# schema (dropping superseded indexes), re-run whenever the version is behind
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(255) NOT NULL,
+    applied_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    role TEXT DEFAULT 'user' CHECK (role IN ('admin', 'user')),
+    created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+
+CREATE TABLE IF NOT EXISTS hostel (
+    BedNo INTEGER PRIMARY KEY,
+    Name VARCHAR(100) NOT NULL,
+    StudentID VARCHAR(50),
+    Contact VARCHAR(20),
+    Email VARCHAR(100),
+    CheckInDate DATETIME DEFAULT (datetime('now', 'localtime')),
+    PaymentStatus TEXT DEFAULT 'Pending' CHECK (PaymentStatus IN ('Paid', 'Pending')),
+    user_id INTEGER NULL REFERENCES users(id) ON DELETE SET NULL
+);
+CREATE INDEX IF NOT EXISTS idx_name ON hostel (Name);
+CREATE INDEX IF NOT EXISTS idx_student_id ON hostel (StudentID);
+CREATE INDEX IF NOT EXISTS idx_payment ON hostel (PaymentStatus);
+CREATE INDEX IF NOT EXISTS idx_checkin ON hostel (CheckInDate);
+CREATE INDEX IF NOT EXISTS idx_hostel_user ON hostel (user_id);
+
+CREATE TABLE IF NOT EXISTS bed_applications (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    student_name VARCHAR(100) NOT NULL,
+    student_id VARCHAR(50),
+    contact VARCHAR(20),
+    email VARCHAR(100),
+    status TEXT DEFAULT 'Pending' CHECK (status IN ('Pending', 'Approved', 'Rejected')),
+    applied_date DATETIME DEFAULT (datetime('now', 'localtime')),
+    reviewed_date DATETIME NULL,
+    bed_no INTEGER NULL,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_user_status ON bed_applications (user_id, status);
+CREATE INDEX IF NOT EXISTS idx_user_applied ON bed_applications (user_id, applied_date);
+CREATE INDEX IF NOT EXISTS idx_status_applied ON bed_applications (status, applied_date);
+CREATE INDEX IF NOT EXISTS idx_applied_date ON bed_applications (applied_date);
+DROP INDEX IF EXISTS idx_user_id;
+DROP INDEX IF EXISTS idx_status;
+
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recipient VARCHAR(100) NOT NULL,
+    subject VARCHAR(255) NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT DEFAULT 'Pending' CHECK (status IN ('Pending', 'Sent', 'Failed')),
+    attempts INTEGER DEFAULT 0,
+    next_attempt_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    claimed_at DATETIME NULL,
+    last_error TEXT,
+    created_at DATETIME DEFAULT (datetime('now', 'localtime')),
+    sent_at DATETIME NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON email_outbox (status, next_attempt_at);
+
+CREATE TABLE IF NOT EXISTS beds (
+    BedNo INTEGER PRIMARY KEY,
+    building VARCHAR(50) NOT NULL DEFAULT 'Main',
+    floor INTEGER NULL,
+    room VARCHAR(20) NULL,
+    status TEXT NOT NULL DEFAULT 'Active' CHECK (status IN ('Active', 'Retired'))
+);
+CREATE INDEX IF NOT EXISTS idx_bed_partition ON beds (building, status);
+CREATE INDEX IF NOT EXISTS idx_bed_room ON beds (building, floor, room, status);
+
+CREATE TABLE IF NOT EXISTS waitlist (
+    application_id INTEGER PRIMARY KEY REFERENCES bed_applications(id) ON DELETE CASCADE,
+    priority INTEGER NOT NULL DEFAULT 0,
+    applied_date DATETIME NOT NULL,
+    added_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_waitlist_order ON waitlist (priority DESC, applied_date, application_id);
+"""
+
+# Serializes migrations when several workers start at once
+_LOCK_NAME = 'hostel_schema_migration'
+
+
+def current_version(cursor):
+    """Highest applied migration, 0 for a database that has none recorded"""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except Error as e:
+        if e.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        return 0
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn, backend='mysql', lock_timeout=60):
+    """Apply pending migrations; returns the versions applied (empty when current)"""
+    cursor = conn.cursor()
+    try:
+        version = current_version(cursor)
+        if version >= LATEST_VERSION:
+            return []
+        if backend == 'sqlite':
+            return _migrate_sqlite(conn, cursor, version)
+
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_NAME, lock_timeout))
+        if cursor.fetchone()[0] != 1:
+            raise Error(msg=f"Timed out waiting for another schema migration after {lock_timeout}s")
+        try:
+            # Another worker may have finished the job while we waited
+            version = current_version(cursor)
+            if version >= LATEST_VERSION:
+                return []
+            return _migrate_mysql(conn, cursor, version)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def _snapshot(cursor):
+    """Existing tables, columns, indexes and constraints, in one query"""
+    cursor.execute("""
+        SELECT 'column', TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        UNION ALL
+        SELECT 'index', TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE()
+        UNION ALL
+        SELECT 'foreign_key', TABLE_NAME, CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)
+    state = {'table': set(), 'column': set(), 'index': set(), 'foreign_key': set()}
+    for kind, table, name in cursor.fetchall():
+        state['table'].add(table.lower())
+        state[kind].add((table.lower(), name.lower()))
+    return state
+
+
+def _migrate_mysql(conn, cursor, version):
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    state = _snapshot(cursor)
+
+    created = set()
+    for _, _, changes in pending:
+        for kind, table, *definition in changes:
+            if kind == 'table' and table.lower() not in state['table']:
+                cursor.execute(definition[0])
+                print(f"[OK] Created {table} table")
+                created.add(table.lower())
+
+    # New tables are created in their current shape; only older ones need altering
+    alters = {}
+    for _, _, changes in pending:
+        for kind, table, *definition in changes:
+            if kind in ('table', 'rows') or table.lower() in created:
+                continue
+            name, spec = definition
+            exists = (table.lower(), name.lower()) in state['index' if kind == 'drop_index' else kind]
+            if exists != (kind == 'drop_index'):
+                continue
+            if kind == 'drop_index':
+                clause = f"DROP INDEX {name}"
+            elif kind == 'column':
+                clause = f"ADD COLUMN {name} {spec}"
+            elif kind == 'foreign_key':
+                clause = f"ADD CONSTRAINT {name} {spec}"
+            else:
+                clause = f"ADD {spec}"
+            alters.setdefault(table, []).append(clause)
+
+    for table, clauses in alters.items():
+        for group in _alter_groups(clauses):
+            cursor.execute(f"ALTER TABLE {table} {', '.join(group)}")
+        print(f"[OK] Altered {table} table ({len(clauses)} change(s))")
+
+    _apply_rows(cursor, pending)
+    return _record(conn, cursor, pending)
+
+
+def _alter_groups(clauses):
+    """Split ALTER clauses so no statement adds more than one FULLTEXT index (an InnoDB limit)"""
+    groups = []
+    for clause in clauses:
+        fulltext = clause.startswith('ADD FULLTEXT')
+        for group in groups:
+            if not (fulltext and any(c.startswith('ADD FULLTEXT') for c in group)):
+                group.append(clause)
+                break
+        else:
+            groups.append([clause])
+    return groups
+
+
+def _migrate_sqlite(conn, cursor, version):
+    for statement in SQLITE_SCHEMA.split(';'):
+        if statement.strip():
+            cursor.execute(statement)
+    pending = [m for m in MIGRATIONS if m[0] > version]
+    # CREATE TABLE IF NOT EXISTS leaves older tables as they are; add their new columns
+    for _, _, changes in pending:
+        for kind, table, *definition in changes:
+            if kind != 'column':
+                continue
+            name, spec = definition
+            cursor.execute(f"PRAGMA table_info({table})")
+            if name not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {spec.split(' AFTER ')[0]}")
+    _apply_rows(cursor, pending)
+    return _record(conn, cursor, pending)
+
+
+def _apply_rows(cursor, pending):
+    for _, _, changes in pending:
+        for kind, *definition in changes:
+            if kind == 'rows':
+                definition[-1](cursor)
+
+
+def _record(conn, cursor, applied):
+    now = datetime.now()
+    cursor.executemany("INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                       [(number, description, now) for number, description, _ in applied])
+    conn.commit()
+    for number, description, _ in applied:
+        print(f"[OK] Schema version {number}: {description}")
+    return [number for number, _, _ in applied]
@@ -0,0 +1,241 @@
+"""
+Email Outbox
+Routes write notification emails to the email_outbox table inside their own
+transaction; a background sender drains it over one SMTP connection.
+"""
+
+import os
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+
+
+def queue_email(cursor, recipient, subject, body):
+    """Add an email to the outbox as part of the caller's transaction"""
+    queue_emails(cursor, [(recipient, subject, body)])
+
+
+def queue_emails(cursor, emails):
+    """Add ``(recipient, subject, body)`` emails with one multi-row insert"""
+    if not emails:
+        return
+    now = datetime.now()
+    cursor.executemany("""
+        INSERT INTO email_outbox (recipient, subject, body, status, attempts,
+                                  next_attempt_at, created_at)
+        VALUES (%s, %s, %s, 'Pending', 0, %s, %s)
+    """, [(recipient, subject, body, now, now) for recipient, subject, body in emails])
+
+
+# SKIP LOCKED lets several workers claim batches without double sending; the claim
+# (claim_sql) is committed before any email goes out, so no row lock waits on SMTP
+CLAIM_SQL = """
+    SELECT id, recipient, subject, body, attempts
+    FROM email_outbox
+    WHERE status = 'Pending' AND next_attempt_at <= %s
+    ORDER BY next_attempt_at, id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+
+def claim_sql(batch, lease):
+    """Statement marking a selected batch as claimed: ``(sql, params)``.
+
+    Claimed emails are not due again until ``lease`` seconds have passed, so
+    a worker that dies while sending leaves them to be retried, not lost.
+    """
+    now = datetime.now()
+    placeholders = ', '.join(['%s'] * len(batch))
+    return (f"UPDATE email_outbox SET claimed_at = %s, next_attempt_at = %s WHERE id IN ({placeholders})",
+            [now, now + timedelta(seconds=lease)] + [email['id'] for email in batch])
+
+
+SENT_SQL = """
+    UPDATE email_outbox
+    SET status = 'Sent', attempts = attempts + 1, sent_at = %s, last_error = NULL
+    WHERE id = %s
+"""
+RETRY_SQL = """
+    UPDATE email_outbox
+    SET status = %s, attempts = %s, next_attempt_at = %s, last_error = %s
+    WHERE id = %s
+"""
+
+
+class OutboxSender:
+    """Background thread that delivers queued emails with retries and backoff.
+
+    The SMTP session stays open between batches and is closed once it has
+    been idle for ``smtp_idle`` seconds.
+    """
+
+    def __init__(self, app, mail, pool, batch_size=50, poll_interval=5,
+                 max_attempts=5, backoff=30, wrap_cursor=None, claim_lease=300, smtp_idle=60):
+        self.app = app
+        self.mail = mail
+        self.pool = pool
+        self.wrap_cursor = wrap_cursor
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.claim_lease = claim_lease
+        self.smtp_idle = smtp_idle
+        self._smtp = None
+        self._smtp_used = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0, 'errors': 0}
+
+    def start(self):
+        """Start the sender thread once per worker process"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+        threading.Thread(target=self._run, name='outbox-sender', daemon=True).start()
+
+    def wake(self):
+        """Deliver newly queued emails without waiting for the next poll"""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                while self.drain() == self.batch_size:
+                    pass
+            except Exception as e:
+                self.record(error=True)
+                print(f"Outbox error: {e}")
+            if self._smtp is not None and time.monotonic() - self._smtp_used >= self.smtp_idle:
+                self.close()
+            self.wait()
+
+    def wait(self):
+        """Sleep until woken or until the next poll is due"""
+        self._wake.wait(self.poll_interval)
+        self._wake.clear()
+
+    def drain(self):
+        """Send one batch of due emails; returns how many were attempted"""
+        batch = self._transaction(self._claim)
+        if not batch:
+            return 0
+        # No connection or row lock is held while the emails go out
+        updates, counts = self.outcomes(batch, self._send(batch))
+
+        def store(cursor):
+            for sql, params in updates:
+                cursor.execute(sql, params)
+        self._transaction(store)
+        self.record(counts)
+        return len(batch)
+
+    def _claim(self, cursor):
+        cursor.execute(CLAIM_SQL, (datetime.now(), self.batch_size))
+        batch = cursor.fetchall()
+        if batch:
+            cursor.execute(*claim_sql(batch, self.claim_lease))
+        return batch
+
+    def _transaction(self, work):
+        """Run ``work(cursor)`` on a pooled connection and commit"""
+        conn = self.pool.acquire()
+        broken = False
+        try:
+            cursor = conn.cursor(dictionary=True)
+            if self.wrap_cursor:
+                cursor = self.wrap_cursor(cursor)
+            result = work(cursor)
+            conn.commit()
+            cursor.close()
+            return result
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.pool.release(conn, broken=broken)
+
+    def outcomes(self, batch, results):
+        """Status updates for a sent batch: ``([(sql, params)], counts)``"""
+        now = datetime.now()
+        updates = []
+        counts = {'sent': 0, 'retried': 0, 'failed': 0}
+        for email, error in zip(batch, results):
+            if error is None:
+                counts['sent'] += 1
+                updates.append((SENT_SQL, (now, email['id'])))
+                continue
+            attempts = email['attempts'] + 1
+            status = 'Failed' if attempts >= self.max_attempts else 'Pending'
+            counts['failed' if status == 'Failed' else 'retried'] += 1
+            retry_at = now + timedelta(seconds=self.backoff * 2 ** (attempts - 1))
+            updates.append((RETRY_SQL, (status, attempts, retry_at, str(error)[:1000], email['id'])))
+        return updates, counts
+
+    def record(self, counts=None, error=False):
+        """Add a drained batch's counts (or an error) to the statistics"""
+        with self._lock:
+            if error:
+                self._stats['errors'] += 1
+            if counts is not None:
+                self._stats['batches'] += 1
+                for key, value in counts.items():
+                    self._stats[key] += value
+
+    def _send(self, batch):
+        """Send a batch over the SMTP session; returns an error (or None) per email"""
+        results = []
+        with self.app.app_context():
+            for email in batch:
+                message = Message(email['subject'], recipients=[email['recipient']], body=email['body'])
+                try:
+                    self._deliver(message)
+                    results.append(None)
+                except (smtplib.SMTPServerDisconnected, OSError) as e:
+                    # Could not connect (or the connection dropped); retry the rest later
+                    self.close()
+                    results.extend([e] * (len(batch) - len(results)))
+                    break
+                except Exception as e:
+                    results.append(e)
+        return results
+
+    def _deliver(self, message):
+        # A session the server closed while idle gets one reconnect
+        fresh = self._smtp is None
+        if fresh:
+            self._connect()
+        try:
+            self._smtp.send(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            if fresh:
+                raise
+            self.close()
+            self._connect()
+            self._smtp.send(message)
+        self._smtp_used = time.monotonic()
+
+    def _connect(self):
+        smtp = self.mail.connect()
+        self._smtp = smtp.__enter__()
+        self._smtp_used = time.monotonic()
+
+    def close(self):
+        """End the SMTP session, if one is open"""
+        smtp, self._smtp = self._smtp, None
+        if smtp is not None:
+            try:
+                smtp.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass  # already gone
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,70 @@
+"""
+Keyset Pagination
+Pages through ordered query results by remembering the last row's sort key
+instead of using OFFSET, so every page costs the same however deep it is.
+"""
+
+from mysql.connector import Error
+
+
+class KeysetPage:
+    """One page of rows read lazily from an executed cursor.
+
+    The query must ask for ``per_page + 1`` rows; the extra row only tells
+    us whether there is a next page. Rows are pulled from the cursor as the
+    template iterates, so a streamed page never sits in memory as a list.
+    ``has_more``, ``next_key`` and ``failed`` are valid once iteration has
+    finished; after a database error mid-page ``failed`` is set and there is
+    no next page, so templates show an error instead of a short page.
+    """
+
+    def __init__(self, cursor, per_page, key, chunk_size=100):
+        self._cursor = cursor
+        self.per_page = per_page
+        self._key = key
+        self._chunk_size = chunk_size
+        self._buffer = []
+        self.has_more = False
+        self.next_key = None
+        self.failed = False
+        self.count = 0
+        # Peek at the first row so templates can test ``{% if page %}``
+        self._first = self._fetch_one()
+
+    def _fetch_one(self):
+        if not self._buffer:
+            self._buffer = list(reversed(self._cursor.fetchmany(self._chunk_size)))
+        return self._buffer.pop() if self._buffer else None
+
+    def __bool__(self):
+        return self._first is not None
+
+    def __iter__(self):
+        row = self._first
+        try:
+            while row is not None:
+                if self.count == self.per_page:
+                    self.has_more = True
+                    # Drain the look-ahead row so the connection can be reused
+                    while self._fetch_one() is not None:
+                        pass
+                    break
+                self.count += 1
+                self.next_key = self._key(row)
+                yield row
+                row = self._fetch_one()
+        except Error as e:
+            self.failed = True
+            self.has_more = False
+            print(f"Pagination error: {e}")
+        finally:
+            self._cursor.close()
+
+
+def page_size(value, default, maximum):
+    """Clamp a requested page size to ``1..maximum``"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
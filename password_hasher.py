@@ -0,0 +1,186 @@
+"""
+Password Hashing
+Runs Werkzeug's deliberately slow password hashes in a small per-worker
+process pool, so a burst of logins queues for CPU there instead of tying up
+every request thread, and turns requests away once that queue is full.
+"""
+
+import multiprocessing
+import os
+import threading
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+def _mp_context(fork=False):
+    # fork only while the process is single-threaded (at import): a child forked
+    # from a request thread can inherit a lock another thread holds and hang on it.
+    # Later pools start from the forkserver, which forks from a clean process without
+    # spawn's per-child import of the main script; Windows has only spawn
+    methods = multiprocessing.get_all_start_methods()
+    if fork and 'fork' in methods:
+        method = 'fork'
+    else:
+        method = 'forkserver' if 'forkserver' in methods else 'spawn'
+    return multiprocessing.get_context(method)
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash does not finish in time"""
+
+
+# Parameter prefix ("scrypt:32768:8:1") of hashes made with each method, per process
+_method_ids = {}
+
+
+def _method_id(method):
+    if method not in _method_ids:
+        _method_ids[method] = generate_password_hash('', method).split('$', 1)[0]
+    return _method_ids[method]
+
+
+def _verify(stored_hash, password, method):
+    """Check a password; also returns a new hash when the stored one used other parameters"""
+    if not check_password_hash(stored_hash, password):
+        return False, None
+    if stored_hash.split('$', 1)[0] == _method_id(method):
+        return True, None
+    return True, generate_password_hash(password, method)
+
+
+class PasswordHasher:
+    """Bounded password hashing for one process.
+
+    At most ``workers + max_pending`` hashes are running or queued at once;
+    callers beyond that get ``HasherBusy`` immediately rather than waiting
+    behind the burst. ``workers=0`` hashes on the calling thread, still
+    bounded by ``max_pending``.
+    """
+
+    def __init__(self, method='scrypt', workers=1, max_pending=16, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max(1, workers + max_pending))
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0, 'timeouts': 0}
+
+    def start(self):
+        """Launch the hashing processes now rather than on the first login.
+
+        Call while the process is still single-threaded (at import), so the
+        workers are forked before any request thread holds a lock.
+        """
+        if self.workers:
+            self._pool(fork=True).submit(int).result()
+
+    def _pool(self, fork=False):
+        """This process's executor, created on first use (and again after a fork)"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=_mp_context(fork))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset(self):
+        # A hashing process died (e.g. killed for memory); start a fresh pool next time
+        with self._lock:
+            self._executor = None
+
+    def _done(self, future=None):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy(f"{self.workers + self.max_pending} password hashes already in progress")
+        with self._lock:
+            self._in_flight += 1
+
+        if not self.workers:
+            try:
+                return function(*args)
+            finally:
+                self._done()
+
+        try:
+            future = self._pool().submit(function, *args)
+        except BrokenProcessPool:
+            self._done()
+            self._reset()
+            raise HasherBusy("Password hashing pool restarted")
+        except BaseException:
+            self._done()
+            raise
+        # The slot stays taken until the hash really finishes, even if we stop waiting
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HasherBusy(f"Password hash took longer than {self.timeout}s")
+        except BrokenProcessPool:
+            self._reset()
+            raise HasherBusy("Password hashing pool restarted")
+
+    def hash(self, password):
+        """Hash a new password with the configured method"""
+        hashed = self._run(generate_password_hash, password, self.method)
+        with self._lock:
+            self._stats['hashed'] += 1
+        return hashed
+
+    def hash_many(self, passwords, method=None, workers=None):
+        """Hash a batch of passwords (bulk provisioning) on ``workers`` processes.
+
+        Uses its own short-lived pool of one process per CPU by default, so
+        sign-ins keep the regular pool and its queue limit does not apply.
+        """
+        passwords = list(passwords)
+        method = method or self.method
+        workers = min(workers or os.cpu_count() or 1, len(passwords))
+        if workers <= 1:
+            hashes = [generate_password_hash(password, method) for password in passwords]
+        else:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context()) as pool:
+                hashes = list(pool.map(generate_password_hash, passwords, repeat(method),
+                                       chunksize=max(1, len(passwords) // (workers * 4))))
+        with self._lock:
+            self._stats['hashed'] += len(hashes)
+        return hashes
+
+    def verify(self, stored_hash, password):
+        """Check a password; returns ``(ok, new_hash)``.
+
+        ``new_hash`` is set when the password matched but the stored hash was
+        made with other parameters than the configured method; store it in
+        place of the old one.
+        """
+        ok, new_hash = self._run(_verify, stored_hash, password, self.method)
+        with self._lock:
+            self._stats['verified'] += 1
+            if new_hash:
+                self._stats['rehashed'] += 1
+        return ok, new_hash
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'method': self.method,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'in_flight': self._in_flight,
+            })
+        return data
@@ -0,0 +1,122 @@
+"""
+SQL Instrumentation
+Times every statement a request runs, reports the totals in a Server-Timing
+header, logs slow statements and warns about repeated statement shapes
+(the usual sign of an N+1 query pattern).
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger('hostel.sql')
+
+# Statements collected by capture_statements(), or None when not capturing
+_captured = None
+_capture_lock = threading.Lock()
+
+_WHITESPACE = re.compile(r'\s+')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+
+
+def statement_shape(sql):
+    """Normalize a statement so calls differing only in values compare equal"""
+    shape = _WHITESPACE.sub(' ', sql).strip()
+    shape = _STRING.sub('?', shape)
+    shape = _NUMBER.sub('?', shape)
+    shape = _PLACEHOLDER_LIST.sub('(...)', shape)
+    return shape.replace('%s', '?')
+
+
+@contextmanager
+def capture_statements():
+    """Collect ``(sql, params)`` for every instrumented statement run while active"""
+    global _captured
+    statements = []
+    with _capture_lock:
+        _captured = statements
+    try:
+        yield statements
+    finally:
+        with _capture_lock:
+            _captured = None
+
+
+class QueryStats:
+    """Statements run during one request"""
+
+    def __init__(self, slow_ms=200, endpoint=None):
+        self.slow_ms = slow_ms
+        self.endpoint = endpoint
+        self.count = 0
+        self.total_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_sql = None
+        self.shapes = Counter()
+
+    def record(self, sql, params, elapsed_ms, rows=None):
+        if _captured is not None:
+            with _capture_lock:
+                _captured.append((sql, params))
+        self.count += 1
+        self.total_ms += elapsed_ms
+        shape = statement_shape(sql)
+        self.shapes[shape] += 1
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_sql = shape
+        if elapsed_ms >= self.slow_ms:
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'endpoint': self.endpoint,
+                'duration_ms': round(elapsed_ms, 2),
+                'statement': shape,
+                'rows': rows,
+            }))
+
+    def repeated(self, threshold):
+        """Statement shapes run at least ``threshold`` times"""
+        return [(shape, n) for shape, n in self.shapes.items() if n >= threshold]
+
+    def server_timing(self):
+        value = f'db;dur={self.total_ms:.2f};desc="{self.count} queries"'
+        if self.count:
+            value += f', db-slowest;dur={self.slowest_ms:.2f}'
+        return value
+
+
+class InstrumentedCursor:
+    """Cursor proxy that reports each statement to a QueryStats"""
+
+    def __init__(self, cursor, stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params, *args, **kwargs)
+        finally:
+            self._stats.record(sql, params, (time.perf_counter() - start) * 1000,
+                               getattr(self._cursor, 'rowcount', None))
+
+    def executemany(self, sql, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_params, *args, **kwargs)
+        finally:
+            first = seq_params[0] if isinstance(seq_params, (list, tuple)) and seq_params else None
+            self._stats.record(sql, first, (time.perf_counter() - start) * 1000,
+                               getattr(self._cursor, 'rowcount', None))
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
@@ -0,0 +1,130 @@
+"""
+Read Replicas
+Pools of connections to MySQL replicas for read-only requests. A replica is
+skipped while it lags too far behind the primary or cannot be reached, and
+reads fall back to the primary.
+"""
+
+import threading
+import time
+
+
+def replica_lag(conn, allow_standalone=False):
+    """Seconds the server's replication lags behind its source.
+
+    None when replication is stopped or broken, or when the server is not a
+    replica at all; with ``allow_standalone`` such a server (e.g. a second
+    local server standing in for one) counts as caught up instead.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SHOW REPLICA STATUS")
+    except Exception:
+        cursor.close()
+        # Before MySQL 8.0.22
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SHOW SLAVE STATUS")
+    status = cursor.fetchone()
+    cursor.close()
+    if not status:
+        return 0 if allow_standalone else None
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class Replica:
+    """One replica: its connection pool and last lag reading"""
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag = None
+        self.usable = False
+        self.checked_at = None
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class ReplicaSet:
+    """Round-robin over the replicas that are currently caught up.
+
+    Each replica's lag is re-read at most every ``check_interval`` seconds,
+    by whichever request finds the reading out of date.
+    """
+
+    def __init__(self, pools, max_lag=5, check_interval=5, lag_check=replica_lag):
+        self.replicas = [Replica(name, pool) for name, pool in pools.items()]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag_check = lag_check
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stats = {'reads': 0, 'fallbacks': 0, 'lag_checks': 0}
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def _check(self, replica):
+        """Refresh the replica's lag reading if it is out of date"""
+        if replica.checked_at is not None and time.monotonic() - replica.checked_at < self.check_interval:
+            return
+        if not replica.lock.acquire(blocking=False):
+            return  # another request is already checking; use the last reading
+        try:
+            with self._lock:
+                self._stats['lag_checks'] += 1
+            conn = None
+            try:
+                conn = replica.pool.acquire()
+                lag = self.lag_check(conn)
+                replica.lag, replica.error = lag, None
+                replica.usable = lag is not None and lag <= self.max_lag
+            except Exception as e:
+                replica.lag, replica.error, replica.usable = None, str(e), False
+            finally:
+                if conn is not None:
+                    replica.pool.release(conn, broken=replica.error is not None)
+            replica.checked_at = time.monotonic()
+        finally:
+            replica.lock.release()
+
+    def acquire(self):
+        """Borrow a connection from a caught-up replica; ``(replica, conn)``, or ``(None, None)``
+        when the caller should read from the primary"""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            self._check(replica)
+            if not replica.usable:
+                continue
+            try:
+                conn = replica.pool.acquire()
+            except Exception as e:
+                print(f"Replica {replica.name} unavailable: {e}")
+                replica.usable, replica.error = False, str(e)
+                continue
+            with self._lock:
+                self._stats['reads'] += 1
+            return replica, conn
+        with self._lock:
+            self._stats['fallbacks'] += 1
+        return None, None
+
+    def release(self, replica, conn, broken=False):
+        replica.pool.release(conn, broken=broken)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data['replicas'] = {
+            replica.name: {
+                'usable': replica.usable,
+                'lag': replica.lag,
+                'error': replica.error,
+                'pool': replica.pool.stats(),
+            }
+            for replica in self.replicas
+        }
+        return data
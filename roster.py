@@ -0,0 +1,139 @@
+"""
+Roster Provisioning
+Creates student accounts in bulk from a CSV roster: one duplicate check per
+batch of rows, passwords hashed on every CPU and one multi-row INSERT per
+batch, instead of one /register round trip per student.
+"""
+
+import csv
+import secrets
+
+from mysql.connector import IntegrityError
+
+REQUIRED_COLUMNS = ('username', 'email')
+REPORT_COLUMNS = ['line', 'username', 'email', 'password', 'result']
+
+
+class RosterError(ValueError):
+    """The roster file as a whole cannot be used"""
+
+
+def temporary_password():
+    """Random first-login password (16 characters, 96 bits)"""
+    return secrets.token_urlsafe(12)
+
+
+def _problem(account):
+    if not account['username']:
+        return 'Username is required'
+    if len(account['username']) > 50:
+        return 'Username is longer than 50 characters'
+    if '@' not in account['email'] or len(account['email']) > 100:
+        return 'Invalid email'
+    if account['password'] is not None and len(account['password']) < 6:
+        return 'Password must be at least 6 characters'
+    return None
+
+
+def read_roster(lines, max_rows):
+    """Parse a CSV roster with username and email columns and an optional password column.
+
+    Returns ``(accounts, skipped)``: accounts are dicts with the roster line,
+    username, email and password (None when the roster gives none); skipped
+    are ``(account, reason)`` pairs for invalid rows and repeats of an
+    earlier row.
+    """
+    reader = csv.DictReader(lines)
+    headers = {(name or '').strip().lower(): name for name in reader.fieldnames or []}
+    missing = [column for column in REQUIRED_COLUMNS if column not in headers]
+    if missing:
+        raise RosterError(f"Roster has no {' or '.join(missing)} column")
+
+    accounts, skipped = [], []
+    usernames, emails = set(), set()
+    for row in reader:
+        if len(accounts) + len(skipped) >= max_rows:
+            raise RosterError(f"Roster has more than {max_rows} rows")
+        account = {
+            'line': reader.line_num,
+            'username': (row.get(headers['username']) or '').strip(),
+            'email': (row.get(headers['email']) or '').strip(),
+            'password': (row.get(headers['password']) if 'password' in headers else None) or None,
+        }
+        reason = _problem(account)
+        if not reason and (account['username'].lower() in usernames or account['email'].lower() in emails):
+            reason = 'Repeats an earlier row'
+        if reason:
+            skipped.append((account, reason))
+            continue
+        usernames.add(account['username'].lower())
+        emails.add(account['email'].lower())
+        accounts.append(account)
+    return accounts, skipped
+
+
+def remove_taken(cursor, accounts, batch_size):
+    """Split off accounts whose username or email is already registered.
+
+    One set-based lookup per batch replaces a duplicate check per student.
+    Returns ``(fresh, skipped)``.
+    """
+    taken_usernames, taken_emails = set(), set()
+    for start in range(0, len(accounts), batch_size):
+        batch = accounts[start:start + batch_size]
+        marks = ', '.join(['%s'] * len(batch))
+        cursor.execute(f"SELECT username, email FROM users WHERE username IN ({marks}) OR email IN ({marks})",
+                       [a['username'] for a in batch] + [a['email'] for a in batch])
+        for username, email in cursor.fetchall():
+            taken_usernames.add(username.lower())
+            taken_emails.add(email.lower())
+
+    fresh, skipped = [], []
+    for account in accounts:
+        if account['username'].lower() in taken_usernames:
+            skipped.append((account, 'Username already exists'))
+        elif account['email'].lower() in taken_emails:
+            skipped.append((account, 'Email already registered'))
+        else:
+            fresh.append(account)
+    return fresh, skipped
+
+
+def insert_accounts(conn, accounts, hashes, batch_size, now):
+    """Insert student accounts, one multi-row INSERT and commit per batch.
+
+    A batch that hits a unique key (someone registered meanwhile) is retried
+    row by row. Returns ``(created, skipped)``.
+    """
+    sql = "INSERT INTO users (username, email, password, role, created_at) VALUES (%s, %s, %s, %s, %s)"
+    rows = [(a['username'], a['email'], hashed, 'user', now) for a, hashed in zip(accounts, hashes)]
+    created, skipped = [], []
+    cursor = conn.cursor()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        batch_accounts = accounts[start:start + batch_size]
+        try:
+            cursor.executemany(sql, batch)
+            created.extend(batch_accounts)
+        except IntegrityError:
+            conn.rollback()
+            for account, row in zip(batch_accounts, batch):
+                try:
+                    cursor.execute(sql, row)
+                    created.append(account)
+                except IntegrityError:
+                    # Only this statement fails; the rest of the batch stays in the transaction
+                    skipped.append((account, 'Username or email already exists'))
+        conn.commit()
+    cursor.close()
+    return created, skipped
+
+
+def write_report(out, created, skipped):
+    """CSV report in roster order: generated passwords of created accounts, reasons for skipped rows"""
+    results = [(a, 'created', a['password'] if a.get('generated') else '') for a in created]
+    results += [(a, f"skipped: {reason}", '') for a, reason in skipped]
+    writer = csv.writer(out)
+    writer.writerow(REPORT_COLUMNS)
+    for account, result, password in sorted(results, key=lambda item: item[0]['line']):
+        writer.writerow([account['line'], account['username'], account['email'], password, result])
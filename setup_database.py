@@ -3,13 +3,55 @@ Database Setup Script
 Run this script to initialize the database with required tables.
 """
 
+import argparse
+import bisect
+import csv
+import itertools
+import os
+import random
+import tempfile
+import time
 import mysql.connector
 from mysql.connector import Error
 from config import Config
+from migrations import migrate, LATEST_VERSION
+from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
 
+def get_connection(**options):
+    """Connect to the configured database (DB_BACKEND); ``options`` go to MySQL only"""
+    if Config.DB_BACKEND == 'sqlite':
+        import sqlite_backend
+        return sqlite_backend.connect(Config.SQLITE_PATH, timeout=Config.SQLITE_BUSY_TIMEOUT)
+    return mysql.connector.connect(
+        host=Config.MYSQL_HOST,
+        user=Config.MYSQL_USER,
+        password=Config.MYSQL_PASSWORD,
+        database=Config.MYSQL_DATABASE,
+        port=Config.MYSQL_PORT,
+        **options
+    )
+
+def setup_sqlite_database():
+    """Initialize the embedded SQLite database"""
+    try:
+        conn = get_connection()
+        migrate(conn, backend='sqlite')
+        conn.close()
+        
+        print(f"[OK] SQLite database '{Config.SQLITE_PATH}' ready (WAL mode, schema version {LATEST_VERSION})")
+        print("\n[OK] Database setup completed successfully!")
+        return True
+        
+    except Error as e:
+        print(f"\n[ERROR] Database setup failed: {e}")
+        return False
+
 def setup_database():
     """Initialize database tables"""
+    if Config.DB_BACKEND == 'sqlite':
+        return setup_sqlite_database()
+    
     try:
         # Connect to MySQL server (without database)
         conn = mysql.connector.connect(
@@ -25,106 +67,9 @@ def setup_database():
         cursor.execute(f"USE {Config.MYSQL_DATABASE}")
         print(f"[OK] Database '{Config.MYSQL_DATABASE}' ready")
         
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password VARCHAR(255) NOT NULL,
-                role ENUM('admin', 'user') DEFAULT 'user',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                INDEX idx_username (username),
-                INDEX idx_email (email)
-            )
-        """)
-        print("[OK] Users table created")
-        
-        # Create/Update hostel table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS hostel (
-                BedNo INT PRIMARY KEY,
-                Name VARCHAR(100) NOT NULL,
-                StudentID VARCHAR(50),
-                Contact VARCHAR(20),
-                Email VARCHAR(100),
-                CheckInDate DATETIME DEFAULT CURRENT_TIMESTAMP,
-                PaymentStatus ENUM('Paid', 'Pending') DEFAULT 'Pending',
-                INDEX idx_name (Name),
-                INDEX idx_student_id (StudentID),
-                INDEX idx_payment (PaymentStatus),
-                INDEX idx_checkin (CheckInDate)
-            )
-        """)
-        print("[OK] Hostel table created")
-        
-        # Create bed_applications table for student applications
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS bed_applications (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                student_name VARCHAR(100) NOT NULL,
-                student_id VARCHAR(50),
-                contact VARCHAR(20),
-                email VARCHAR(100),
-                status ENUM('Pending', 'Approved', 'Rejected') DEFAULT 'Pending',
-                applied_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-                reviewed_date DATETIME NULL,
-                bed_no INT NULL,
-                notes TEXT,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                INDEX idx_user_id (user_id),
-                INDEX idx_status (status),
-                INDEX idx_applied_date (applied_date)
-            )
-        """)
-        print("[OK] Bed applications table created")
-        
-        # Add user_id to hostel table to link beds to users
-        try:
-            cursor.execute("SHOW COLUMNS FROM hostel LIKE 'user_id'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE hostel ADD COLUMN user_id INT NULL AFTER PaymentStatus")
-                print("[OK] Added user_id column to hostel table")
-                # Add foreign key constraint separately
-                try:
-                    cursor.execute("ALTER TABLE hostel ADD CONSTRAINT fk_hostel_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL")
-                    print("[OK] Added foreign key constraint")
-                except Error as e:
-                    # Foreign key might already exist or table might have data
-                    print(f"Note: Foreign key constraint - {e}")
-        except Error as e:
-            print(f"Note: {e}")
-        
-        # Migrate existing hostel table if it has old schema
-        try:
-            # Check if old columns exist
-            cursor.execute("SHOW COLUMNS FROM hostel LIKE 'StudentID'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE hostel ADD COLUMN StudentID VARCHAR(50) AFTER Name")
-                print("[OK] Added StudentID column to hostel table")
-            
-            cursor.execute("SHOW COLUMNS FROM hostel LIKE 'Contact'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE hostel ADD COLUMN Contact VARCHAR(20) AFTER StudentID")
-                print("[OK] Added Contact column to hostel table")
-            
-            cursor.execute("SHOW COLUMNS FROM hostel LIKE 'Email'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE hostel ADD COLUMN Email VARCHAR(100) AFTER Contact")
-                print("[OK] Added Email column to hostel table")
-            
-            cursor.execute("SHOW COLUMNS FROM hostel LIKE 'CheckInDate'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE hostel ADD COLUMN CheckInDate DATETIME DEFAULT CURRENT_TIMESTAMP AFTER Email")
-                print("[OK] Added CheckInDate column to hostel table")
-            
-            cursor.execute("SHOW COLUMNS FROM hostel LIKE 'PaymentStatus'")
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE hostel ADD COLUMN PaymentStatus ENUM('Paid', 'Pending') DEFAULT 'Pending' AFTER CheckInDate")
-                print("[OK] Added PaymentStatus column to hostel table")
-        except Error as e:
-            print(f"Migration note: {e}")
+        # Create or upgrade the tables
+        if not migrate(conn):
+            print(f"[OK] Schema is up to date (version {LATEST_VERSION})")
         
         conn.commit()
         cursor.close()
@@ -140,13 +85,7 @@ def setup_database():
 def create_admin_user():
     """Create default admin user"""
     try:
-        conn = mysql.connector.connect(
-            host=Config.MYSQL_HOST,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DATABASE,
-            port=Config.MYSQL_PORT
-        )
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Check if any users exist
@@ -159,7 +98,7 @@ def create_admin_user():
             default_password = "admin123"  # Change this after first login!
             default_email = "admin@hostel.com"
             
-            hashed_password = generate_password_hash(default_password)
+            hashed_password = generate_password_hash(default_password, Config.HASH_METHOD)
             cursor.execute("""
                 INSERT INTO users (username, email, password, role) 
                 VALUES (%s, %s, %s, 'admin')
@@ -181,7 +120,308 @@ def create_admin_user():
         print(f"\n[ERROR] Failed to create admin user: {e}")
         return False
 
+# ---------------------------------------------------------------------------
+# Synthetic data for scale tests
+# ---------------------------------------------------------------------------
+
+# Most common first; names are drawn with Zipf-like weights
+FIRST_NAMES = ['Aarav', 'Priya', 'Rahul', 'Ananya', 'Rohan', 'Sneha', 'Arjun', 'Pooja', 'Vikram', 'Neha',
+               'Aditya', 'Kavya', 'Karan', 'Isha', 'Siddharth', 'Divya', 'Amit', 'Riya', 'Nikhil', 'Shreya',
+               'Manish', 'Anjali', 'Harsh', 'Meera', 'Yash', 'Tanvi', 'Kunal', 'Aishwarya', 'Varun', 'Nandini',
+               'Abhishek', 'Lakshmi', 'Suresh', 'Fatima', 'Imran', 'Sana', 'John', 'Maria', 'Gurpreet', 'Tenzin']
+LAST_NAMES = ['Sharma', 'Patel', 'Kumar', 'Singh', 'Reddy', 'Gupta', 'Nair', 'Iyer', 'Das', 'Joshi',
+              'Mehta', 'Rao', 'Verma', 'Chatterjee', 'Banerjee', 'Pillai', 'Menon', 'Khan', 'Agarwal', 'Mishra',
+              'Pandey', 'Yadav', 'Bose', 'Kulkarni', 'Deshmukh', 'Shetty', 'Naidu', 'Saxena', 'Malhotra', 'Kapoor',
+              'Chopra', 'Bhat', 'Hegde', 'Thomas', 'Fernandes', "D'Souza", 'Ali', 'Sheikh', 'Gill', 'Sinha']
+DEPARTMENTS = {'CS': 30, 'EC': 18, 'ME': 15, 'EE': 12, 'CE': 10, 'IT': 8, 'CH': 4, 'BT': 3}
+REJECTION_NOTES = ['Hostel full for this term', 'Incomplete documents', 'Local resident',
+                   'Fee dues pending', None]
+# Relative application volume per month: peaks before each semester starts
+MONTH_WEIGHTS = [6, 2, 1, 1, 2, 6, 10, 8, 2, 1, 1, 3]
+# Generated campus layout: halls of up to this many beds over a few floors
+BEDS_PER_BUILDING = 2000
+FLOORS_PER_BUILDING = 6
+ROOM_SIZES = {1: 1, 2: 4, 3: 3, 4: 2}
+
+
+def _zipf(values):
+    return [1 / (rank + 1) for rank in range(len(values))]
+
+
+def _seasonal_dates(rng, count, start, end):
+    """``count`` ascending datetimes in [start, end], denser in intake months"""
+    if count <= 0:
+        return
+    first_day = datetime.combine(start.date(), datetime.min.time())
+    days = (end.date() - start.date()).days + 1
+    cumulative = list(itertools.accumulate(
+        MONTH_WEIGHTS[(first_day + timedelta(days=d)).month - 1] for d in range(days)))
+    total = cumulative[-1]
+    for i in range(count):
+        x = (i + rng.random()) / count * total
+        day = bisect.bisect_left(cumulative, x)
+        low = cumulative[day - 1] if day else 0
+        offset = (x - low) / (cumulative[day] - low) * 86399
+        yield min(end, max(start, first_day + timedelta(days=day, seconds=int(offset))))
+
+
+def _profiles(rng, users):
+    """(name, student_id, contact, email) for each generated student"""
+    this_year = datetime.now().year
+    firsts = rng.choices(FIRST_NAMES, _zipf(FIRST_NAMES), k=users)
+    lasts = rng.choices(LAST_NAMES, _zipf(LAST_NAMES), k=users)
+    departments = rng.choices(list(DEPARTMENTS), list(DEPARTMENTS.values()), k=users)
+    years_ago = rng.choices(range(5), [30, 26, 22, 18, 4], k=users)
+    profiles = []
+    for i in range(users):
+        email_name = f"{firsts[i]}.{lasts[i]}".lower().replace("'", '')
+        contact = None if rng.random() < 0.08 else f"{rng.choice('6789')}{rng.randrange(10 ** 9):09d}"
+        profiles.append((f"{firsts[i]} {lasts[i]}",
+                         f"{this_year - years_ago[i]}{departments[i]}{i + 1:06d}",
+                         contact,
+                         f"{email_name}{i + 1}@example.com"))
+    return profiles
+
+
+def _inventory(rng, capacity):
+    """(BedNo, building, floor, room, status) for ``capacity`` beds, split evenly over halls"""
+    buildings = max(1, -(-capacity // BEDS_PER_BUILDING))
+    per_floor = max(1, -(-capacity // (buildings * FLOORS_PER_BUILDING)))
+    bed_no = 1
+    for b in range(buildings):
+        name = f"Hall {b + 1}"
+        last = min(capacity, capacity * (b + 1) // buildings)
+        floor, room, on_floor = 0, 1, 0
+        while bed_no <= last:
+            size = min(rng.choices(list(ROOM_SIZES), list(ROOM_SIZES.values()))[0], last - bed_no + 1)
+            for _ in range(size):
+                yield (bed_no, name, floor, f"{floor}{room:02d}", 'Active')
+                bed_no += 1
+            room += 1
+            on_floor += size
+            if on_floor >= per_floor:
+                floor, room, on_floor = floor + 1, 1, 0
+
+
+def clear_tables(conn):
+    """Delete every row from the application tables"""
+    cursor = conn.cursor()
+    tables = ('email_outbox', 'waitlist', 'bed_applications', 'hostel', 'beds', 'users')
+    if Config.DB_BACKEND == 'sqlite':
+        # Children first, so the foreign keys stay satisfied; ids restart at 1
+        for table in tables:
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute("DELETE FROM sqlite_sequence")
+    else:
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        for table in tables:
+            cursor.execute(f"TRUNCATE TABLE {table}")
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+    conn.commit()
+    cursor.close()
+
+
+def _progress(label, done, total, started):
+    rate = done / max(time.perf_counter() - started, 1e-6)
+    percent = done * 100 // total if total else 100
+    print(f"\r  {label:<18} {done:>10,}/{total:,} ({percent}%) {rate:,.0f} rows/s", end='', flush=True)
+
+
+def bulk_load(conn, table, columns, rows, total, loader='insert', batch_size=5000):
+    """Write ``rows`` into ``table`` with progress output; returns the row count.
+
+    ``loader`` is 'insert' (batched multi-row INSERTs, any backend) or
+    'infile' (MySQL LOAD DATA LOCAL INFILE from a temporary CSV file).
+    """
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    done = 0
+    if loader == 'infile':
+        with tempfile.NamedTemporaryFile('w', newline='', suffix='.csv', delete=False) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            for row in rows:
+                writer.writerow(['\\N' if value is None else value for value in row])
+                done += 1
+                if done % batch_size == 0:
+                    _progress(f"{table} (csv)", done, total, started)
+        try:
+            cursor.execute(f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n' ({', '.join(columns)})
+            """, (f.name,))
+            conn.commit()
+        finally:
+            os.remove(f.name)
+    else:
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+        # mysql.connector sends an INSERT executemany() as one multi-row statement
+        for batch in iter(lambda: list(itertools.islice(rows, batch_size)), []):
+            cursor.executemany(sql, batch)
+            conn.commit()
+            done += len(batch)
+            _progress(table, done, total, started)
+    if loader == 'infile' or not done:
+        _progress(table, done, total, started)
+    print()
+    cursor.close()
+    return done
+
+
+def populate(beds, users, applications, password, admin_username='admin', username_prefix='student_',
+             pending_ratio=0.05, years=4, seed=None, loader='insert', batch_size=5000, wipe=False,
+             capacity=None):
+    """Fill the configured database with a synthetic hostel of the given size.
+
+    ``beds`` are allotted out of an inventory of ``capacity`` beds (by default
+    exactly ``beds``, i.e. a full hostel). User 1 is the admin; students
+    ``{username_prefix}1..N`` are users 2..N+1. Returns True on success.
+    """
+    capacity = max(capacity or beds, beds)
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    started = time.perf_counter()
+    try:
+        conn = get_connection(allow_local_infile=True) if loader == 'infile' else get_connection()
+        if wipe:
+            clear_tables(conn)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM users")
+        if cursor.fetchone()[0]:
+            print("\n[ERROR] Tables already hold data; pass --wipe to replace it")
+            return False
+        # The generated inventory replaces the beds a new database starts with
+        cursor.execute("DELETE FROM beds")
+        conn.commit()
+        secondary_indexes = []
+        if Config.DB_BACKEND == 'sqlite':
+            # A scale-test database can be regenerated, so skip fsyncs while loading
+            cursor.execute("PRAGMA synchronous = OFF")
+            # Building indexes once after the load is much cheaper than row by row
+            cursor.execute("""
+                SELECT name, sql FROM sqlite_master 
+                WHERE type = 'index' AND sql IS NOT NULL 
+                  AND tbl_name IN ('users', 'beds', 'hostel', 'bed_applications')
+            """)
+            secondary_indexes = cursor.fetchall()
+            for name, _ in secondary_indexes:
+                cursor.execute(f"DROP INDEX {name}")
+        else:
+            cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.close()
+        
+        # One hash for every account keeps generation fast
+        hashed_password = generate_password_hash(password, Config.HASH_METHOD)
+        profiles = _profiles(rng, users)
+        
+        def user_rows():
+            yield (1, admin_username, f"{admin_username}@example.com", hashed_password, 'admin',
+                   now - timedelta(days=365 * years))
+            for i, (name, student_id, contact, email) in enumerate(profiles):
+                intake = datetime(int(student_id[:4]), 6, 1)
+                yield (i + 2, f"{username_prefix}{i + 1}", email, hashed_password, 'user',
+                       min(now, intake + timedelta(days=rng.randrange(90))))
+        
+        bulk_load(conn, 'users', ['id', 'username', 'email', 'password', 'role', 'created_at'],
+                  user_rows(), users + 1, loader, batch_size)
+        
+        bulk_load(conn, 'beds', ['BedNo', 'building', 'floor', 'room', 'status'],
+                  _inventory(rng, capacity), capacity, loader, batch_size)
+        
+        # Current residents: random students in random beds, checked in over the last year
+        residents = min(beds, users)
+        occupants = rng.sample(range(users), residents)
+        check_ins = list(_seasonal_dates(rng, residents, now - timedelta(days=365), now))
+        bed_numbers = rng.sample(range(1, capacity + 1), residents)
+        stays = sorted(zip(bed_numbers, occupants, check_ins))
+        
+        def hostel_rows():
+            for bed_no, student, check_in in stays:
+                name, student_id, contact, email = profiles[student]
+                # Recent arrivals are more likely to still owe the fee
+                paid_chance = 0.9 if now - check_in > timedelta(days=30) else 0.3
+                yield (bed_no, name, student_id, contact, email, check_in,
+                       'Paid' if rng.random() < paid_chance else 'Pending', student + 2)
+        
+        bulk_load(conn, 'hostel', ['BedNo', 'Name', 'StudentID', 'Contact', 'Email', 'CheckInDate',
+                                   'PaymentStatus', 'user_id'], hostel_rows(), residents, loader, batch_size)
+        
+        # Applications in date order: closed history, residents' approvals, then open ones
+        resident_approvals = min(residents, applications)
+        housed = set(occupants)
+        waiting = [u for u in range(users) if u not in housed]
+        pending = min(int(len(waiting) * pending_ratio), applications - resident_approvals)
+        history = applications - resident_approvals - pending
+        
+        def application_row(student, status, applied, reviewed=None, bed_no=None, notes=None):
+            name, student_id, contact, email = profiles[student]
+            return (student + 2, name, student_id, contact, email, status, applied, reviewed, bed_no, notes)
+        
+        def application_rows():
+            history_end = now - timedelta(days=365)
+            for applied in _seasonal_dates(rng, history, history_end - timedelta(days=365 * years), history_end):
+                reviewed = applied + timedelta(hours=rng.expovariate(1 / 36))
+                if rng.random() < 0.55:
+                    yield application_row(rng.randrange(users), 'Approved', applied, reviewed,
+                                          rng.randint(1, max(capacity, 1)))
+                else:
+                    yield application_row(rng.randrange(users), 'Rejected', applied, reviewed,
+                                          notes=rng.choice(REJECTION_NOTES))
+            for bed_no, student, check_in in sorted(stays, key=lambda stay: stay[2])[:resident_approvals]:
+                applied = check_in - timedelta(hours=rng.expovariate(1 / 72))
+                yield application_row(student, 'Approved', applied, check_in, bed_no)
+            for student, applied in zip(rng.sample(waiting, pending),
+                                        _seasonal_dates(rng, pending, now - timedelta(days=30), now)):
+                yield application_row(student, 'Pending', applied)
+        
+        bulk_load(conn, 'bed_applications', ['user_id', 'student_name', 'student_id', 'contact', 'email',
+                                             'status', 'applied_date', 'reviewed_date', 'bed_no', 'notes'],
+                  application_rows(), applications, loader, batch_size)
+        
+        if secondary_indexes:
+            index_started = time.perf_counter()
+            cursor = conn.cursor()
+            for _, sql in secondary_indexes:
+                cursor.execute(sql)
+            conn.commit()
+            cursor.close()
+            print(f"  Rebuilt {len(secondary_indexes)} indexes in {time.perf_counter() - index_started:.1f}s")
+        
+        conn.close()
+        print(f"[OK] Generated {users:,} students, {capacity:,} beds, {residents:,} allotments and "
+              f"{applications:,} applications in {time.perf_counter() - started:.1f}s")
+        return True
+        
+    except Error as e:
+        print(f"\n[ERROR] Data generation failed: {e}")
+        return False
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the database tables and an admin user, '
+                                                 'or fill them with synthetic data for scale tests.')
+    parser.add_argument('--generate', action='store_true', help='load synthetic students, beds and applications')
+    parser.add_argument('--beds', type=int, default=50000, help='allotted beds')
+    parser.add_argument('--capacity', type=int, help='beds in the inventory (default: --beds, a full hostel)')
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--applications', type=int, default=1000000)
+    parser.add_argument('--password', default='scaletest', help='password for every generated account')
+    parser.add_argument('--loader', choices=['insert', 'infile'], default='insert',
+                        help="batched INSERTs, or MySQL LOAD DATA LOCAL INFILE")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, help='random seed for a reproducible data set')
+    parser.add_argument('--wipe', action='store_true', help='delete existing rows first')
+    args = parser.parse_args()
+    
+    if args.generate:
+        if args.loader == 'infile' and Config.DB_BACKEND != 'mysql':
+            parser.error('--loader infile needs the MySQL backend')
+        if not setup_database() or not populate(args.beds, args.users, args.applications, args.password,
+                                                loader=args.loader, batch_size=args.batch_size,
+                                                seed=args.seed, wipe=args.wipe, capacity=args.capacity):
+            raise SystemExit(1)
+        print(f"  Log in as 'admin' or 'student_1'..'student_{args.users}' with password '{args.password}'")
+        raise SystemExit(0)
+    
     print("=" * 50)
     print("Hostel Management System - Database Setup")
     print("=" * 50)
@@ -192,5 +432,5 @@ if __name__ == '__main__':
         print("Setup completed! You can now run the application.")
         print("=" * 50)
     else:
-        print("\nSetup failed. Please check your MySQL connection settings.")
+        print("\nSetup failed. Please check your database connection settings.")
 
@@ -0,0 +1,347 @@
+"""
+Shared Cache
+A TTL cache kept in a memory-mapped file, so every worker process on the host
+reads the same entries: a value computed by one worker is a hit in the
+others, and an invalidation in one is seen by all of them on their next
+lookup. Falls back to a per-process cache where the file cannot be used.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import stat
+import struct
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from cache import TTLCache
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to a per-process cache
+    fcntl = None
+
+_MISSING = object()
+
+_MAGIC = b'HSC1'
+# magic, slots, slot size, epoch, generation
+_HEADER = struct.Struct('<4sIIQQ')
+_HEADER_SIZE = 64
+# sequence (odd while being written), key hash, expiry (wall clock), epoch, payload length
+_ENTRY = struct.Struct('<QQdQI')
+_ENTRY_SIZE = 40
+# Slots looked at for a key, starting at its hash
+_PROBES = 8
+_EPOCH_AT = 12
+_GENERATION_AT = 20
+
+
+def _key_hash(key):
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1  # 0 marks an empty slot
+
+
+# Entries are JSON, never pickle: loading one cannot run code. Dates and decimals
+# from database rows are tagged so they come back as the same types (tuples come
+# back as lists).
+def _tag(value):
+    if isinstance(value, datetime):
+        return {'$datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'$date': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'$decimal': str(value)}
+    raise TypeError(f"{type(value).__name__} cannot be stored in the shared cache")
+
+
+_UNTAG = {'$datetime': datetime.fromisoformat, '$date': date.fromisoformat, '$decimal': Decimal}
+
+
+def _untag(obj):
+    if len(obj) == 1:
+        (tag, value), = obj.items()
+        if tag in _UNTAG:
+            return _UNTAG[tag](value)
+    return obj
+
+
+def _encode(key, value):
+    return json.dumps([key, value], default=_tag, separators=(',', ':')).encode()
+
+
+def _decode(payload):
+    return json.loads(payload, object_hook=_untag)
+
+
+def _check_private(st, what):
+    """Refuse files another user could have planted or can write"""
+    if st.st_uid != os.geteuid() or st.st_mode & 0o022:
+        raise OSError(f"{what} must be owned by this user and not writable by others")
+
+
+def private_directory(directory):
+    """Create ``directory`` (mode 0700) if missing; refuse one another user could write to"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_private(os.stat(directory), directory)
+    return directory
+
+
+class SharedCache:
+    """TTL cache shared through a file next to ``path`` by all processes that open it.
+
+    Holds at most ``maxsize`` entries of up to ``entry_size`` bytes each
+    (as JSON); larger values are simply not cached. ``clear()`` bumps a
+    shared epoch that retires every entry at once. Same interface as
+    ``TTLCache``; concurrent misses are collapsed per process only.
+
+    The file name carries the layout, so workers started with other
+    settings (e.g. during a rolling restart) use another file rather than
+    resizing one that is mapped. Its directory must be private to this
+    user (it is created with mode 0700 if missing).
+    """
+
+    def __init__(self, path, maxsize=1024, ttl=60, entry_size=1024):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entry_size = entry_size
+        self._slot_size = _ENTRY_SIZE + entry_size
+        self.path = f"{path}.{_MAGIC.decode().lower()}-{maxsize}x{self._slot_size}"
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._map = None
+        self._fallback = None
+        self.hits = 0
+        self.misses = 0
+        self.computes = 0
+        self.oversize = 0
+        self.unstorable = 0
+        if fcntl is None:
+            self._fallback = TTLCache(maxsize=maxsize, ttl=ttl)
+            return
+        try:
+            self._open()
+        except OSError as e:
+            print(f"Shared cache note: using a per-process cache for {path} ({e})")
+            self._fallback = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _open(self):
+        size = _HEADER_SIZE + self.maxsize * self._slot_size
+        private_directory(os.path.dirname(self.path) or '.')
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+        except FileExistsError:
+            fd = os.open(self.path, os.O_RDWR | os.O_NOFOLLOW)
+        try:
+            st = os.fstat(fd)
+            _check_private(st, self.path)
+            if not stat.S_ISREG(st.st_mode):
+                raise OSError(f"{self.path} is not a regular file")
+            fcntl.lockf(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size == 0:
+                # Just created (by this or another worker); nobody maps an empty file
+                os.ftruncate(fd, size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, self.maxsize, self._slot_size, 1, 0), 0)
+            header = os.pread(fd, _HEADER.size, 0)
+            # Never truncate a file in use: other workers may have it mapped
+            if (os.fstat(fd).st_size != size or len(header) < _HEADER.size or
+                    _HEADER.unpack(header)[:3] != (_MAGIC, self.maxsize, self._slot_size)):
+                raise OSError(f"{self.path} has an unexpected layout")
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, size)
+            self._fd = fd
+        except OSError:
+            os.close(fd)
+            raise
+
+    def _counter(self, offset):
+        return struct.unpack_from('<Q', self._map, offset)[0]
+
+    def _bump(self, offset):
+        struct.pack_into('<Q', self._map, offset, self._counter(offset) + 1)
+
+    def _slots(self, key_hash):
+        start = key_hash % self.maxsize
+        for i in range(min(_PROBES, self.maxsize)):
+            yield _HEADER_SIZE + ((start + i) % self.maxsize) * self._slot_size
+
+    def _read(self, offset):
+        """Consistent ``(key_hash, expires, epoch, payload)`` of a slot, or None while it is being written"""
+        for _ in range(3):
+            seq = self._counter(offset)
+            if seq % 2:
+                continue
+            _, key_hash, expires, epoch, length = _ENTRY.unpack_from(self._map, offset)
+            payload = self._map[offset + _ENTRY_SIZE:offset + _ENTRY_SIZE + min(length, self.entry_size)]
+            if self._counter(offset) == seq:
+                return key_hash, expires, epoch, payload
+        return None
+
+    def _write(self, offset, key_hash, expires, epoch, payload):
+        # Readers retry (or miss) while the sequence number is odd
+        seq = self._counter(offset)
+        struct.pack_into('<Q', self._map, offset, seq + 1)
+        _ENTRY.pack_into(self._map, offset, seq + 1, key_hash, expires, epoch, len(payload))
+        self._map[offset + _ENTRY_SIZE:offset + _ENTRY_SIZE + len(payload)] = payload
+        struct.pack_into('<Q', self._map, offset, seq + 2)
+
+    def _locked(self):
+        """Exclusive access across threads (``_lock``) and processes (``lockf``)"""
+        return _FileLock(self._lock, self._fd)
+
+    def get(self, key, default=None):
+        """Return a cached value, or ``default`` if missing or expired"""
+        if self._fallback is not None:
+            return self._fallback.get(key, default)
+        key_hash = _key_hash(key)
+        epoch = self._counter(_EPOCH_AT)
+        now = time.time()
+        for offset in self._slots(key_hash):
+            entry = self._read(offset)
+            if entry is None or entry[0] != key_hash:
+                continue
+            if entry[1] > now and entry[2] == epoch:
+                try:
+                    stored_key, value = _decode(entry[3])
+                except ValueError:
+                    break
+                if stored_key == key:
+                    self.hits += 1
+                    return value
+            break
+        self.misses += 1
+        return default
+
+    @property
+    def generation(self):
+        """Changes whenever entries are invalidated, in any process"""
+        if self._fallback is not None:
+            return self._fallback.generation
+        return self._counter(_GENERATION_AT)
+
+    def set(self, key, value, generation=None):
+        """Store a value, replacing the entry closest to expiry when its slots are full.
+
+        With ``generation`` (read before computing the value) nothing is
+        stored if the cache was invalidated in the meantime.
+        """
+        if self._fallback is not None:
+            return self._fallback.set(key, value, generation)
+        try:
+            payload = _encode(key, value)
+        except (TypeError, ValueError):
+            self.unstorable += 1
+            return
+        if len(payload) > self.entry_size:
+            self.oversize += 1
+            return
+        key_hash = _key_hash(key)
+        with self._locked():
+            if generation is not None and generation != self._counter(_GENERATION_AT):
+                return
+            epoch = self._counter(_EPOCH_AT)
+            now = time.time()
+            target, soonest = None, None
+            for offset in self._slots(key_hash):
+                _, slot_hash, expires, slot_epoch, _ = _ENTRY.unpack_from(self._map, offset)
+                if slot_hash == key_hash or not slot_hash or expires <= now or slot_epoch != epoch:
+                    target = offset
+                    break
+                if soonest is None or expires < soonest[1]:
+                    soonest = (offset, expires)
+            if target is None:
+                target = soonest[0]
+            self._write(target, key_hash, now + self.ttl, epoch, payload)
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value, computing it at most once per process on a miss.
+
+        A value computed while the cache was invalidated is returned but not
+        stored.
+        """
+        if self._fallback is not None:
+            return self._fallback.get_or_compute(key, compute)
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        with self._lock:
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            generation = self.generation
+            self.computes += 1
+            value = compute()
+            self.set(key, value, generation=generation)
+            return value
+
+    def delete(self, key):
+        if self._fallback is not None:
+            return self._fallback.delete(key)
+        key_hash = _key_hash(key)
+        with self._locked():
+            for offset in self._slots(key_hash):
+                if _ENTRY.unpack_from(self._map, offset)[1] == key_hash:
+                    self._write(offset, 0, 0.0, 0, b'')
+            self._bump(_GENERATION_AT)
+
+    def clear(self):
+        """Drop every entry, in every process"""
+        if self._fallback is not None:
+            return self._fallback.clear()
+        with self._locked():
+            self._bump(_EPOCH_AT)
+            self._bump(_GENERATION_AT)
+
+    def stats(self):
+        """Hit/miss counters (this process) and the shared entry count, for the metrics endpoint"""
+        if self._fallback is not None:
+            return dict(self._fallback.stats(), shared=False)
+        epoch = self._counter(_EPOCH_AT)
+        now = time.time()
+        size = 0
+        for i in range(self.maxsize):
+            _, key_hash, expires, slot_epoch, _ = _ENTRY.unpack_from(self._map, _HEADER_SIZE + i * self._slot_size)
+            if key_hash and expires > now and slot_epoch == epoch:
+                size += 1
+        lookups = self.hits + self.misses
+        return {
+            'size': size,
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'computes': self.computes,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'oversize': self.oversize,
+            'unstorable': self.unstorable,
+            'entry_size': self.entry_size,
+            'shared': True,
+            'generation': self._counter(_GENERATION_AT),
+        }
+
+
+class _FileLock:
+    """Hold a thread lock and an exclusive ``lockf`` lock on ``fd`` together"""
+
+    def __init__(self, lock, fd):
+        self._lock = lock
+        self._fd = fd
+
+    def __enter__(self):
+        self._lock.acquire()
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def __exit__(self, *exc):
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
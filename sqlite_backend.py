@@ -0,0 +1,151 @@
+"""
+SQLite Backend
+Embedded storage for single-node deployments and in-process benchmarks.
+Connections behave like mysql.connector ones as far as the app is concerned:
+``%s`` placeholders, ``cursor(dictionary=True)``, DATETIME columns read back
+as datetime objects and errors raised as mysql.connector exceptions with the
+matching MySQL error numbers.
+"""
+
+import re
+import sqlite3
+from datetime import date, datetime
+
+from mysql.connector import errorcode, errors
+
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE(?:\s+SKIP\s+LOCKED)?\s*$', re.IGNORECASE)
+
+# MySQL DATETIME columns hold whole seconds
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(' ', timespec='seconds'))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter('DATETIME', lambda value: datetime.fromisoformat(value.decode()))
+
+
+def connect(path, timeout=5):
+    """Open a WAL-mode SQLite database"""
+    try:
+        conn = sqlite3.connect(path, timeout=timeout, detect_types=sqlite3.PARSE_DECLTYPES,
+                               check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL + NORMAL only syncs at checkpoints; a power cut can lose the last commits, not corrupt
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+    except sqlite3.Error as e:
+        raise _translate(e) from e
+    return SQLiteConnection(conn)
+
+
+def _translate(e):
+    """Map a sqlite3 exception onto the mysql.connector error the routes expect"""
+    message = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        if 'UNIQUE' in message or 'PRIMARY KEY' in message:
+            return errors.IntegrityError(msg=message, errno=errorcode.ER_DUP_ENTRY)
+        if 'FOREIGN KEY' in message:
+            return errors.IntegrityError(msg=message, errno=errorcode.ER_NO_REFERENCED_ROW_2)
+        return errors.IntegrityError(msg=message, errno=errorcode.ER_BAD_NULL_ERROR)
+    if isinstance(e, sqlite3.OperationalError):
+        if 'locked' in message or 'busy' in message:
+            return errors.OperationalError(msg=message, errno=errorcode.ER_LOCK_WAIT_TIMEOUT)
+        if 'no such table' in message:
+            return errors.ProgrammingError(msg=message, errno=errorcode.ER_NO_SUCH_TABLE)
+        return errors.OperationalError(msg=message)
+    if isinstance(e, sqlite3.ProgrammingError):
+        return errors.ProgrammingError(msg=message)
+    return errors.DatabaseError(msg=message)
+
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteConnection:
+    """mysql.connector-style wrapper around a sqlite3 connection"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def cursor(self, dictionary=False, buffered=None):
+        cursor = self._conn.cursor()
+        if dictionary:
+            cursor.row_factory = _dict_row
+        return SQLiteCursor(self, cursor)
+
+    def commit(self):
+        try:
+            self._conn.commit()
+        except sqlite3.Error as e:
+            raise _translate(e) from e
+
+    def rollback(self):
+        try:
+            self._conn.rollback()
+        except sqlite3.Error as e:
+            raise _translate(e) from e
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        try:
+            self._conn.execute("SELECT 1")
+        except sqlite3.Error as e:
+            raise _translate(e) from e
+
+    def close(self):
+        self._conn.close()
+
+
+class SQLiteCursor:
+    """Cursor accepting MySQL-flavoured statements"""
+
+    def __init__(self, connection, cursor):
+        self._connection = connection
+        self._cursor = cursor
+
+    def _prepare(self, sql):
+        sql, locking = _FOR_UPDATE.subn('', sql)
+        if locking and not self._connection.in_transaction:
+            # No row locks in SQLite: take the database write lock up front instead
+            self._cursor.execute("BEGIN IMMEDIATE")
+        return sql.replace('%s', '?')
+
+    def execute(self, sql, params=None):
+        try:
+            self._cursor.execute(self._prepare(sql), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _translate(e) from e
+
+    def executemany(self, sql, seq_params):
+        try:
+            self._cursor.executemany(self._prepare(sql), [tuple(p) for p in seq_params])
+        except sqlite3.Error as e:
+            raise _translate(e) from e
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
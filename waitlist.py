@@ -0,0 +1,155 @@
+"""
+Bed Waitlist
+Applications waiting for a bed, highest priority first and then oldest
+first. The waitlist table is the record; each worker keeps it as a heap so a
+freed bed finds its next applicant without sorting the table.
+"""
+
+import heapq
+import threading
+import time
+
+
+def _key(priority, applied_date, app_id):
+    return (-priority, applied_date, app_id)
+
+
+class Waitlist:
+    """Next-applicant lookup in O(log n) over the waitlist table.
+
+    Like the free bed index, the heap is a per-process hint: callers lock
+    the application row and check it is still waiting before allotting, so
+    entries removed by another worker are skipped when they surface.
+    Entries added by another worker are announced through ``version``, a
+    host-wide counter (``DataVersion``) that every addition bumps; a heap
+    that is behind it is reloaded before the next pop. Other hosts' changes
+    are picked up by the periodic resync.
+    """
+
+    def __init__(self, version, resync_after=60):
+        self.version = version
+        self.resync_after = resync_after
+        self._heap = []
+        self._entries = {}
+        self._synced = None
+        self._built_at = None
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self._stats = {'added': 0, 'popped': 0}
+
+    def _stale(self):
+        return (self._built_at is None or self._synced != self.version.current()[1]
+                or time.monotonic() - self._built_at >= self.resync_after)
+
+    def _build(self, conn):
+        # Read the counter first: an addition committed during the load bumps it again
+        synced = self.version.current()[1]
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT application_id, priority, applied_date FROM waitlist
+            ORDER BY priority DESC, applied_date, application_id
+        """)
+        # Rows arrive sorted, so the list is a valid heap
+        self._heap = [(_key(priority, applied_date, app_id), app_id)
+                      for app_id, priority, applied_date in cursor.fetchall()]
+        cursor.close()
+        self._entries = {app_id: key for key, app_id in self._heap}
+        self._synced = synced
+        self._built_at = time.monotonic()
+        self.rebuilds += 1
+
+    def pop(self, conn):
+        """Take the next waiting application id, or None when nobody is waiting"""
+        with self._lock:
+            if self._stale():
+                self._build(conn)
+            while self._heap:
+                key, app_id = heapq.heappop(self._heap)
+                if self._entries.get(app_id) == key:
+                    del self._entries[app_id]
+                    self._stats['popped'] += 1
+                    return app_id
+            return None
+
+    def waiting(self, conn):
+        """Number of applications waiting, as far as this worker knows"""
+        with self._lock:
+            if self._stale():
+                self._build(conn)
+            return len(self._entries)
+
+    def add(self, entries):
+        """Announce committed additions or priority changes: ``(app_id, priority, applied_date)`` tuples"""
+        if not entries:
+            return
+        counter = self.version.bump()
+        with self._lock:
+            for app_id, priority, applied_date in entries:
+                key = _key(priority, applied_date, app_id)
+                self._entries[app_id] = key
+                heapq.heappush(self._heap, (key, app_id))
+                self._stats['added'] += 1
+            # Still current if ours was the only change since the last load
+            if self._synced is not None and counter == self._synced + 1:
+                self._synced = counter
+
+    def restore(self, entries):
+        """Put back popped ``(app_id, priority, applied_date)`` entries that are still waiting.
+
+        For applications skipped because another transaction held their row;
+        the table did not change, so other workers are not told.
+        """
+        with self._lock:
+            for app_id, priority, applied_date in entries:
+                key = _key(priority, applied_date, app_id)
+                if app_id not in self._entries:
+                    self._entries[app_id] = key
+                    heapq.heappush(self._heap, (key, app_id))
+
+    def discard(self, app_ids):
+        """Forget applications that were allotted or rejected"""
+        with self._lock:
+            for app_id in app_ids:
+                # Heap entries without a dict entry are skipped when popped
+                self._entries.pop(app_id, None)
+
+    def invalidate(self):
+        """Reload from the table on the next pop, e.g. after a rolled-back allotment"""
+        with self._lock:
+            self._built_at = None
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'waiting': len(self._entries) if self._built_at is not None else None,
+                'rebuilds': self.rebuilds,
+            })
+        return data
+
+
+def waitlist_applications(cursor, applications, priority=0):
+    """Put pending applications on the waitlist in the caller's transaction (dictionary cursor).
+
+    Applications already waiting keep their place. Returns the new
+    ``(app_id, priority, applied_date)`` entries, to pass to
+    ``Waitlist.add`` after the commit.
+    """
+    if not applications:
+        return []
+    placeholders = ', '.join(['%s'] * len(applications))
+    cursor.execute(f"SELECT application_id FROM waitlist WHERE application_id IN ({placeholders})",
+                   [a['id'] for a in applications])
+    waiting = {row['application_id'] for row in cursor.fetchall()}
+    entries = [(a['id'], priority, a['applied_date']) for a in applications if a['id'] not in waiting]
+    if entries:
+        cursor.executemany("INSERT INTO waitlist (application_id, priority, applied_date) VALUES (%s, %s, %s)",
+                           entries)
+    return entries
+
+
+def leave_waitlist(cursor, app_ids):
+    """Remove allotted or rejected applications from the waitlist table"""
+    if app_ids:
+        placeholders = ', '.join(['%s'] * len(app_ids))
+        cursor.execute(f"DELETE FROM waitlist WHERE application_id IN ({placeholders})", list(app_ids))